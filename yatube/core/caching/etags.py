@@ -0,0 +1,71 @@
+"""
+Валидаторы условных GET по версиям тегов кеша.
+
+ETag страницы собирается из версий ее тегов (см. tags.py), адреса с
+параметрами и того, что в странице личного: пользователя и CSRF-куки,
+чей токен попадает в формы. Версии берутся одним запросом к кешу,
+поэтому ответ 304 обходится без шаблонов и почти без базы.
+"""
+import hashlib
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db.models import Model
+from django.db.models.query import QuerySet
+from django.http import HttpRequest
+from django.shortcuts import get_object_or_404
+
+from . import swr
+from .pages import set_page_versions
+from .tags import tag_versions
+
+
+def versions_etag(request: HttpRequest, versions: Dict[str, int],
+                  *vary_on) -> str:
+    """ETag страницы для этого пользователя по версиям ее тегов."""
+    parts = [
+        request.get_full_path(),
+        str(request.user.pk or ''),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        *map(str, vary_on),
+        *(f'{tag}={versions[tag]}' for tag in sorted(versions)),
+    ]
+    return hashlib.md5('\n'.join(parts).encode()).hexdigest()
+
+
+def request_etag(request: HttpRequest, tags: Iterable[str],
+                 *vary_on) -> str:
+    """
+    ETag по текущим версиям тегов.
+
+    Версии запоминаются в запросе: по ним же полностраничный кеш
+    (pages.py) проверяет свежесть сохраненной страницы.
+    """
+    versions = tag_versions(tags)
+    set_page_versions(request, versions)
+    return versions_etag(request, versions, *vary_on)
+
+
+def request_object(request: HttpRequest, queryset: QuerySet,
+                   tags: Optional[Iterable[str]] = None, **lookup) -> Model:
+    """
+    get_object_or_404 один раз на запрос.
+
+    Объект страницы нужен и валидатору, и вьюхе; второй вызов с тем же
+    запросом берет его из request. С tags объект между запросами
+    хранится в кеше (swr.py), пока не сменятся версии этих тегов.
+    """
+    objects = request.__dict__.setdefault('_request_objects', {})
+    key = (queryset.model._meta.label, tuple(sorted(lookup.items())))
+    if key not in objects:
+        if tags is None:
+            objects[key] = get_object_or_404(queryset, **lookup)
+        else:
+            objects[key] = swr.get_or_set(
+                f'object:{hashlib.md5(repr(key).encode()).hexdigest()}',
+                lambda: get_object_or_404(queryset, **lookup),
+                settings.FRAGMENT_CACHE_TIMEOUT,
+                tags=tags,
+                request=request,
+            )
+    return objects[key]
@@ -0,0 +1,88 @@
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .etags import versions_etag
+from .pages import fill_holes, page_key
+from .tags import matches, tag_versions
+from .tiered import reread
+
+
+class PageCacheMiddleware:
+    """
+    Отдает страницы PAGE_CACHE_NAMESPACES из полностраничного кеша.
+
+    Стоит последним в MIDDLEWARE: метки заполняются до того, как
+    CSRF и сессии допишут в ответ свои куки и заголовки.
+    """
+
+    def __init__(self, get_response: Callable):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        response = self.get_response(request)
+        if getattr(request, 'page_cache_stale', False):
+            del response['ETag']
+        if not getattr(request, 'page_cache_holes', False):
+            return response
+        if response.streaming:
+            return response
+        self.store(request, response)
+        response.content = fill_holes(request, response.content)
+        return response
+
+    def process_view(self, request: HttpRequest, view_func: Callable,
+                     view_args, view_kwargs) -> Optional[HttpResponse]:
+        timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', 300)
+        namespaces = getattr(settings, 'PAGE_CACHE_NAMESPACES', ('posts',))
+        if (
+            request.method not in ('GET', 'HEAD') or timeout <= 0
+            or request.resolver_match.namespace not in namespaces
+        ):
+            return None
+        key = page_key(request)
+        entry = cache.get(key)
+        if entry and not self.fresh(entry):
+            # Свежую страницу мог положить соседний воркер, а в L1 старая.
+            entry = reread(cache, key)
+        if entry and self.fresh(entry):
+            return self.hit(request, entry)
+        request.page_cache_holes = True
+        return None
+
+    def fresh(self, entry: dict) -> bool:
+        return matches(entry['versions'], tag_versions(entry['versions']))
+
+    def hit(self, request: HttpRequest, entry: dict) -> HttpResponse:
+        etag = quote_etag(versions_etag(request, entry['versions']))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(
+                fill_holes(request, entry['content']),
+                content_type=entry['content_type'],
+            )
+        response['ETag'] = etag
+        response['X-Page-Cache'] = 'hit'
+        return response
+
+    def store(self, request: HttpRequest, response: HttpResponse) -> None:
+        versions = getattr(request, 'page_cache_versions', None)
+        if (
+            versions is None or request.method != 'GET'
+            or getattr(request, 'page_cache_stale', False)
+            or response.status_code != 200 or response.cookies
+        ):
+            return
+        cache.set(
+            page_key(request),
+            {
+                'versions': versions,
+                'content': response.content,
+                'content_type': response['Content-Type'],
+            },
+            getattr(settings, 'PAGE_CACHE_TIMEOUT', 300),
+        )
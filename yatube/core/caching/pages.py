@@ -0,0 +1,88 @@
+"""
+Полностраничный кеш с дырами для личных фрагментов.
+
+Страница целиком, готовыми байтами, хранится под ключом из пути и
+параметров, которые читают вьюхи (PAGE_PARAMS), вместе с версиями
+тегов, по которым ее отрисовали: их записывают валидаторы ETag
+(etags.py) или set_page_tags. Попадание сверяет версии одним запросом
+к кешу и не трогает ни вьюху, ни базу (см.
+middleware.PageCacheMiddleware).
+
+Личное в странице (шапка, переключатель лент, кнопки автора) рисуется
+тегом {% hole %}. При рендере для кеша тег оставляет метку, а
+middleware заполняет метки под текущего пользователя и у свежего
+ответа, и у взятого из кеша. Гость и пользователь получают одно тело.
+"""
+import base64
+import hashlib
+import json
+import re
+from typing import Dict, Iterable
+from urllib.parse import urlencode
+
+from django.http import HttpRequest
+from django.template.loader import render_to_string
+
+from .tags import tag_versions
+
+KEY_PREFIX = 'page:'
+HOLE = re.compile(rb'<!--hole:([A-Za-z0-9_=-]+)-->')
+# Параметры, от которых зависит страница. Остальные (?utm_source=...)
+# не плодят копий страницы в кеше.
+PAGE_PARAMS = ('page', 'before', 'after', 'q')
+
+
+def page_key(request: HttpRequest) -> str:
+    params = urlencode([
+        (name, request.GET[name])
+        for name in PAGE_PARAMS if name in request.GET
+    ])
+    path = f'{request.path}?{params}'.encode()
+    return f'{KEY_PREFIX}{hashlib.md5(path).hexdigest()}'
+
+
+def set_page_versions(request: HttpRequest,
+                      versions: Dict[str, int]) -> None:
+    """Версии тегов, по которым отрисована страница; без них не кешируем."""
+    request.page_cache_versions = versions
+
+
+def set_page_tags(request: HttpRequest, tags: Iterable[str]) -> None:
+    """Страница без валидатора ETag объявляет свои теги здесь."""
+    set_page_versions(request, tag_versions(tags))
+
+
+def mark_stale(request: HttpRequest) -> None:
+    """
+    В странице устаревший фрагмент (см. swr.py).
+
+    Такую страницу не кладем в кеш и не отдаем с ETag: иначе старое
+    содержимое закрепилось бы под новыми версиями тегов.
+    """
+    request.page_cache_stale = True
+
+
+def hole(request: HttpRequest, template_name: str, context: Dict) -> str:
+    """
+    Личный фрагмент или, при рендере для кеша, метка на его месте.
+
+    Фрагмент рисуется из своего шаблона и context, а не из контекста
+    страницы, поэтому выглядит одинаково сразу и при заполнении метки.
+    В context только простые значения: он уходит в метку как JSON.
+    """
+    if not getattr(request, 'page_cache_holes', False):
+        return render_to_string(template_name, context, request=request)
+    payload = json.dumps([template_name, context]).encode()
+    return f'<!--hole:{base64.urlsafe_b64encode(payload).decode()}-->'
+
+
+def fill_holes(request: HttpRequest, content: bytes) -> bytes:
+    """Заполняет метки фрагментами для текущего пользователя."""
+    def render(match) -> bytes:
+        template_name, context = json.loads(
+            base64.urlsafe_b64decode(match.group(1))
+        )
+        return render_to_string(
+            template_name, context, request=request
+        ).encode()
+    return HOLE.sub(render, content)
@@ -0,0 +1,336 @@
+"""
+Кеш в общем для воркеров файле, отображенном в память (mmap).
+
+LocMemCache у каждого процесса свой: фрагмент, закешированный одним
+воркером, промахивается в остальных, а поднятая версия тега видна
+только там, где ее подняли. Этот бэкенд держит записи в одном файле,
+который все процессы хоста отображают в память:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.caching.shm.SharedMemoryCache',
+            'LOCATION': '/dev/shm/yatube.cache',
+            'OPTIONS': {'SIZE': 64 * 1024 * 1024, 'SLOTS': 65536},
+        }
+    }
+
+В файле заголовок, хеш-таблица слотов с открытой адресацией и куча, в
+которую записи (ключ и pickle значения) дописываются подряд. Писатели
+берут flock на файл и на время изменения делают счетчик seq в
+заголовке нечетным. Читатели замков не берут: читают seq, слот и
+запись и сверяют seq еще раз; если он сменился, чтение повторяется
+(seqlock). Время последнего чтения читатель пишет в слот без замка,
+для LRU хватает и приблизительного.
+
+Когда куча или таблица заполнены, выбрасываются просроченные записи,
+затем давно не читанные, пока живые не займут EVICT_TARGET бюджета, и
+куча уплотняется. incr и decr выполняются под замком писателя, поэтому
+атомарны между процессами.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MAGIC = b'YTBSHM01'
+# magic, seq, slots, heap_size, heap_used, live, count, dead
+HEADER = struct.Struct('<8s7Q')
+SEQ = struct.Struct('<Q')
+SEQ_OFFSET = 8
+# hash, offset, atime, expires, length, key_len
+SLOT = struct.Struct('<QQQdII')
+ATIME = struct.Struct('<Q')
+ATIME_OFFSET = 16
+EXPIRES = struct.Struct('<d')
+EXPIRES_OFFSET = 24
+EMPTY, DEAD = 0, 1
+
+DEFAULT_SIZE = 64 * 1024 * 1024
+DEFAULT_SLOTS = 65536
+# Доля занятых слотов, после которой таблица чистится
+MAX_LOAD = 0.75
+# До какой доли бюджета вытеснение освобождает кучу и таблицу
+EVICT_TARGET = 0.9
+# Значения крупнее этой доли кучи не кешируются
+MAX_ENTRY_SHARE = 0.125
+READ_RETRIES = 16
+
+Found = Tuple[int, bytes, float]
+
+
+def key_hash(key: bytes) -> int:
+    value = int.from_bytes(
+        hashlib.blake2b(key, digest_size=8).digest(), 'little'
+    )
+    return value if value > DEAD else value + DEAD + 1
+
+
+class SharedMemoryCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._size = int(options.get('SIZE', DEFAULT_SIZE))
+        self._slots = int(options.get('SLOTS', DEFAULT_SLOTS))
+        self._heap_start = HEADER.size + SLOT.size * self._slots
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._mm = None
+
+    # Файл и замки
+
+    @property
+    def _map(self) -> mmap.mmap:
+        # После fork файл открывается заново: flock на унаследованном
+        # дескрипторе общий с родителем и ничего бы не исключал.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._open()
+        return self._mm
+
+    def _open(self) -> None:
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+        total = self._heap_start + self._size
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size != total:
+                os.ftruncate(fd, total)
+            mm = mmap.mmap(fd, total)
+            magic, _, slots, size, *_ = HEADER.unpack_from(mm)
+            if (magic, slots, size) != (MAGIC, self._slots, self._size):
+                self._format(mm)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd, self._mm, self._pid = fd, mm, os.getpid()
+
+    def _format(self, mm: mmap.mmap, seq: int = 0) -> None:
+        mm[HEADER.size:self._heap_start] = bytes(
+            self._heap_start - HEADER.size
+        )
+        HEADER.pack_into(
+            mm, 0, MAGIC, seq, self._slots, self._size, 0, 0, 0, 0
+        )
+
+    @contextmanager
+    def _locked(self) -> Iterator[mmap.mmap]:
+        mm = self._map
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield mm
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _writing(self) -> Iterator[mmap.mmap]:
+        with self._locked() as mm:
+            seq = SEQ.unpack_from(mm, SEQ_OFFSET)[0]
+            # Нечетный seq без замка оставил упавший писатель.
+            seq += seq & 1
+            SEQ.pack_into(mm, SEQ_OFFSET, seq + 1)
+            try:
+                yield mm
+            finally:
+                SEQ.pack_into(mm, SEQ_OFFSET, seq + 2)
+
+    # Таблица и куча
+
+    def _slot_offset(self, index: int) -> int:
+        return HEADER.size + SLOT.size * index
+
+    def _find(self, mm: mmap.mmap, key: bytes, h: int) -> Optional[Found]:
+        """Слот, значение и срок записи; без замка может вернуть мусор."""
+        index = h % self._slots
+        for _ in range(self._slots):
+            slot_hash, offset, _, expires, length, key_len = SLOT.unpack_from(
+                mm, self._slot_offset(index)
+            )
+            if slot_hash == EMPTY:
+                return None
+            if slot_hash == h and key_len == len(key):
+                start = self._heap_start + offset
+                if mm[start:start + key_len] == key:
+                    return index, mm[start + key_len:start + length], expires
+            index = (index + 1) % self._slots
+        return None
+
+    def _read(self, key: bytes, h: int) -> Optional[Found]:
+        mm = self._map
+        for _ in range(READ_RETRIES):
+            seq = SEQ.unpack_from(mm, SEQ_OFFSET)[0]
+            if seq & 1:
+                time.sleep(0)
+                continue
+            found = self._find(mm, key, h)
+            if SEQ.unpack_from(mm, SEQ_OFFSET)[0] == seq:
+                return found
+        # Писатели не дают дочитать: читаем под их замком.
+        with self._locked() as mm:
+            return self._find(mm, key, h)
+
+    def _live(self, found: Optional[Found]) -> bool:
+        return found is not None and (
+            not found[2] or found[2] > time.time()
+        )
+
+    def _remove(self, mm: mmap.mmap, key: bytes, h: int) -> bool:
+        found = self._find(mm, key, h)
+        if found is None:
+            return False
+        offset = self._slot_offset(found[0])
+        length = SLOT.unpack_from(mm, offset)[4]
+        SLOT.pack_into(mm, offset, DEAD, 0, 0, 0.0, 0, 0)
+        header = list(HEADER.unpack_from(mm))
+        header[5] -= length
+        header[6] -= 1
+        header[7] += 1
+        HEADER.pack_into(mm, 0, *header)
+        return True
+
+    def _put(self, mm: mmap.mmap, key: bytes, h: int, value: bytes,
+             expires: float, atime: Optional[int] = None) -> bool:
+        self._remove(mm, key, h)
+        need = len(key) + len(value)
+        if need > self._size * MAX_ENTRY_SHARE:
+            return False
+        _, seq, _, _, used, live, count, dead = HEADER.unpack_from(mm)
+        if (
+            used + need > self._size
+            or count + dead + 1 > self._slots * MAX_LOAD
+        ):
+            self._evict(mm, need)
+            _, seq, _, _, used, live, count, dead = HEADER.unpack_from(mm)
+        start = self._heap_start + used
+        mm[start:start + need] = key + value
+        index = h % self._slots
+        while True:
+            slot_hash = SLOT.unpack_from(mm, self._slot_offset(index))[0]
+            if slot_hash in (EMPTY, DEAD):
+                break
+            index = (index + 1) % self._slots
+        SLOT.pack_into(
+            mm, self._slot_offset(index), h, used,
+            time.time_ns() if atime is None else atime, expires, need,
+            len(key),
+        )
+        if slot_hash == DEAD:
+            dead -= 1
+        HEADER.pack_into(
+            mm, 0, MAGIC, seq, self._slots, self._size, used + need,
+            live + need, count + 1, dead,
+        )
+        return True
+
+    def _evict(self, mm: mmap.mmap, need: int) -> None:
+        """Выбрасывает просроченные и давно не читанные, уплотняет кучу."""
+        now = time.time()
+        entries = []
+        for index in range(self._slots):
+            slot = SLOT.unpack_from(mm, self._slot_offset(index))
+            if slot[0] > DEAD and (not slot[3] or slot[3] > now):
+                entries.append(slot)
+        entries.sort(key=lambda slot: slot[2], reverse=True)
+        byte_budget = self._size * EVICT_TARGET - need
+        count_budget = self._slots * MAX_LOAD * EVICT_TARGET - 1
+        kept, total = [], 0
+        for h, offset, atime, expires, length, key_len in entries:
+            if len(kept) >= count_budget:
+                break
+            if total + length > byte_budget:
+                continue
+            start = self._heap_start + offset
+            record = mm[start:start + length]
+            kept.append((h, atime, expires, record, key_len))
+            total += length
+        self._format(mm, SEQ.unpack_from(mm, SEQ_OFFSET)[0])
+        for h, atime, expires, record, key_len in reversed(kept):
+            self._put(
+                mm, record[:key_len], h, record[key_len:], expires, atime
+            )
+
+    # API кеша Django
+
+    def _key(self, key, version) -> Tuple[bytes, int]:
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        raw = key.encode()
+        return raw, key_hash(raw)
+
+    def _expires(self, timeout) -> float:
+        expires = self.get_backend_timeout(timeout)
+        return 0.0 if expires is None else expires
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        raw, h = self._key(key, version)
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._writing() as mm:
+            if self._live(self._find(mm, raw, h)):
+                return False
+            return self._put(mm, raw, h, value, self._expires(timeout))
+
+    def get(self, key, default=None, version=None):
+        raw, h = self._key(key, version)
+        found = self._read(raw, h)
+        if not self._live(found):
+            return default
+        # Без замка: запись могла переехать, но время чтения
+        # в чужом слоте LRU только чуть огрубит.
+        ATIME.pack_into(
+            self._map, self._slot_offset(found[0]) + ATIME_OFFSET,
+            time.time_ns(),
+        )
+        return pickle.loads(found[1])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        raw, h = self._key(key, version)
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._writing() as mm:
+            self._put(mm, raw, h, value, self._expires(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        raw, h = self._key(key, version)
+        with self._writing() as mm:
+            found = self._find(mm, raw, h)
+            if not self._live(found):
+                return False
+            EXPIRES.pack_into(
+                mm, self._slot_offset(found[0]) + EXPIRES_OFFSET,
+                self._expires(timeout),
+            )
+            return True
+
+    def delete(self, key, version=None):
+        raw, h = self._key(key, version)
+        with self._writing() as mm:
+            return self._remove(mm, raw, h)
+
+    def has_key(self, key, version=None):
+        raw, h = self._key(key, version)
+        return self._live(self._read(raw, h))
+
+    def incr(self, key, delta=1, version=None):
+        raw, h = self._key(key, version)
+        with self._writing() as mm:
+            found = self._find(mm, raw, h)
+            if not self._live(found):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(found[1]) + delta
+            self._put(
+                mm, raw, h, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                found[2],
+            )
+        return value
+
+    def clear(self):
+        with self._writing() as mm:
+            self._format(mm, SEQ.unpack_from(mm, SEQ_OFFSET)[0])
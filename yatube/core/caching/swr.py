@@ -0,0 +1,111 @@
+"""
+Кеш с мягким и жестким сроком жизни (stale-while-revalidate).
+
+Запись лежит в кеше до жесткого срока, а свежей считается до мягкого
+и пока не сменились версии ее тегов (см. tags.py). Устаревшую запись
+пересчитывает один запрос, тот, кто взял замок cache.add; остальные в
+это время отдают старое значение и не идут в базу. Если записи нет
+вовсе, запросы без замка недолго ждут чужой результат и только потом
+считают сами. Сроки размываются случайной поправкой, чтобы записи,
+созданные разом, не истекали разом.
+"""
+import random
+import secrets
+import time
+from typing import Any, Callable, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest
+
+from .pages import mark_stale
+from .tags import matches, tag_versions
+from .tiered import reread
+
+LOCK_PREFIX = 'swr-lock:'
+# Замок переживет упавший пересчет, но не дольше этого
+LOCK_TIMEOUT = 30
+# Сколько ждать чужой пересчет, когда отдать нечего
+WAIT_TIMEOUT = 2
+POLL_INTERVAL = 0.05
+
+
+def jitter(timeout: float) -> float:
+    """Срок, укороченный на случайную долю до CACHE_JITTER."""
+    return timeout * (1 - random.random() * settings.CACHE_JITTER)
+
+
+def _lock(key: str) -> Optional[str]:
+    """Токен взятого замка или None, если замок у другого запроса."""
+    token = secrets.token_hex(8)
+    if cache.add(f'{LOCK_PREFIX}{key}', token, LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def _unlock(key: str, token: str) -> None:
+    # Замок мог истечь и достаться другому: чужой не снимаем.
+    if reread(cache, f'{LOCK_PREFIX}{key}') == token:
+        cache.delete(f'{LOCK_PREFIX}{key}')
+
+
+def _store(key: str, value: Any, versions: dict, timeout: float,
+           grace: float) -> None:
+    cache.set(
+        key,
+        {
+            'value': value,
+            'versions': versions,
+            'fresh_until': time.time() + jitter(timeout),
+        },
+        jitter(timeout + grace),
+    )
+
+
+def _wait(key: str, versions: dict) -> Optional[dict]:
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and matches(entry['versions'], versions):
+            return entry
+    return None
+
+
+def get_or_set(key: str, produce: Callable[[], Any], timeout: float,
+               grace: Optional[float] = None, tags: Iterable[str] = (),
+               request: Optional[HttpRequest] = None) -> Any:
+    """
+    Значение key; при промахе или устаревании его считает produce().
+
+    timeout задает мягкий срок, timeout + grace (по умолчанию
+    CACHE_STALE_GRACE) жесткий. Если запросу отдано устаревшее
+    значение, страница request не попадает в полностраничный кеш.
+    """
+    if grace is None:
+        grace = settings.CACHE_STALE_GRACE
+    versions = tag_versions(tags)
+    entry = cache.get(key)
+    if entry is not None and not matches(entry['versions'], versions):
+        # Свежую запись мог положить соседний воркер, а в L1 старая.
+        entry = reread(cache, key)
+    if (
+        entry is not None and matches(entry['versions'], versions)
+        and time.time() < entry['fresh_until']
+    ):
+        return entry['value']
+    token = _lock(key)
+    if token is not None:
+        try:
+            value = produce()
+            _store(key, value, versions, timeout, grace)
+        finally:
+            _unlock(key, token)
+        return value
+    if entry is None:
+        entry = _wait(key, versions)
+        if entry is None:
+            return produce()
+    elif request is not None:
+        mark_stale(request)
+    return entry['value']
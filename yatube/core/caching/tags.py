@@ -0,0 +1,93 @@
+"""
+Инвалидация кеша по тегам.
+
+У каждого тега ("post:1", "author:2", "feed:index") в кеше хранится
+номер версии. Фрагмент хранится вместе с версиями всех его тегов,
+поэтому достаточно поднять версию тега, и все зависящие от него
+фрагменты станут устаревшими (см. swr.py). Сами фрагменты можно хранить
+часами.
+
+Запрос, читающий реплику (core/replicas.py), видит базу на момент ее
+синхронизации, а версии тегов - уже новые. Поэтому такой запрос
+получает среди версий псевдотег SNAPSHOT с отметкой синхронизации:
+собранное с реплики годится только запросам с той же отметкой, а
+собранное из основной базы - всем (matches).
+
+Запись в транзакции поднимает версии дважды (invalidate_on_commit):
+сразу и после коммита. Иначе соседний запрос успел бы прочитать
+строки до коммита и положить их в кеш под уже новыми версиями.
+"""
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+TAG_PREFIX = 'tag:'
+SNAPSHOT = 'db:snapshot'
+
+_state = threading.local()
+
+
+def _key(tag: str) -> str:
+    return f'{TAG_PREFIX}{tag}'
+
+
+def _initial_version() -> int:
+    # Версия из часов: тег, вытесненный из кеша, не вернется
+    # к старому номеру и не воскресит устаревшие фрагменты.
+    return time.time_ns() // 1000
+
+
+def set_snapshot(snapshot: Optional[float]) -> None:
+    """Запрос читает копию базы с отметкой snapshot; None - основную."""
+    _state.snapshot = snapshot
+
+
+def tag_versions(tags: Iterable[str]) -> Dict[str, int]:
+    """Текущие версии тегов, одним запросом к кешу."""
+    keys = {_key(tag): tag for tag in tags if tag != SNAPSHOT}
+    found = cache.get_many(keys)
+    missing = {key: _initial_version() for key in keys if key not in found}
+    if missing:
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        found.update(cache.get_many(missing))
+    versions = {keys[key]: version for key, version in found.items()}
+    snapshot = getattr(_state, 'snapshot', None)
+    if snapshot is not None:
+        versions[SNAPSHOT] = snapshot
+    return versions
+
+
+def matches(stored: Dict[str, int], current: Dict[str, int]) -> bool:
+    """Записью с версиями stored можно ответить запросу с current."""
+    if SNAPSHOT not in stored:
+        # Собрано из основной базы: свежо и для читающих реплику.
+        current = {
+            tag: version for tag, version in current.items()
+            if tag != SNAPSHOT
+        }
+    return stored == current
+
+
+def invalidate(*tags: str) -> None:
+    """Поднимает версии тегов."""
+    for tag in tags:
+        try:
+            cache.incr(_key(tag))
+        except ValueError:
+            cache.set(_key(tag), _initial_version(), None)
+
+
+def invalidate_on_commit(*tags: str, using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Поднимает версии тегов сейчас и еще раз после коммита using.
+
+    Первый подъем нужен самой транзакции, которая читает свои записи,
+    второй сбрасывает то, что закешировали по строкам до коммита.
+    """
+    invalidate(*tags)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: invalidate(*tags), using=using)
@@ -0,0 +1,286 @@
+"""
+Двухуровневый кеш: маленький L1 в памяти процесса перед общим L2.
+
+Даже попадание в общий кеш (shm.py, memcached) стоит обращения к нему и
+распаковки. Горячие записи (фрагменты ленты, версии тегов, группы и
+авторы страниц) TieredCache держит еще и в L1 процесса:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.caching.tiered.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {'L1_MAX_ENTRIES': 1000, 'MAX_DELAY': 1},
+        },
+        'shared': {...},
+    }
+
+Запись идет в L2 и в свой L1. Удаления, incr (версии тегов) и очистка
+еще и публикуются в журнал поколений в L2: счетчик GEN_KEY и записи
+LOG_PREFIX<номер>. Остальные процессы не реже раза в MAX_DELAY секунд
+сверяют счетчик и выбрасывают из L1 ключи из новых записей журнала,
+поэтому чужие удаления и версии тегов доходят до них не позже чем
+через MAX_DELAY. Если журнал не дочитать (записи вытеснены или
+отставание больше LOG_SCAN), L1 очищается целиком.
+
+set не публикуется: иначе под нагрузкой записями журнал переполнялся
+бы и каждая сверка очищала L1. Чужая запись set видна, когда своя
+копия в L1 истечет (L1_TIMEOUT). Записи с версиями тегов (swr.py,
+полностраничный кеш) при несовпадении версий перечитываются мимо L1
+(reread). add решает L2 и в L1 не попадает: это замки и счетчики.
+
+L1 хранит сами объекты, без pickle: set кладет туда копию, а
+значения, полученные из кеша, изменять нельзя.
+
+Попадания в L1, L2 и промахи процесс копит у себя и при сверке
+добавляет к общим счетчикам в L2; их показывает команда cache_stats.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+GEN_KEY = 'tiered:gen'
+LOG_PREFIX = 'tiered:log:'
+STATS_PREFIX = 'tiered:stats:'
+STATS = ('l1_hits', 'l2_hits', 'misses', 'l1_flushes')
+# Пометка журнала: L2 очищен целиком
+EVERYTHING = '*'
+LOG_TIMEOUT = 5 * 60
+# Отставание, после которого журнал не читается, а L1 очищается
+LOG_SCAN = 256
+
+DEFAULT_L1_MAX_ENTRIES = 1000
+DEFAULT_L1_TIMEOUT = 30
+DEFAULT_MAX_DELAY = 1.0
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location
+        self._l1_max_entries = int(
+            options.get('L1_MAX_ENTRIES', DEFAULT_L1_MAX_ENTRIES)
+        )
+        self._l1_timeout = float(
+            options.get('L1_TIMEOUT', DEFAULT_L1_TIMEOUT)
+        )
+        self._max_delay = float(options.get('MAX_DELAY', DEFAULT_MAX_DELAY))
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self._seen = None
+        self._next_sync = 0.0
+        self._stats = dict.fromkeys(STATS, 0)
+
+    @property
+    def l2(self) -> BaseCache:
+        return caches[self._l2_alias]
+
+    # L1
+
+    def _l1_key(self, key, version) -> str:
+        key = self.l2.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _l1_get(self, key: str):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return entry[1]
+
+    def _l1_set(self, key: str, value, timeout=DEFAULT_TIMEOUT) -> None:
+        ttl = self._l1_timeout
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.l2.default_timeout
+        if timeout is not None:
+            ttl = min(ttl, timeout)
+        if ttl <= 0:
+            self._l1_pop(key)
+            return
+        with self._lock:
+            self._l1[key] = (time.monotonic() + ttl, value)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_pop(self, key: str) -> None:
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def _l1_clear(self) -> None:
+        with self._lock:
+            self._l1.clear()
+        self._stats['l1_flushes'] += 1
+
+    # Журнал поколений
+
+    def _publish(self, key: str) -> None:
+        """Сообщает остальным процессам, что key изменился."""
+        try:
+            generation = self.l2.incr(GEN_KEY)
+        except ValueError:
+            # Счетчик из часов: после очистки или вытеснения L2 он не
+            # повторит номер, на котором остановились соседи.
+            self.l2.add(GEN_KEY, time.time_ns() // 1000, None)
+            generation = self.l2.incr(GEN_KEY)
+        self.l2.set(f'{LOG_PREFIX}{generation}', key, LOG_TIMEOUT)
+        # Свою запись читать незачем, если до нее журнал дочитан.
+        if self._seen == generation - 1:
+            self._seen = generation
+
+    def _sync(self) -> None:
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        self._next_sync = now + self._max_delay
+        generation = self.l2.get(GEN_KEY)
+        self._flush_stats()
+        if generation == self._seen:
+            return
+        if (
+            generation is None or self._seen is None
+            or not 0 < generation - self._seen <= LOG_SCAN
+        ):
+            self._l1_clear()
+        else:
+            log_keys = [
+                f'{LOG_PREFIX}{number}'
+                for number in range(self._seen + 1, generation + 1)
+            ]
+            changed = self.l2.get_many(log_keys)
+            if len(changed) < len(log_keys) or EVERYTHING in changed.values():
+                self._l1_clear()
+            else:
+                for key in changed.values():
+                    self._l1_pop(key)
+        self._seen = generation
+
+    def _flush_stats(self) -> None:
+        stats, self._stats = self._stats, dict.fromkeys(STATS, 0)
+        for name, count in stats.items():
+            if not count:
+                continue
+            key = f'{STATS_PREFIX}{name}'
+            try:
+                self.l2.incr(key, count)
+            except ValueError:
+                if not self.l2.add(key, count, None):
+                    self.l2.incr(key, count)
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики всех процессов, включая еще не сброшенные свои."""
+        self._flush_stats()
+        found = self.l2.get_many([f'{STATS_PREFIX}{name}' for name in STATS])
+        return {
+            name: found.get(f'{STATS_PREFIX}{name}', 0) for name in STATS
+        }
+
+    def reset_stats(self) -> None:
+        self._stats = dict.fromkeys(STATS, 0)
+        self.l2.delete_many([f'{STATS_PREFIX}{name}' for name in STATS])
+
+    # API кеша Django
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        l1_key = self._l1_key(key, version)
+        value = self._l1_get(l1_key)
+        if value is not None:
+            self._stats['l1_hits'] += 1
+            return value
+        return self._l2_get(key, l1_key, default, version)
+
+    def refresh(self, key, default=None, version=None):
+        """Значение из L2 мимо L1: своя копия могла устареть."""
+        l1_key = self._l1_key(key, version)
+        self._l1_pop(l1_key)
+        return self._l2_get(key, l1_key, default, version)
+
+    def _l2_get(self, key, l1_key: str, default, version):
+        value = self.l2.get(key, version=version)
+        if value is None:
+            self._stats['misses'] += 1
+            return default
+        self._stats['l2_hits'] += 1
+        self._l1_set(l1_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found, missing = {}, {}
+        for key in keys:
+            l1_key = self._l1_key(key, version)
+            value = self._l1_get(l1_key)
+            if value is None:
+                missing[key] = l1_key
+            else:
+                found[key] = value
+        self._stats['l1_hits'] += len(found)
+        if missing:
+            fetched = self.l2.get_many(list(missing), version=version)
+            self._stats['l2_hits'] += len(fetched)
+            self._stats['misses'] += len(missing) - len(fetched)
+            for key, value in fetched.items():
+                self._l1_set(missing[key], value)
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        return self.get(key, version=version) is not None
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        l1_key = self._l1_key(key, version)
+        self.l2.set(key, value, timeout, version=version)
+        # Копия: вызывающий может дальше менять свой объект.
+        self._l1_set(l1_key, copy.deepcopy(value), timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Замки и счетчики решаются в L2: в L1 соседей ключа может
+        # еще не быть или он может быть устаревшим.
+        l1_key = self._l1_key(key, version)
+        self._l1_pop(l1_key)
+        return self.l2.add(key, value, timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        l1_key = self._l1_key(key, version)
+        self._l1_pop(l1_key)
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        l1_key = self._l1_key(key, version)
+        result = self.l2.delete(key, version=version)
+        self._l1_pop(l1_key)
+        self._publish(l1_key)
+        return result
+
+    def incr(self, key, delta=1, version=None):
+        l1_key = self._l1_key(key, version)
+        value = self.l2.incr(key, delta, version=version)
+        # Срок записи в L2 неизвестен: в L1 она живет L1_TIMEOUT.
+        self._l1_set(l1_key, value, None)
+        self._publish(l1_key)
+        return value
+
+    def clear(self):
+        self.l2.clear()
+        self._l1_clear()
+        self._publish(EVERYTHING)
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+
+def reread(cache: BaseCache, key: str):
+    """Значение key мимо L1, если cache двухуровневый."""
+    refresh = getattr(cache, 'refresh', None)
+    return cache.get(key) if refresh is None else refresh(key)
@@ -0,0 +1,289 @@
+"""
+Потоковые выгрузка и загрузка в формате dumpdata.
+
+loaddata читает JSON целиком и сохраняет объекты по одному через
+save(). Здесь массив разбирается по кускам (iter_objects), строки
+раскладываются по временным файлам моделей (Spool) и загружаются
+модель за моделью в порядке ссылок (dependency_order) пачками INSERT
+в транзакциях по несколько пачек (load_model).
+
+Вставка идет как у loaddata с raw=True: значения берутся из выгрузки
+как есть, без pre_save (auto_now_add не затирает даты), и без
+сигналов. Строки, чьи id уже есть в базе, обновляются.
+
+dump_model пишет одну модель в файл байт в байт как dumpdata, но не
+собирает объекты моделей: строки идут из values_list().iterator()
+кусками по chunk_size, связи многие-ко-многим читаются одним запросом
+на кусок. Память не растет с объемом таблицы.
+"""
+import gzip
+import json
+import tempfile
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Type
+
+from django.apps import apps
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Model
+from django.utils.encoding import is_protected_type
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\r\n'
+
+
+class _Buffer:
+    """Окно в поток: дочитывает куски, когда данных не хватает."""
+
+    def __init__(self, stream: TextIO, chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.text, self.position, self.eof = '', 0, False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> None:
+        if self.eof:
+            raise ValueError('Выгрузка оборвалась.')
+        chunk = self.stream.read(self.chunk_size)
+        self.text = self.text[self.position:] + chunk
+        self.position, self.eof = 0, not chunk
+
+    def peek(self) -> str:
+        """Следующий непробельный символ."""
+        while True:
+            while (self.position < len(self.text)
+                   and self.text[self.position] in WHITESPACE):
+                self.position += 1
+            if self.position < len(self.text):
+                return self.text[self.position]
+            self._fill()
+
+    def take(self, expected: str) -> None:
+        char = self.peek()
+        if char != expected:
+            raise ValueError(f'Ожидался {expected!r}, а не {char!r}.')
+        self.position += 1
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                item, self.position = self.decoder.raw_decode(
+                    self.text, self.position
+                )
+                return item
+            except json.JSONDecodeError:
+                # Объект не поместился в окно: дочитываем и разбираем
+                # снова. Кончился поток - ошибка настоящая.
+                if self.eof:
+                    raise
+                self._fill()
+
+
+def iter_objects(stream: TextIO,
+                 chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """Элементы JSON-массива из потока, не читая его целиком."""
+    buffer = _Buffer(stream, chunk_size)
+    buffer.take('[')
+    if buffer.peek() == ']':
+        return
+    while True:
+        yield buffer.decode()
+        if buffer.peek() == ']':
+            return
+        buffer.take(',')
+
+
+def open_fixture(path: str, mode: str = 'r') -> TextIO:
+    """Файл выгрузки; .gz сжимается и распаковывается на лету."""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class Spool:
+    """Строки выгрузки, разложенные по временным файлам моделей."""
+
+    def __init__(self):
+        self.files: Dict[str, TextIO] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, item: dict) -> None:
+        label = item['model'].lower()
+        if label not in self.files:
+            self.files[label] = tempfile.TemporaryFile('w+', encoding='utf-8')
+            self.counts[label] = 0
+        self.files[label].write(json.dumps(item, ensure_ascii=False) + '\n')
+        self.counts[label] += 1
+
+    def rows(self, label: str) -> Iterator[dict]:
+        file = self.files[label]
+        file.seek(0)
+        for line in file:
+            yield json.loads(line)
+
+    def models(self) -> List[Type[Model]]:
+        return [apps.get_model(label) for label in self.files]
+
+    def close(self) -> None:
+        for file in self.files.values():
+            file.close()
+
+    def __enter__(self) -> 'Spool':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _references(model: Type[Model]) -> set:
+    fields = [*model._meta.concrete_fields, *model._meta.local_many_to_many]
+    return {
+        field.related_model for field in fields
+        if field.is_relation and field.related_model is not model
+    }
+
+
+def dependency_order(models: Iterable[Type[Model]]) -> List[Type[Model]]:
+    """Модели в таком порядке, чтобы ссылки вели на уже загруженные."""
+    pending = list(models)
+    ordered: List[Type[Model]] = []
+    while pending:
+        for model in pending:
+            if not _references(model) & set(pending) - {model}:
+                break
+        else:
+            # Цикл ссылок: внешние ключи SQLite проверяются при коммите,
+            # а порядок остальных от этого не страдает.
+            model = pending[0]
+        pending.remove(model)
+        ordered.append(model)
+    return ordered
+
+
+def batches(items: Iterable, size: int) -> Iterator[list]:
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _insert(model: Type[Model], objects: List[Model], using: str) -> None:
+    """INSERT без pre_save и сигналов, с учетом лимита параметров базы."""
+    fields = model._meta.local_concrete_fields
+    manager = model._base_manager.using(using)
+    size = connections[using].ops.bulk_batch_size(fields, objects)
+    for batch in batches(objects, max(size, 1)):
+        manager._insert(batch, fields=fields, raw=True, using=using)
+
+
+def _save_batch(model: Type[Model], rows: List[dict], using: str) -> None:
+    loaded = list(serializers.deserialize('python', rows, using=using))
+    objects = [item.object for item in loaded]
+    manager = model._base_manager.using(using)
+    existing = set(manager.filter(
+        pk__in=[obj.pk for obj in objects]
+    ).values_list('pk', flat=True))
+    _insert(model, [obj for obj in objects if obj.pk not in existing], using)
+    manager.bulk_update(
+        [obj for obj in objects if obj.pk in existing],
+        [field.name for field in model._meta.local_concrete_fields
+         if not field.primary_key],
+    )
+    for field in model._meta.local_many_to_many:
+        through = field.remote_field.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        links = [
+            through(**{f'{source}_id': item.object.pk, f'{target}_id': pk})
+            for item in loaded
+            for pk in item.m2m_data.get(field.name, ())
+        ]
+        through._base_manager.using(using).filter(
+            **{f'{source}__in': existing}
+        ).delete()
+        _insert(through, links, using)
+
+
+def load_model(model: Type[Model], rows: Iterable[dict], using: str,
+               batch_size: int, transaction_size: int) -> int:
+    """
+    Загружает строки одной модели, возвращает их число.
+
+    Каждая транзакция - transaction_size строк пачками по batch_size.
+    """
+    loaded = 0
+    for chunk in batches(rows, transaction_size):
+        with transaction.atomic(using=using):
+            for batch in batches(chunk, batch_size):
+                _save_batch(model, batch, using)
+        loaded += len(chunk)
+    return loaded
+
+
+def _plain(model: Type[Model], field, value):
+    """Значение поля так, как его пишет сериализатор Django."""
+    if is_protected_type(value) or isinstance(value, str):
+        return value
+    return field.value_to_string(model(**{field.attname: value}))
+
+
+def _related_ids(field, pks: List) -> Dict[object, list]:
+    """Id связанных объектов для строк pks, в порядке менеджера связи."""
+    name = field.related_query_name()
+    related = field.remote_field.model._default_manager.filter(
+        **{f'{name}__in': pks}
+    ).values_list(name, 'pk')
+    found: Dict[object, list] = {pk: [] for pk in pks}
+    for pk, related_pk in related.iterator():
+        found[pk].append(related_pk)
+    return found
+
+
+def dump_model(label: str, path: str, chunk_size: int,
+               indent: Optional[int] = None,
+               using: str = DEFAULT_DB_ALIAS) -> int:
+    """Пишет строки модели в файл как dumpdata, возвращает их число."""
+    model = apps.get_model(label)
+    label = model._meta.label_lower
+    meta = model._meta.concrete_model._meta
+    fields = [field for field in meta.local_fields if field.serialize]
+    many = [
+        field for field in meta.many_to_many
+        if field.serialize and field.remote_field.through._meta.auto_created
+    ]
+    rows = model._default_manager.using(using).order_by(
+        meta.pk.name
+    ).values_list(meta.pk.attname, *(field.attname for field in fields))
+    options = {'indent': indent, 'cls': DjangoJSONEncoder}
+    if indent:
+        options['separators'] = (',', ': ')
+    written = 0
+    with open_fixture(path, 'w') as stream:
+        stream.write('[')
+        for batch in batches(rows.iterator(chunk_size=chunk_size),
+                             chunk_size):
+            pks = [row[0] for row in batch]
+            related = {field: _related_ids(field, pks) for field in many}
+            for pk, *values in batch:
+                data = {
+                    field.name: _plain(model, field, value)
+                    for field, value in zip(fields, values)
+                }
+                for field in many:
+                    data[field.name] = related[field][pk]
+                if written:
+                    stream.write(',' if indent else ', ')
+                if indent:
+                    stream.write('\n')
+                json.dump(
+                    {'model': label, 'pk': _plain(model, meta.pk, pk),
+                     'fields': data},
+                    stream, **options,
+                )
+                written += 1
+        stream.write('\n]\n' if indent else ']')
+    return written
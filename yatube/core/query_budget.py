@@ -0,0 +1,75 @@
+"""
+Бюджеты SQL-запросов на страницу.
+
+Вьюха объявляет, сколько запросов ей положено, декоратором
+@query_budget(n); настройка QUERY_BUDGETS ({'posts:index': n})
+переопределяет бюджет по имени URL. Middleware считает запросы каждого
+ответа и пишет в лог yatube.query_budget, если бюджет превышен, а тесты
+в posts/tests/test_query_budget.py падают на том же условии.
+"""
+import logging
+from contextlib import ExitStack
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+logger = logging.getLogger('yatube.query_budget')
+
+
+def query_budget(limit: int) -> Callable:
+    """Объявляет максимум SQL-запросов для вьюхи."""
+    def decorator(view: Callable) -> Callable:
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def budget_for(view: Callable, url_name: Optional[str]) -> Optional[int]:
+    """Бюджет вьюхи с учетом QUERY_BUDGETS из настроек."""
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if url_name in budgets:
+        return budgets[url_name]
+    return getattr(view, 'query_budget', None)
+
+
+class QueryCounter:
+    """Считает запросы ко всем базам, пока открыт контекст."""
+
+    def __init__(self):
+        self.count = 0
+        self._stack = ExitStack()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self) -> 'QueryCounter':
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._stack.__exit__(*exc_info)
+
+
+class QueryBudgetMiddleware:
+    """Пишет в лог страницы, превысившие свой бюджет запросов."""
+
+    def __init__(self, get_response: Callable):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is None:
+            return response
+        budget = budget_for(match.func, match.view_name)
+        if budget is not None and counter.count > budget:
+            logger.warning(
+                '%s: %d SQL-запросов при бюджете %d (%s)',
+                match.view_name, counter.count, budget, request.path,
+            )
+        return response
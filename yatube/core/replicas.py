@@ -0,0 +1,154 @@
+"""
+Чтение страниц с реплики.
+
+GET-запросы вьюх с декоратором @read_replica читают из базы
+DATABASE_REPLICA, все остальное идет в основную. Реплика отстает,
+поэтому после записи сессия читает из основной базы и видит свои
+изменения: не меньше REPLICA_STICKY_SECONDS секунд и, сверх того, пока
+реплика не синхронизирована позже этой записи. Запись посреди запроса
+переключает на основную и остаток этого запроса. Реплика, которую не
+синхронизировали дольше REPLICA_MAX_LAG секунд, не используется.
+
+Локальная реплика SQLite - второй файл, который команда sync_replica
+догоняет до основной базы через online backup API (sync). Пока файла
+нет или реплика указывает на ту же базу, что и основная (так в тестах,
+где она TEST MIRROR), все читается из основной.
+
+Страницы и фрагменты кешируются по версиям тегов, которые поднимаются
+сразу при записи. Страница, собранная с отстающей реплики, не должна
+лечь в кеш под новыми версиями со старыми данными, поэтому запрос,
+читающий реплику, добавляет к версиям отметку ее синхронизации
+(core.caching.tags.set_snapshot). Отметка sync живет в кеше: процессы
+должны делить его (shm), иначе веб-воркеры ее не увидят и будут
+читать из основной базы.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpRequest, HttpResponse
+
+from core.caching.tags import set_snapshot
+
+# Время последней записи сессии
+STICKY_KEY = '_wrote_at'
+SYNCED_PREFIX = 'replica:synced:'
+# Сессии читаются до вьюхи и сразу после входа: им реплика не годится.
+PRIMARY_APPS = ('sessions',)
+
+_state = threading.local()
+
+
+def read_replica(view: Callable) -> Callable:
+    """Разрешает вьюхе читать с реплики в GET-запросах."""
+    view.read_replica = True
+    return view
+
+
+def replica(wrote_at: float = 0) -> Optional[Tuple[str, float]]:
+    """
+    Реплика и отметка ее sync, если с нее можно читать, иначе None.
+
+    wrote_at - время последней записи сессии: реплика должна быть
+    синхронизирована позже.
+    """
+    alias = getattr(settings, 'DATABASE_REPLICA', None)
+    if alias is None or alias not in connections.databases:
+        return None
+    settings_dict = connections[alias].settings_dict
+    primary = connections[DEFAULT_DB_ALIAS].settings_dict
+    if settings_dict['NAME'] == primary['NAME']:
+        return None
+    if settings_dict['ENGINE'].endswith('sqlite3') and not os.path.exists(
+        settings_dict['NAME']
+    ):
+        return None
+    synced = cache.get(f'{SYNCED_PREFIX}{alias}')
+    now = time.time()
+    if (
+        synced is None or synced <= wrote_at
+        or now - synced > settings.REPLICA_MAX_LAG
+        or now < wrote_at + settings.REPLICA_STICKY_SECONDS
+    ):
+        return None
+    return alias, synced
+
+
+def sync(alias: str) -> None:
+    """Копирует основную базу SQLite в реплику alias."""
+    # Отметка до копии: запись во время копирования оставит сессию
+    # на основной базе до следующего sync, а не наоборот.
+    synced = time.time()
+    primary = connections[DEFAULT_DB_ALIAS]
+    primary.ensure_connection()
+    target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+    try:
+        with primary.wrap_database_errors:
+            primary.connection.backup(target)
+    finally:
+        target.close()
+    cache.set(f'{SYNCED_PREFIX}{alias}', synced, None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return getattr(_state, 'replica', None)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_APPS:
+            _state.replica = None
+            _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия основной базы: объекты из них связываются.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Таблицы в реплику приходят копией основной базы.
+        return db != getattr(settings, 'DATABASE_REPLICA', None)
+
+
+class ReplicaMiddleware:
+    """
+    Включает реплику для GET вьюх с @read_replica.
+
+    Стоит после SessionMiddleware: отметка о записи попадает в сессию
+    до того, как та сохранится.
+    """
+
+    def __init__(self, get_response: Callable):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        _state.replica, _state.wrote = None, False
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.replica, _state.wrote = None, False
+            set_snapshot(None)
+        # Попутные записи страниц с реплики (починка счетчиков) не
+        # повод привязывать к основной базе, тем более гостя.
+        if wrote and not getattr(request, 'read_replica', False):
+            request.session[STICKY_KEY] = time.time()
+        return response
+
+    def process_view(self, request: HttpRequest, view_func: Callable,
+                     view_args, view_kwargs) -> None:
+        if request.method not in ('GET', 'HEAD') or not getattr(
+            view_func, 'read_replica', False
+        ):
+            return
+        request.read_replica = True
+        found = replica(request.session.get(STICKY_KEY, 0))
+        if found is not None:
+            _state.replica, snapshot = found
+            set_snapshot(snapshot)
@@ -0,0 +1,91 @@
+"""
+Настройка соединений SQLite.
+
+PRAGMA из SQLITE_PRAGMAS выполняются на каждом новом соединении:
+журнал WAL (читатели не ждут писателя), synchronous=NORMAL (в WAL
+этого достаточно для целостности), отображение файла в память, размер
+страничного кеша и busy_timeout, чтобы писатели ждали друг друга, а не
+падали с "database is locked". Соединения живут CONN_MAX_AGE секунд, и
+долгоживущее соединение раз в OPTIMIZE_INTERVAL после запроса выполняет
+PRAGMA optimize, как советует документация SQLite.
+
+indexes_dropped снимает обычные индексы таблиц на время массовой
+загрузки: CREATE INDEX по готовым данным дешевле, чем обновлять индекс
+на каждой вставке.
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Union
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+OPTIMIZE_INTERVAL = 60 * 60
+
+Pragmas = Dict[str, Union[str, int]]
+
+
+def apply_pragmas(connection, pragmas: Pragmas) -> None:
+    """Выполняет PRAGMA на соединении DB-API (sqlite3.Connection)."""
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+def configure(sender, connection: BaseDatabaseWrapper, **kwargs) -> None:
+    """Обработчик connection_created."""
+    if connection.vendor != 'sqlite':
+        return
+    apply_pragmas(
+        connection.connection, getattr(settings, 'SQLITE_PRAGMAS', {})
+    )
+    connection.optimized_at = time.monotonic()
+
+
+def optimize(sender, **kwargs) -> None:
+    """Обработчик request_finished: PRAGMA optimize раз в интервал."""
+    now = time.monotonic()
+    for connection in connections.all():
+        if (
+            connection.vendor != 'sqlite' or connection.connection is None
+            or connection.in_atomic_block
+            or now - getattr(connection, 'optimized_at', now)
+            < OPTIMIZE_INTERVAL
+        ):
+            continue
+        connection.connection.execute('PRAGMA optimize')
+        connection.optimized_at = now
+
+
+@contextmanager
+def indexes_dropped(connection: BaseDatabaseWrapper,
+                    tables: Iterable[str]) -> Iterator[List[str]]:
+    """
+    Удаляет неуникальные индексы таблиц и создает их заново на выходе.
+
+    Уникальные индексы остаются: на них держатся ограничения. На других
+    базах ничего не делает.
+    """
+    if connection.vendor != 'sqlite':
+        yield []
+        return
+    tables = list(tables)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+            'AND sql IS NOT NULL AND tbl_name IN (%s)'
+            % ', '.join(['%s'] * len(tables)),
+            tables,
+        )
+        indexes = [
+            (name, sql) for name, sql in cursor.fetchall()
+            if not sql.upper().startswith('CREATE UNIQUE')
+        ]
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+    try:
+        yield [name for name, _ in indexes]
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
@@ -0,0 +1,90 @@
+"""
+Хранилище файлов с адресацией по содержимому.
+
+Имя файла выводится из SHA-256 его содержимого: одинаковые загрузки
+ложатся в один файл <каталог>/ab/cd/<хеш>.<расширение>, и для него
+один раз строятся миниатюры и варианты. Хеш считается на лету, пока
+загрузка пишется во временный файл рядом с целевым каталогом, поэтому
+файл читается один раз и целиком в памяти не держится.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_NAME = re.compile(r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+# Каталог недописанных загрузок внутри каталога upload_to.
+INCOMING_DIR = '.incoming'
+
+
+def is_blob_name(name: str) -> bool:
+    """Имя уже в адресации по содержимому."""
+    return bool(BLOB_NAME.search(name))
+
+
+def blob_name(directory: str, digest: str, extension: str) -> str:
+    return os.path.join(
+        directory, digest[:2], digest[2:4], f'{digest}{extension.lower()}'
+    )
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage, сохраняющий файл под хешем содержимого.
+
+    Из предложенного имени берутся только каталог и расширение. Если
+    файл с таким содержимым уже есть, он не перезаписывается, и save()
+    просто возвращает его имя. Удаление не учитывает ссылки: файлы без
+    ссылок убирает сборщик мусора, а не код сохранения.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Совпадение имени - это совпадение содержимого, а не конфликт.
+        return name
+
+    def _save(self, name, content):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1]
+        incoming = self.path(os.path.join(directory, INCOMING_DIR))
+        os.makedirs(incoming, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=incoming, suffix=extension)
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            name = blob_name(directory, digest.hexdigest(), extension)
+            path = self.path(name)
+            if os.path.exists(path):
+                os.unlink(temp_path)
+                # Свежая дата защищает файл от сборщика мусора, пока
+                # пост с ним еще не закоммичен.
+                os.utime(path)
+                return name
+            self._makedirs(os.path.dirname(path))
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            # Переименование атомарно: читатель не увидит файл наполовину.
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return name
+
+    def _makedirs(self, directory: str) -> None:
+        if self.directory_permissions_mode is None:
+            os.makedirs(directory, exist_ok=True)
+            return
+        old_umask = os.umask(0)
+        try:
+            os.makedirs(
+                directory, self.directory_permissions_mode, exist_ok=True
+            )
+        finally:
+            os.umask(old_umask)
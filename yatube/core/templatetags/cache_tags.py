@@ -0,0 +1,108 @@
+from django import template
+from django.conf import settings
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.safestring import mark_safe
+
+from core.caching import pages, swr
+
+register = template.Library()
+
+
+class TagCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, timeout, tags, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.timeout = timeout
+        self.tags = tags
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = settings.FRAGMENT_CACHE_TIMEOUT
+        if self.timeout is not None:
+            timeout = self.timeout.resolve(context)
+            try:
+                timeout = int(timeout)
+            except (ValueError, TypeError):
+                raise template.TemplateSyntaxError(
+                    f'Срок кеширования должен быть целым, а не {timeout!r}.'
+                )
+        tags = ()
+        if self.tags is not None:
+            tags = self.tags.resolve(context) or ()
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        return swr.get_or_set(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            timeout,
+            tags=tags,
+            request=context.get('request'),
+        )
+
+
+@register.tag('tagcache')
+def do_tagcache(parser, token):
+    """
+    Кеширует фрагмент до изменения любого из его тегов.
+
+    {% tagcache index_page cache_tags page_obj.number %}
+        ...
+    {% endtagcache %}
+
+    Срок FRAGMENT_CACHE_TIMEOUT мягкий: устаревший фрагмент пересчитывает
+    один запрос, остальные отдают прежний (см. core.caching.swr).
+    """
+    nodelist = parser.parse(('endtagcache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' принимает минимум два аргумента."
+        )
+    return TagCacheNode(
+        nodelist,
+        bits[1],
+        None,
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
+
+
+@register.tag('cache')
+def do_cache(parser, token):
+    """
+    {% cache %} из django.templatetags.cache с защитой от набегов.
+
+    {% cache 20 index_page page_obj.number %}
+        ...
+    {% endcache %}
+
+    Срок мягкий, после него фрагмент еще CACHE_STALE_GRACE отдается,
+    пока его пересчитывает один запрос.
+    """
+    nodelist = parser.parse(('endcache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' принимает минимум два аргумента."
+        )
+    return TagCacheNode(
+        nodelist,
+        bits[2],
+        parser.compile_filter(bits[1]),
+        None,
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **kwargs):
+    """
+    Личный фрагмент, который полностраничный кеш рисует на каждый запрос.
+
+    {% hole 'includes/switcher.html' index=index %}
+
+    Шаблон фрагмента видит только переданные значения и контекстные
+    процессоры (user, request).
+    """
+    return mark_safe(pages.hole(context['request'], template_name, kwargs))
@@ -0,0 +1,219 @@
+"""
+Фоновая генерация миниатюр sorl-thumbnail.
+
+Без нее миниатюра строится при первом рендере страницы, и первый
+посетитель после загрузки ждет PIL. Здесь миниатюры всех размеров из
+THUMBNAIL_GEOMETRIES строятся в ограниченном пуле потоков сразу после
+загрузки, а шаблоны до готовности показывают оригинал. Вьюхи
+разрешают миниатюры всей страницы одним пакетом (attach_thumbnails). Для
+изображений, загруженных раньше, есть команда generate_thumbnails.
+"""
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Set, Tuple, Union
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.dispatch import Signal
+from django.utils.functional import SimpleLazyObject
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+logger = logging.getLogger('yatube.thumbnails')
+
+Geometry = Tuple[str, Dict]
+# Оригинал вместо еще не построенной миниатюры: размеры неизвестны.
+Original = namedtuple('Original', 'url width height')
+Resolved = Union[ImageFile, Original, None]
+
+# Миниатюры изображения построены: страницы с ним пора перерисовать.
+thumbnails_ready = Signal(providing_args=['name'])
+
+_executor: Optional[ThreadPoolExecutor] = None
+_pending: Set[str] = set()
+_lock = threading.Lock()
+
+
+def geometries() -> Tuple[Geometry, ...]:
+    return tuple(getattr(settings, 'THUMBNAIL_GEOMETRIES', ()))
+
+
+def workers() -> int:
+    return getattr(settings, 'THUMBNAIL_WORKERS', 2)
+
+
+def in_memory_db() -> bool:
+    """
+    Общая in-memory база SQLite (так устроена тестовая) не ждет
+    блокировок между потоками: запись из пула уронила бы соседний
+    запрос, поэтому с ней фоновая работа выполняется в текущем потоке.
+    """
+    connection = connections['default']
+    return connection.vendor == 'sqlite' and (
+        connection.creation.is_in_memory_db(connection.settings_dict['NAME'])
+    )
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=workers(), thread_name_prefix='thumbnails'
+            )
+        return _executor
+
+
+def thumbnail_file(file_, geometry: str, **options) -> ImageFile:
+    """Файл миниатюры с теми же опциями, что подставит sorl-thumbnail."""
+    backend = default.backend
+    source = ImageFile(file_)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def cached_thumbnail(file_, geometry: str, **options) -> Optional[ImageFile]:
+    """Готовая миниатюра из хранилища ключей или None; ничего не строит."""
+    return default.kvstore.get(thumbnail_file(file_, geometry, **options))
+
+
+def _lookup(thumbnails: Dict[str, ImageFile]) -> Dict[str, ImageFile]:
+    """
+    Готовые миниатюры из хранилища ключей, по имени исходника.
+
+    Один get_many к кешу и один запрос к базе для промахов вместо
+    пары запросов на каждую миниатюру.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        found = {
+            name: kvstore.get(thumbnail)
+            for name, thumbnail in thumbnails.items()
+        }
+        return {
+            name: thumbnail for name, thumbnail in found.items()
+            if thumbnail is not None
+        }
+    keys = {
+        add_prefix(thumbnail.key): name
+        for name, thumbnail in thumbnails.items()
+    }
+    empty = cached_db_kvstore.EMPTY_VALUE
+    raw = kvstore.cache.get_many(list(keys))
+    missing = [key for key in keys if key not in raw]
+    if missing:
+        stored = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        # Отсутствие тоже кешируем, как это делает сам sorl-thumbnail.
+        fetched = {key: stored.get(key, empty) for key in missing}
+        kvstore.cache.set_many(
+            fetched, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        raw.update(fetched)
+    return {
+        keys[key]: deserialize_image_file(value)
+        for key, value in raw.items() if value != empty
+    }
+
+
+def resolve_many(files: Iterable, geometry: str,
+                 **options) -> Dict[str, Resolved]:
+    """Миниатюры или оригиналы для набора файлов, по имени файла."""
+    files = {file_.name: file_ for file_ in files if file_}
+    if not files:
+        return {}
+    found = _lookup({
+        name: thumbnail_file(file_, geometry, **options)
+        for name, file_ in files.items()
+    })
+    return {
+        name: found.get(name) or Original(file_.url, None, None)
+        for name, file_ in files.items()
+    }
+
+
+def attach_thumbnails(objects: Iterable, field: str = 'image',
+                      geometry: Optional[Geometry] = None) -> None:
+    """
+    Проставляет объектам страницы атрибут thumbnail.
+
+    Миниатюры всей страницы разрешаются одним пакетом при первом
+    обращении к любой из них; если страница целиком взята из кеша
+    фрагментов, хранилище ключей не трогается вовсе.
+    """
+    geometry_string, options = geometry or geometries()[0]
+    objects = list(objects)
+    resolved = SimpleLazyObject(lambda: resolve_many(
+        (getattr(obj, field) for obj in objects), geometry_string, **options
+    ))
+    for obj in objects:
+        file_ = getattr(obj, field)
+        obj.thumbnail = SimpleLazyObject(
+            lambda name=file_.name: resolved.get(name)
+        ) if file_ else None
+
+
+def generate(file_) -> None:
+    """
+    Строит миниатюры всех настроенных размеров для изображения.
+
+    file_ - файл поля модели или ImageFile: ключ миниатюры зависит от
+    хранилища исходника, и голое имя указало бы на хранилище по
+    умолчанию.
+    """
+    try:
+        for geometry, options in geometries():
+            get_thumbnail(file_, geometry, **options)
+        thumbnails_ready.send(sender=None, name=file_.name)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', file_.name)
+    finally:
+        with _lock:
+            _pending.discard(file_.name)
+
+
+def _run(file_) -> None:
+    try:
+        generate(file_)
+    finally:
+        # У потока пула свои соединения с базой (хранилище ключей
+        # sorl-thumbnail), закрываем их, чтобы не копились.
+        connections.close_all()
+
+
+def submit(file_) -> Optional[Future]:
+    """
+    Ставит изображение в очередь пула, если оно еще не в очереди.
+
+    При THUMBNAIL_WORKERS = 0 или in-memory базе миниатюры строятся
+    сразу, в текущем потоке.
+    """
+    with _lock:
+        if file_.name in _pending:
+            return None
+        _pending.add(file_.name)
+    if workers() <= 0 or in_memory_db():
+        generate(file_)
+        return None
+    return _pool().submit(_run, file_)
+
+
+def schedule(file_) -> None:
+    """Строит миниатюры после коммита транзакции, сохранившей файл."""
+    transaction.on_commit(lambda: submit(file_))
@@ -1,5 +1,26 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def install_search(sender, using, **kwargs):
+    """Возвращает триггеры поиска, если миграция пересоздала таблицу."""
+    from . import search
+    connection = connections[using]
+    if search.TABLE in connection.introspection.table_names():
+        search.install(connection)
+
+
+def prepare_shard(sender, using, **kwargs):
+    """Сдвигает id постов нового шарда в его диапазон."""
+    from . import shards
+    shards.prepare(using)
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(install_search, sender=self)
+        post_migrate.connect(prepare_shard, sender=self)
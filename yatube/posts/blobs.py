@@ -0,0 +1,80 @@
+"""
+Счетчики ссылок постов на файлы изображений.
+
+С адресацией по содержимому (core.storage) один файл может стоять у
+многих постов. ImageBlob.refs меняется выражениями F() при сохранении
+и удалении постов; файл без ссылок можно удалять. Команда
+dedupe_media пересчитывает ссылки заново.
+
+Имена файлов читаются пачками по ключу (batches) и сверяются с постами
+пачка за пачкой: списка всех имен в памяти не бывает, а IN не выходит
+за лимит параметров SQLite.
+"""
+from collections import Counter
+from typing import Iterator, List
+
+from django.db.models import Count, F
+from django.db.models.query import QuerySet
+
+from . import shards
+from .models import ImageBlob, Post
+
+BATCH_SIZE = 500
+
+
+def retain(name: str) -> None:
+    ImageBlob.objects.bulk_create(
+        [ImageBlob(name=name)], ignore_conflicts=True
+    )
+    ImageBlob.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release(name: str) -> None:
+    ImageBlob.objects.filter(name=name, refs__gt=0).update(
+        refs=F('refs') - 1
+    )
+
+
+def batches(queryset: QuerySet, field: str,
+            batch_size: int = BATCH_SIZE) -> Iterator[List[str]]:
+    """Различные значения field по возрастанию, пачками по ключу."""
+    values = queryset.order_by(field).values_list(field, flat=True)
+    last = ''
+    while True:
+        batch = list(values.filter(**{f'{field}__gt': last}).distinct()[
+            :batch_size
+        ])
+        if not batch:
+            return
+        last = batch[-1]
+        yield batch
+
+
+def references(names: List[str]) -> Counter:
+    """Число постов со всех шардов у каждого из файлов names."""
+    refs = Counter()
+    for posts in shards.each(Post.objects.filter(image__in=names)):
+        refs.update(dict(
+            posts.order_by().values_list('image').annotate(
+                total=Count('pk')
+            )
+        ))
+    return refs
+
+
+def recount(batch_size: int = BATCH_SIZE) -> int:
+    """Пересчитывает ссылки по постам, возвращает число файлов."""
+    for posts in shards.each(Post.objects.exclude(image='')):
+        for names in batches(posts, 'image', batch_size):
+            ImageBlob.objects.bulk_create(
+                (ImageBlob(name=name) for name in names),
+                ignore_conflicts=True,
+            )
+    for names in batches(ImageBlob.objects.all(), 'name', batch_size):
+        refs = references(names)
+        for name, current in ImageBlob.objects.filter(
+            name__in=names
+        ).values_list('name', 'refs'):
+            if current != refs[name]:
+                ImageBlob.objects.filter(name=name).update(refs=refs[name])
+    return ImageBlob.objects.filter(refs__gt=0).count()
@@ -0,0 +1,105 @@
+"""Теги кеша и валидаторы условных GET для страниц с постами."""
+from typing import Iterable, List
+
+from django.http import HttpRequest
+
+from core.caching.etags import request_etag, request_object
+
+from . import shards
+from .models import Group, Post, User
+
+FEED_INDEX = 'feed:index'
+# Имена авторов и названия групп видны на чужих страницах: ETag таких
+# страниц зависит от этих тегов, а не от тега каждого автора и группы.
+ANY_AUTHOR = 'author:*'
+ANY_GROUP = 'group:*'
+
+
+def post_tag(post_id: int) -> str:
+    return f'post:{post_id}'
+
+
+def author_tag(author_id: int) -> str:
+    return f'author:{author_id}'
+
+
+def group_tag(group_id: int) -> str:
+    return f'group:{group_id}'
+
+
+def follow_tag(user_id: int) -> str:
+    return f'follow:{user_id}'
+
+
+def image_tags(name: str) -> List[str]:
+    """Теги страниц, на которых видны посты с этим изображением."""
+    tags = {FEED_INDEX}
+    for posts in shards.each(Post.objects.filter(image=name)):
+        for post_id, author_id, group_id in posts.values_list(
+            'pk', 'author_id', 'group_id'
+        ):
+            tags.update((post_tag(post_id), author_tag(author_id)))
+            if group_id:
+                tags.add(group_tag(group_id))
+    return sorted(tags)
+
+
+def page_tags(posts: Iterable[Post], *extra: str) -> List[str]:
+    """Теги фрагмента со списком постов: сами посты, авторы и группы."""
+    tags = set(extra)
+    for post in posts:
+        tags.add(post_tag(post.pk))
+        tags.add(author_tag(post.author_id))
+        if post.group_id:
+            tags.add(group_tag(post.group_id))
+    return sorted(tags)
+
+
+def page_group(request: HttpRequest, slug: str) -> Group:
+    return request_object(
+        request, Group.objects.all(), tags=[ANY_GROUP], slug=slug
+    )
+
+
+def page_author(request: HttpRequest, username: str) -> User:
+    users = User.objects.all()
+    # Счетчики лежат в шарде автора, в default их может не быть.
+    if not shards.sharded():
+        users = users.select_related('counters')
+    return request_object(request, users, username=username)
+
+
+def page_post(request: HttpRequest, post_id: int) -> Post:
+    return request_object(
+        request,
+        shards.on(
+            Post.objects.select_related('author__counters', 'group'),
+            shards.shard_of_post(post_id),
+        ),
+        pk=post_id,
+    )
+
+
+def index_etag(request: HttpRequest) -> str:
+    return request_etag(request, [FEED_INDEX, ANY_AUTHOR, ANY_GROUP])
+
+
+def group_etag(request: HttpRequest, slug: str) -> str:
+    group = page_group(request, slug)
+    return request_etag(request, [group_tag(group.pk), ANY_AUTHOR])
+
+
+def profile_etag(request: HttpRequest, username: str) -> str:
+    tags = [author_tag(page_author(request, username).pk), ANY_GROUP]
+    if request.user.is_authenticated:
+        tags.append(follow_tag(request.user.pk))
+    return request_etag(request, tags)
+
+
+def post_etag(request: HttpRequest, post_id: int) -> str:
+    """Пост, его комментарии и счетчик постов автора."""
+    post = page_post(request, post_id)
+    return request_etag(
+        request,
+        [post_tag(post.pk), author_tag(post.author_id), ANY_AUTHOR, ANY_GROUP],
+    )
@@ -0,0 +1,128 @@
+"""
+Денормализованные счетчики постов, комментариев и подписок.
+
+Счетчики меняются атомарно выражениями F() на тех же путях записи, что
+создают и удаляют посты, комментарии и подписки, поэтому страницы
+профиля и поста обходятся без COUNT(*). Команда recount чинит
+расхождения, если они все же накопились.
+"""
+from collections import Counter
+from typing import Iterable, List, Optional
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.query import QuerySet
+
+from . import shards
+from .models import Comment, Counters, Follow, Post, User
+
+
+def bump(user_id: int, field: str, delta: int) -> None:
+    """
+    Сдвигает счетчик пользователя на delta одним UPDATE.
+
+    Строки без счетчиков не создаются: при каскадном удалении
+    пользователя это воскресило бы ссылку на удаляемую запись.
+    Недостающие счетчики создает get_counters или recount.
+    """
+    shards.on(
+        Counters.objects.filter(user_id=user_id), shards.shard_for(user_id)
+    ).update(**{field: F(field) + delta})
+
+
+def bump_comments(post_id: int, delta: int) -> None:
+    shards.on(
+        Post.objects.filter(pk=post_id), shards.shard_of_post(post_id)
+    ).update(comments_count=F('comments_count') + delta)
+
+
+def get_counters(user: User) -> Counters:
+    """Счетчики пользователя; недостающие создаются и пересчитываются."""
+    try:
+        return user.counters
+    except Counters.DoesNotExist:
+        recount([user.pk])
+        return shards.on(
+            Counters.objects.all(), shards.shard_for(user.pk)
+        ).get(user=user)
+
+
+def _count(queryset: QuerySet, field: str) -> Coalesce:
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('user')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total')
+        ),
+        0,
+    )
+
+
+def recount(user_ids: Optional[Iterable[int]] = None) -> int:
+    """Пересчитывает счетчики заново, возвращает число строк."""
+    if user_ids is not None:
+        user_ids = list(user_ids)
+    updated = sum(
+        _recount(alias, user_ids) for alias in shards.distinct()
+    )
+    if shards.sharded():
+        _recount_comments(user_ids)
+    return updated
+
+
+def _recount(alias: str, user_ids: Optional[List[int]]) -> int:
+    """Счетчики пользователей шарда alias по его же таблицам."""
+    users = shards.owned(shards.on(User.objects.all(), alias), alias)
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    shards.on(Counters.objects.all(), alias).bulk_create(
+        (Counters(user_id=user_id) for user_id in users.filter(
+            counters__isnull=True
+        ).values_list('pk', flat=True).iterator()),
+        batch_size=500,
+    )
+    counters = shards.on(Counters.objects.filter(user__in=users), alias)
+    updated = counters.update(
+        posts_count=_count(Post.objects.all(), 'author'),
+        comments_count=_count(Comment.objects.all(), 'author'),
+        followers_count=_count(Follow.objects.all(), 'author'),
+        following_count=_count(Follow.objects.all(), 'user'),
+    )
+    posts = shards.on(Post.objects.all(), alias)
+    if user_ids is not None:
+        posts = posts.filter(author__in=users)
+    posts.update(
+        comments_count=Coalesce(
+            Subquery(
+                Comment.objects.filter(post=OuterRef('pk')).order_by().values(
+                    'post'
+                ).annotate(total=Count('pk')).values('total')
+            ),
+            0,
+        )
+    )
+    return updated
+
+
+def _recount_comments(user_ids: Optional[List[int]]) -> None:
+    """
+    Складывает комментарии пользователей со всех шардов.
+
+    Комментарий лежит в шарде поста, а не своего автора, поэтому
+    _recount насчитал только комментарии из шарда автора.
+    """
+    comments = Comment.objects.all()
+    if user_ids is not None:
+        comments = comments.filter(author_id__in=user_ids)
+    totals = Counter()
+    for shard_comments in shards.each(comments):
+        totals.update(dict(
+            shard_comments.order_by().values_list('author').annotate(
+                total=Count('pk')
+            )
+        ))
+    for user_id, total in totals.items():
+        shards.on(
+            Counters.objects.filter(user_id=user_id),
+            shards.shard_for(user_id),
+        ).update(comments_count=total)
@@ -0,0 +1,148 @@
+"""
+Гибридная лента «Избранные авторы».
+
+Посты обычных авторов раскладываются по лентам подписчиков при записи
+(см. timeline.py). Авторы, у которых подписчиков больше
+FEED_PULL_THRESHOLD, считаются «тянущими»: их посты в ленты не
+раскладываются, а подмешиваются при чтении. Итоговая лента сливается
+из нескольких упорядоченных источников k-путевым слиянием по
+(pub_date, id) и совпадает с обычным JOIN через Follow.
+
+Посты на границе разложенной ленты и ниже и посты «тянущих» авторов
+читаются отдельным источником на каждого автора: выборка по индексу
+(author, -pub_date, -id) с LIMIT, без сортировки JOIN через Follow.
+
+Так же сливаются шарды (shards.py): лента по всем авторам читается из
+каждого шарда, и каждый источник отдает не больше записей, чем нужно
+для запрошенной страницы.
+"""
+import heapq
+from itertools import islice
+from typing import List, Optional, Tuple, Union
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.db.models.query import QuerySet
+
+from . import shards, timeline
+from .models import Follow, Post, User
+from .paginators import Cursor, keyset
+
+Source = Tuple[QuerySet, str, str]
+
+
+def followed_authors(user: User, alias: str = DEFAULT_DB_ALIAS
+                     ) -> Tuple[List[int], List[int]]:
+    """
+    Авторы в шарде alias, на которых подписан пользователь: id обычных
+    и id «тянущих», одним запросом.
+    """
+    pushed, pulled = [], []
+    follows = shards.on(Follow.objects.filter(user=user), alias)
+    threshold = timeline.pull_threshold()
+    for author_id, followers in follows.values_list(
+        'author', 'author__counters__followers_count'
+    ):
+        if (followers or 0) > threshold:
+            pulled.append(author_id)
+        else:
+            pushed.append(author_id)
+    return pushed, pulled
+
+
+def _author_posts(author_id: int, alias: str) -> QuerySet:
+    posts = Post.objects.filter(author_id=author_id)
+    return shards.on(posts, alias).select_related('author', 'group')
+
+
+def _sort_key(post: Post) -> Cursor:
+    return post.pub_date, post.pk
+
+
+class MergedFeed:
+    """
+    Несколько непересекающихся лент, слитых по (pub_date, id).
+
+    Поддерживает то, что нужно пагинаторам: seek() для курсоров,
+    count() и срезы для старых ссылок ?page=N. Каждый источник читает
+    не больше записей, чем нужно для запрошенного среза.
+    """
+
+    def __init__(self, sources: List[Source], cursor: Optional[Cursor] = None,
+                 newer: bool = False):
+        self.sources = sources
+        self.cursor = cursor
+        self.newer = newer
+
+    def seek(self, cursor: Optional[Cursor], newer: bool) -> 'MergedFeed':
+        return MergedFeed(self.sources, cursor, newer)
+
+    def _ordered(self) -> List[QuerySet]:
+        return [
+            keyset(posts, date, pk, self.cursor, self.newer)
+            for posts, date, pk in self.sources
+        ]
+
+    def count(self) -> int:
+        return sum(posts.count() for posts in self._ordered())
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        streams = [posts[:stop] for posts in self._ordered()]
+        merged = heapq.merge(*streams, key=_sort_key, reverse=not self.newer)
+        return list(islice(merged, start, stop))
+
+
+def scatter(posts: QuerySet) -> Union[QuerySet, MergedFeed]:
+    """Лента posts со всех шардов; с одним шардом - сама выборка."""
+    querysets = shards.each(posts)
+    if len(querysets) == 1:
+        return posts
+    return MergedFeed([(shard, 'pub_date', 'pk') for shard in querysets])
+
+
+def follow_feed(user: User) -> MergedFeed:
+    """
+    Лента подписок пользователя.
+
+    Источники не пересекаются:
+    - разложенная лента выше ее границы, без «тянущих» авторов;
+    - посты каждого «тянущего» автора, собранные при чтении;
+    - посты каждого остального автора на границе ленты и ниже.
+    Источники собираются в каждом шарде.
+    """
+    sources: List[Source] = []
+    for alias in shards.distinct():
+        sources += _follow_sources(user, alias)
+    return MergedFeed(sources)
+
+
+def _follow_sources(user: User, alias: str) -> List[Source]:
+    authors, pull = followed_authors(user, alias)
+    pushed = timeline.timeline_posts(user, alias)
+    if pull:
+        pushed = pushed.exclude(author_id__in=pull)
+    sources: List[Source] = [
+        (_author_posts(author_id, alias), 'pub_date', 'pk')
+        for author_id in pull
+    ]
+    edge = timeline.horizon(user.pk, alias)
+    if edge is not None:
+        pub_date, post_id = edge
+        pushed = pushed.filter(
+            Q(feed_date__gt=pub_date) | Q(feed_id__gt=post_id),
+            feed_date__gte=pub_date,
+        )
+        sources += [
+            (_author_posts(author_id, alias).filter(
+                Q(pub_date__lt=pub_date) | Q(pk__lte=post_id),
+                pub_date__lte=pub_date,
+            ), 'pub_date', 'pk')
+            for author_id in authors
+        ]
+    return [(pushed, 'feed_date', 'feed_id'), *sources]
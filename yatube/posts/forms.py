@@ -1,5 +1,10 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
 
+from core import thumbnails
+
+from . import imaging, variants
 from .models import Post, Comment
 
 
@@ -8,6 +13,51 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        """
+        Уменьшает новое изображение до UPLOAD_IMAGE_MAX_SIDE и убирает EXIF.
+
+        Слишком большие по числу пикселей файлы отклоняются до
+        декодирования, как и анимации крупнее UPLOAD_IMAGE_MAX_SIDE.
+        """
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        max_side = getattr(settings, 'UPLOAD_IMAGE_MAX_SIDE', 1920)
+        try:
+            prepared = imaging.prepare_upload(
+                image,
+                max_side,
+                getattr(settings, 'UPLOAD_IMAGE_MAX_PIXELS', 40_000_000),
+                getattr(
+                    settings, 'UPLOAD_IMAGE_MAX_DECODED_PIXELS', 10_000_000
+                ),
+            )
+        except imaging.ImageTooLarge as error:
+            raise forms.ValidationError(
+                'Изображение %(size)s слишком большое: допустимо не больше '
+                '%(max_pixels)s пикселей.',
+                code='too_large',
+                params={'size': error, 'max_pixels': error.max_pixels},
+            )
+        except imaging.AnimationTooLarge as error:
+            raise forms.ValidationError(
+                'Анимация %(size)s больше %(max_side)s пикселей по стороне: '
+                'уменьшите ее перед загрузкой.',
+                code='animation_too_large',
+                params={'size': error, 'max_side': max_side},
+            )
+        if prepared is None:
+            return image
+        data, _ = prepared
+        return SimpleUploadedFile(image.name, data, image.content_type)
+
+    def schedule_renditions(self) -> None:
+        """Ставит миниатюры и варианты нового изображения в очередь."""
+        if 'image' in self.changed_data and self.instance.image:
+            thumbnails.schedule(self.instance.image)
+            variants.schedule(self.instance.image.name)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,160 @@
+"""
+Обработка изображений: подготовка загрузок и кодирование вариантов.
+
+Модуль не трогает Django: функции кодирования выполняются в отдельных
+процессах пула (см. variants.py) и получают только пути к файлам.
+"""
+import os
+from io import BytesIO
+from typing import BinaryIO, Iterable, List, Optional, Tuple
+
+from PIL import Image, ImageOps, features
+
+# (формат, ширина, высота, путь относительно MEDIA_ROOT)
+Rendition = Tuple[str, int, int, str]
+
+EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp'}
+SAVE_OPTIONS = {
+    'jpeg': {'quality': 82, 'optimize': True, 'progressive': True},
+    'webp': {'quality': 80, 'method': 4},
+}
+
+
+# Форматы, которые Pillow умеет декодировать в уменьшенном масштабе
+DRAFT_FORMATS = ('JPEG', 'MPO')
+
+
+class ImageTooLarge(ValueError):
+    """Изображение больше допустимого: вероятная бомба распаковки."""
+
+    def __init__(self, size: str, max_pixels: int):
+        super().__init__(size)
+        self.max_pixels = max_pixels
+
+
+class AnimationTooLarge(ValueError):
+    """Анимацию пришлось бы уменьшать, а кадры при этом теряются."""
+
+
+def _is_animation(image: Image.Image) -> bool:
+    # MPO тоже многокадровый, но второй кадр - превью, а не анимация.
+    return image.format not in DRAFT_FORMATS and getattr(
+        image, 'is_animated', False
+    )
+
+
+def _check_size(image: Image.Image, max_side: int, max_pixels: int,
+                max_decoded_pixels: int) -> None:
+    width, height = image.size
+    limit = (
+        max_pixels if image.format in DRAFT_FORMATS
+        else max_decoded_pixels
+    )
+    if width * height > limit:
+        raise ImageTooLarge(f'{width}x{height}', limit)
+    if _is_animation(image) and max(width, height) > max_side:
+        raise AnimationTooLarge(f'{width}x{height}')
+
+
+def prepare_upload(file: BinaryIO, max_side: int, max_pixels: int,
+                   max_decoded_pixels: int) -> Optional[Tuple[bytes, str]]:
+    """
+    Уменьшает загруженное изображение и убирает из него EXIF.
+
+    Размеры читаются из заголовка до декодирования, поэтому бомба
+    распаковки отсекается, не заняв память. JPEG декодируется сразу в
+    уменьшенном масштабе (draft), и полного оригинала в памяти не
+    бывает, поэтому ему хватает предела max_pixels. PNG, WebP и GIF
+    декодируются целиком: для них предел max_decoded_pixels.
+    Анимация не больше max_side остается как есть, крупнее -
+    AnimationTooLarge. Возвращает (байты, формат) или None, если файл
+    можно оставить как есть: он не больше max_side и без EXIF.
+    """
+    file.seek(0)
+    # Без with: файл принадлежит вызывающему, а оригинал должен
+    # освободиться, как только на него не останется ссылок.
+    image = Image.open(file)
+    _check_size(image, max_side, max_pixels, max_decoded_pixels)
+    width, height = image.size
+    # Снимки телефонов часто приходят как MPO: это тот же JPEG.
+    fmt = 'JPEG' if image.format == 'MPO' else image.format
+    if _is_animation(image) or (
+        max(width, height) <= max_side and 'exif' not in image.info
+    ):
+        return None
+    mode = image.mode
+    if fmt not in DRAFT_FORMATS and mode in ('L', 'LA', 'RGB', 'RGBA'):
+        # Оригинал декодирован целиком. thumbnail() домножил бы альфу
+        # в копии во весь размер, не отпуская оригинал; делаем это
+        # сами и уменьшаем в целое число раз, оригинал освобождается.
+        # Палитру усреднять нельзя, но и весит она байт на пиксель.
+        if mode in ('LA', 'RGBA'):
+            image = image.convert(mode[:-1] + 'a')
+        factor = max(width, height) // max_side
+        if factor > 1:
+            image = image.reduce(factor)
+    # Для JPEG thumbnail() выбирает draft; reducing_gap=1 берет
+    # самый мелкий масштаб, не меньший цели, и держит пик памяти
+    # около (2 * max_side)² пикселей.
+    image.thumbnail(
+        (max_side, max_side), Image.LANCZOS, reducing_gap=1.0
+    )
+    if image.mode != mode and mode in ('LA', 'RGBA'):
+        image = image.convert(mode)
+    # Поворот из EXIF применяется к пикселям, сам EXIF не пишется.
+    image = ImageOps.exif_transpose(image)
+    options = {}
+    if fmt == 'JPEG':
+        options = {'quality': 85, 'optimize': True}
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+    icc_profile = image.info.get('icc_profile')
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    file.seek(0)
+    return buffer.getvalue(), fmt
+
+
+def available_formats(formats: Iterable[str]) -> Tuple[str, ...]:
+    """Форматы, которые умеет кодировать установленный Pillow."""
+    return tuple(
+        fmt for fmt in formats
+        if fmt != 'webp' or features.check('webp')
+    )
+
+
+def target_widths(width: int, widths: Iterable[int]) -> List[int]:
+    """Ширины вариантов без увеличения: крупнее оригинала не делаем."""
+    targets = sorted({min(target, width) for target in widths})
+    return targets or [width]
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def encode(media_root: str, source: str, target_dir: str,
+           widths: Iterable[int], formats: Iterable[str]) -> List[Rendition]:
+    """Кодирует source во все ширины и форматы, возвращает варианты."""
+    renditions = []
+    os.makedirs(os.path.join(media_root, target_dir), exist_ok=True)
+    with Image.open(os.path.join(media_root, source)) as opened:
+        image = _flatten(ImageOps.exif_transpose(opened))
+    for width in target_widths(image.width, widths):
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            name = os.path.join(target_dir, f'{width}.{EXTENSIONS[fmt]}')
+            resized.save(
+                os.path.join(media_root, name), fmt.upper(),
+                **SAVE_OPTIONS[fmt]
+            )
+            renditions.append((fmt, width, height, name))
+    return renditions
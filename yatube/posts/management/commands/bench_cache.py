@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = (
+    ('LocMemCache', 'django.core.cache.backends.locmem.LocMemCache', None),
+    (
+        'FileBasedCache',
+        'django.core.cache.backends.filebased.FileBasedCache',
+        'files',
+    ),
+    ('SharedMemoryCache', 'core.caching.shm.SharedMemoryCache', 'shm'),
+)
+
+
+def work(backend, location, options, seed, barrier, results):
+    """Воркер: смесь чтений и записей по общему набору ключей."""
+    cache = import_string(backend)(location, {
+        'OPTIONS': {'MAX_ENTRIES': options['keys'] * 2},
+    })
+    rng = random.Random(seed)
+    value = 'x' * options['value_size']
+    hits = reads = 0
+    barrier.wait()
+    started = time.perf_counter()
+    for _ in range(options['ops']):
+        key = f'key{rng.randrange(options["keys"])}'
+        if rng.random() < options['read_ratio']:
+            reads += 1
+            hits += cache.get(key) is not None
+        else:
+            cache.set(key, value)
+    results.put((time.perf_counter() - started, hits, reads))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает LocMemCache, FileBasedCache и SharedMemoryCache под '
+        'нагрузкой из нескольких процессов: пропускную способность и '
+        'долю попаданий. Кеши создаются во временном каталоге.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--ops', type=int, default=20000,
+                            help='Операций на процесс.')
+        parser.add_argument('--keys', type=int, default=1000)
+        parser.add_argument('--value-size', type=int, default=1024)
+        parser.add_argument('--read-ratio', type=float, default=0.9)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as directory:
+            for name, backend, location in BACKENDS:
+                if location is not None:
+                    location = os.path.join(directory, location)
+                barrier = context.Barrier(options['processes'])
+                results = context.Queue()
+                workers = [
+                    context.Process(target=work, args=(
+                        backend, location or name, options,
+                        options['seed'] + number, barrier, results,
+                    ))
+                    for number in range(options['processes'])
+                ]
+                for worker in workers:
+                    worker.start()
+                stats = [results.get() for _ in workers]
+                for worker in workers:
+                    worker.join()
+                self.report(name, options, stats)
+
+    def report(self, name, options, stats):
+        elapsed = max(seconds for seconds, _, _ in stats)
+        hits = sum(hits for _, hits, _ in stats)
+        reads = sum(reads for _, _, reads in stats)
+        total = options['ops'] * options['processes']
+        self.stdout.write(
+            f'{name}: {total / elapsed:,.0f} оп/с, '
+            f'попаданий {hits / max(reads, 1):.1%}'
+        )
@@ -0,0 +1,102 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+BATCH = 10000
+LIMIT = 10
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list:
+    letters = 'абвгдежзиклмнопрстуфхцчшэюя'
+    return list({
+        ''.join(rng.choice(letters) for _ in range(rng.randint(3, 9)))
+        for _ in range(size)
+    })
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск LIKE и FTS5 на синтетической базе постов. '
+        'База создается во временном файле, рабочая не трогается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--words', type=int, default=40,
+                            help='Слов в посте.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        vocabulary = make_vocabulary(50000, rng)
+        # Частоты слов по Ципфу, как в живом тексте.
+        weights = list(accumulate(
+            1 / rank for rank in range(1, len(vocabulary) + 1)
+        ))
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'bench.sqlite3'))
+            db.execute(
+                'CREATE TABLE posts_post ('
+                'id INTEGER PRIMARY KEY, text TEXT NOT NULL)'
+            )
+            for sql in search.INSTALL_SQL:
+                db.execute(sql)
+            started = time.perf_counter()
+            for offset in range(0, options['posts'], BATCH):
+                count = min(BATCH, options['posts'] - offset)
+                db.executemany(
+                    'INSERT INTO posts_post (text) VALUES (?)',
+                    ((' '.join(rng.choices(
+                        vocabulary, cum_weights=weights, k=options['words']
+                    )),) for _ in range(count)),
+                )
+                db.commit()
+            self.stdout.write(
+                f'Постов: {options["posts"]}, загрузка с индексом '
+                f'{time.perf_counter() - started:.1f} с'
+            )
+            # Запросы берем из середины словаря: не стоп-слова, но и
+            # не слова, которых нет ни в одном посте.
+            terms = rng.sample(vocabulary[100:5000], options['queries'])
+            like = self.measure(db, terms, (
+                'SELECT id FROM posts_post WHERE text LIKE ? '
+                f'ORDER BY id DESC LIMIT {LIMIT}'
+            ), lambda term: f'%{term}%')
+            fts = self.measure(db, terms, (
+                f'SELECT posts_post.id FROM posts_post '
+                f'JOIN {search.TABLE} ON {search.TABLE}.rowid = posts_post.id '
+                f'WHERE {search.TABLE} MATCH ? '
+                f'ORDER BY {search.TABLE}.rank LIMIT {LIMIT}'
+            ), search.fts_query)
+            db.close()
+        self.report('LIKE', like)
+        self.report('FTS5', fts)
+        speedup = statistics.median(like) / statistics.median(fts)
+        self.stdout.write(self.style.SUCCESS(
+            f'FTS5 быстрее LIKE по медиане в {speedup:.0f} раз'
+        ))
+
+    def measure(self, db, terms, sql, param) -> list:
+        timings = []
+        for term in terms:
+            started = time.perf_counter()
+            db.execute(sql, (param(term),)).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def report(self, name, timings):
+        timings = sorted(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f'{name}: медиана {statistics.median(timings):.2f} мс, '
+            f'p95 {p95:.2f} мс'
+        )
@@ -0,0 +1,143 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.sqlite import apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE auth_user (id INTEGER PRIMARY KEY, username TEXT)',
+    'CREATE TABLE posts_post (id INTEGER PRIMARY KEY, text TEXT, '
+    'pub_date REAL, author_id INTEGER, comments_count INTEGER DEFAULT 0)',
+    'CREATE INDEX posts_post_pub_date ON posts_post (pub_date, id)',
+    'CREATE TABLE posts_comment (id INTEGER PRIMARY KEY, text TEXT, '
+    'created REAL, post_id INTEGER, author_id INTEGER)',
+    'CREATE INDEX posts_comment_post ON posts_comment (post_id, created)',
+)
+FEED_SQL = (
+    'SELECT posts_post.id, posts_post.text, auth_user.username '
+    'FROM posts_post JOIN auth_user ON auth_user.id = posts_post.author_id '
+    'ORDER BY posts_post.pub_date DESC, posts_post.id DESC LIMIT 10'
+)
+# Python-модуль sqlite3 по умолчанию ждет занятую базу 5 секунд.
+DEFAULT_TIMEOUT = 5.0
+MODES = {
+    'до': {'pragmas': {'journal_mode': 'delete'}, 'persistent': False},
+    'после': {'pragmas': None, 'persistent': True},
+}
+
+
+def connect(path, pragmas):
+    db = sqlite3.connect(path, timeout=DEFAULT_TIMEOUT, isolation_level=None)
+    apply_pragmas(db, pragmas)
+    return db
+
+
+def work(role, path, pragmas, persistent, seconds, seed, barrier, results):
+    """Читатель ленты или автор комментариев, пока не выйдет время."""
+    rng = random.Random(seed)
+    db = connect(path, pragmas) if persistent else None
+    done = errors = 0
+    barrier.wait()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        current = db or connect(path, pragmas)
+        try:
+            if role == 'reader':
+                current.execute(FEED_SQL).fetchall()
+            else:
+                post_id = rng.randint(1, 1000)
+                current.execute('BEGIN IMMEDIATE')
+                current.execute(
+                    'INSERT INTO posts_comment '
+                    '(text, created, post_id, author_id) VALUES (?, ?, ?, 1)',
+                    ('Комментарий', time.time(), post_id),
+                )
+                current.execute(
+                    'UPDATE posts_post SET comments_count = '
+                    'comments_count + 1 WHERE id = ?', (post_id,),
+                )
+                current.execute('COMMIT')
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if current.in_transaction:
+                current.execute('ROLLBACK')
+        finally:
+            if db is None:
+                current.close()
+    results.put((role, done, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает смесь чтений ленты и записей комментариев на SQLite '
+        'до настройки (журнал DELETE, соединение на операцию) и после '
+        '(SQLITE_PRAGMAS, постоянные соединения). База создается во '
+        'временном файле.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--posts', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as directory:
+            for index, (name, mode) in enumerate(MODES.items()):
+                pragmas = mode['pragmas']
+                if pragmas is None:
+                    pragmas = settings.SQLITE_PRAGMAS
+                path = os.path.join(directory, f'{index}.sqlite3')
+                self.populate(path, pragmas, options['posts'])
+                barrier = context.Barrier(
+                    options['readers'] + options['writers']
+                )
+                results = context.Queue()
+                roles = (
+                    ['reader'] * options['readers']
+                    + ['writer'] * options['writers']
+                )
+                workers = [
+                    context.Process(target=work, args=(
+                        role, path, pragmas, mode['persistent'],
+                        options['seconds'], number, barrier, results,
+                    ))
+                    for number, role in enumerate(roles)
+                ]
+                for worker in workers:
+                    worker.start()
+                stats = [results.get() for _ in workers]
+                for worker in workers:
+                    worker.join()
+                self.report(name, options['seconds'], stats)
+
+    def populate(self, path, pragmas, posts):
+        db = connect(path, pragmas)
+        for sql in SCHEMA:
+            db.execute(sql)
+        db.execute('BEGIN')
+        db.execute("INSERT INTO auth_user (id, username) VALUES (1, 'auth')")
+        db.executemany(
+            'INSERT INTO posts_post (text, pub_date, author_id) '
+            'VALUES (?, ?, 1)',
+            ((f'Пост {number}', number) for number in range(posts)),
+        )
+        db.execute('COMMIT')
+        db.close()
+
+    def report(self, name, seconds, stats):
+        for role, label in (('reader', 'чтений'), ('writer', 'записей')):
+            done = sum(done for kind, done, _ in stats if kind == role)
+            errors = sum(errors for kind, _, errors in stats if kind == role)
+            self.stdout.write(
+                f'{name}: {done / seconds:,.0f} {label}/с, '
+                f'ошибок "database is locked": {errors}'
+            )
@@ -0,0 +1,32 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+from core.caching.tiered import TieredCache
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает попадания в L1 и L2 двухуровневого кеша, '
+        'сложенные со всех воркеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default')
+        parser.add_argument('--reset', action='store_true',
+                            help='Обнулить счетчики после вывода.')
+
+    def handle(self, *args, **options):
+        cache = caches[options['alias']]
+        if not isinstance(cache, TieredCache):
+            raise CommandError(
+                f'Кеш {options["alias"]} не двухуровневый (TieredCache).'
+            )
+        stats = cache.stats()
+        reads = stats['l1_hits'] + stats['l2_hits'] + stats['misses']
+        for name in ('l1_hits', 'l2_hits', 'misses'):
+            self.stdout.write(
+                f'{name}: {stats[name]} ({stats[name] / max(reads, 1):.1%})'
+            )
+        self.stdout.write(f'l1_flushes: {stats["l1_flushes"]}')
+        if options['reset']:
+            cache.reset_stats()
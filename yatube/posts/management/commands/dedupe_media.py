@@ -0,0 +1,68 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from sorl.thumbnail.images import ImageFile
+
+from core import storage, thumbnails
+from posts import blobs, shards
+from posts.models import ImageVariant, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит изображения постов в хранилище с адресацией по '
+        'содержимому: одинаковые файлы сливаются в один, посты и варианты '
+        'переходят на новое имя, старые файлы удаляются. Уже перенесенные '
+        'изображения пропускаются, поэтому прерванный запуск можно '
+        'просто повторить.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-originals', action='store_true',
+            help='Не удалять старые файлы после переноса.',
+        )
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        names = sorted(
+            name for name in set(
+                shards.column(Post.objects.exclude(image=''), 'image')
+            )
+            if not storage.is_blob_name(name)
+        )
+        total = len(names)
+        self.stdout.write(f'Изображений к переносу: {total}')
+        stored, removed = set(), 0
+        for done, name in enumerate(names, 1):
+            if not field.storage.exists(name):
+                self.stderr.write(f'[{done}/{total}] {name}: файла нет')
+                continue
+            target = field.generate_filename(None, os.path.basename(name))
+            with field.storage.open(name) as file:
+                new_name = field.storage.save(target, file)
+            with transaction.atomic():
+                for posts in shards.each(Post.objects.filter(image=name)):
+                    posts.update(image=new_name)
+                self.move_variants(name, new_name)
+            if not options['keep_originals']:
+                removed += field.storage.size(name)
+                field.storage.delete(name)
+            if new_name not in stored:
+                thumbnails.generate(ImageFile(new_name, field.storage))
+                stored.add(new_name)
+            self.stdout.write(f'[{done}/{total}] {name} -> {new_name}')
+        blobs.recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {total} изображений в {len(stored)} файлах, '
+            f'удалено старых файлов на {removed / 2 ** 20:.1f} МБ'
+        ))
+
+    def move_variants(self, name: str, new_name: str) -> None:
+        """Варианты переходят к новому имени, если у него их еще нет."""
+        variants = ImageVariant.objects.filter(source=name)
+        if ImageVariant.objects.filter(source=new_name).exists():
+            variants.delete()
+        else:
+            variants.update(source=new_name)
@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from core import fixtures
+from posts import shards
+
+MODELS = [
+    'auth.user', 'posts.group', 'posts.post', 'posts.comment', 'posts.follow',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает модели в формате dumpdata, по файлу на модель, '
+        'параллельно в нескольких процессах. Строки читаются кусками, '
+        'поэтому память не растет с объемом данных. Файлы загружаются '
+        'командой fast_loaddata.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Куда писать файлы.')
+        parser.add_argument(
+            'models', nargs='*', default=MODELS,
+            help='Модели app_label.ModelName (по умолчанию '
+                 f'{", ".join(MODELS)}).',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Строк в одном чтении из базы.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число процессов; 1 - выгрузка в этом процессе.',
+        )
+        parser.add_argument(
+            '--indent', type=int,
+            help='Отступ JSON, как у dumpdata.',
+        )
+        parser.add_argument(
+            '--compress', action='store_true',
+            help='Сжимать файлы gzip (.json.gz).',
+        )
+
+    def handle(self, *args, **options):
+        if shards.sharded():
+            raise CommandError(
+                'Выгрузка поддерживает только одну базу, а в POST_SHARDS '
+                'их несколько.'
+            )
+        if options['chunk_size'] < 1:
+            raise CommandError('Размер куска должен быть > 0.')
+        os.makedirs(options['directory'], exist_ok=True)
+        suffix = '.json.gz' if options['compress'] else '.json'
+        jobs = {
+            label.lower(): os.path.join(
+                options['directory'], label.lower() + suffix
+            )
+            for label in options['models']
+        }
+        args = (options['chunk_size'], options['indent'])
+        workers = min(max(options['workers'], 1), len(jobs))
+        if workers == 1:
+            for label, path in jobs.items():
+                self.report(label, path, fixtures.dump_model(
+                    label, path, *args
+                ))
+            return
+        # spawn, как у пула вариантов изображений: процессам не
+        # достаются соединения с базой родителя.
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        ) as pool:
+            futures = {
+                pool.submit(fixtures.dump_model, label, path, *args): label
+                for label, path in jobs.items()
+            }
+            for future in as_completed(futures):
+                label = futures[future]
+                self.report(label, jobs[label], future.result())
+
+    def report(self, label: str, path: str, written: int) -> None:
+        self.stdout.write(f'{label}: {written} -> {path}')
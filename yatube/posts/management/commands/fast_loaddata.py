@@ -0,0 +1,106 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import fixtures, sqlite
+from posts import blobs, counters, search, shards, timeline
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает выгрузку dumpdata (JSON) потоком и пачками: модели '
+        'идут в порядке ссылок, индексы и поиск перестраиваются один раз '
+        'в конце, счетчики и ленты подписок пересчитываются. Строки с уже '
+        'существующими id обновляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'fixtures', nargs='+',
+            help='Файлы выгрузки (.json или .json.gz).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Строк в одной пачке INSERT.',
+        )
+        parser.add_argument(
+            '--transaction-size', type=int, default=10000,
+            help='Строк в одной транзакции.',
+        )
+        parser.add_argument(
+            '-e', '--exclude', action='append', default=[],
+            help='Пропустить приложение или модель (app_label.ModelName), '
+                 'как у loaddata.',
+        )
+
+    def handle(self, *args, **options):
+        if shards.sharded():
+            raise CommandError(
+                'Загрузка поддерживает только одну базу, а в POST_SHARDS '
+                'их несколько.'
+            )
+        if options['batch_size'] < 1 or options['transaction_size'] < 1:
+            raise CommandError('Размеры пачки и транзакции должны быть > 0.')
+        excluded = {label.lower() for label in options['exclude']}
+        with fixtures.Spool() as spool:
+            try:
+                for path in options['fixtures']:
+                    with fixtures.open_fixture(path) as stream:
+                        for item in fixtures.iter_objects(stream):
+                            label = item['model'].lower()
+                            if {label, label.split('.')[0]} & excluded:
+                                continue
+                            spool.add(item)
+            except (OSError, ValueError) as error:
+                raise CommandError(f'Не удалось прочитать выгрузку: {error}')
+            self.stdout.write(f'Прочитано строк: {sum(spool.counts.values())}')
+            models = fixtures.dependency_order(spool.models())
+            self.load(spool, models, options)
+        self.rebuild(models)
+
+    def load(self, spool, models, options) -> None:
+        connection = connections[DEFAULT_DB_ALIAS]
+        tables = [
+            table for model in models
+            for table in [
+                model._meta.db_table,
+                *(field.remote_field.through._meta.db_table
+                  for field in model._meta.local_many_to_many),
+            ]
+        ]
+        # Триггеры поиска срабатывали бы на каждой вставке.
+        search.uninstall(connection)
+        try:
+            with connection.constraint_checks_disabled():
+                with sqlite.indexes_dropped(connection, tables):
+                    for model in models:
+                        label = model._meta.label_lower
+                        loaded = fixtures.load_model(
+                            model, spool.rows(label), DEFAULT_DB_ALIAS,
+                            options['batch_size'],
+                            options['transaction_size'],
+                        )
+                        self.stdout.write(f'{label}: {loaded}')
+            connection.check_constraints(table_names=tables)
+        finally:
+            search.rebuild(connection)
+        sequences = connection.ops.sequence_reset_sql(no_style(), models)
+        if sequences:
+            with connection.cursor() as cursor:
+                for sql in sequences:
+                    cursor.execute(sql)
+
+    def rebuild(self, models) -> None:
+        """Данные, которые сигналы обновили бы при обычной записи."""
+        updated = counters.recount()
+        entries = timeline.rebuild(
+            User.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        blobs.recount()
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено моделей: {len(models)}; счетчиков: {updated}, '
+            f'записей в лентах: {entries}'
+        ))
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+
+from posts import media_gc
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет медиафайлы без постов: оригиналы, миниатюры и варианты '
+        'изображений, а также записи о них. Каталоги обходятся в '
+        'несколько потоков, файлы сверяются с базой пачками. В пробном '
+        'запуске записи не удаляются, поэтому миниатюры удаленных '
+        'постов в нем еще не считаются сиротами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено.',
+        )
+        parser.add_argument(
+            '--rate', type=float, default=200,
+            help='Не больше стольких удалений файлов в секунду (0 - без '
+                 'ограничения).',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Число потоков обхода каталогов.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Размер пачки файлов для сверки с базой и удаления.',
+        )
+        parser.add_argument(
+            '--min-age', type=float, default=3600,
+            help='Не трогать файлы моложе стольких секунд.',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        batch_size = max(options['batch_size'], 1)
+        records = media_gc.prune_records(dry_run, batch_size)
+        self.stdout.write(
+            f'Записи без постов: исходников миниатюр {records["thumbnails"]}'
+            f', вариантов {records["variants"]}, '
+            f'файлов изображений {records["blobs"]}'
+        )
+        limit = media_gc.RateLimit(options['rate'])
+        for area in media_gc.areas():
+            checked, orphans, size = 0, 0, 0
+            for batch in media_gc.scan(
+                area.directory, max(options['workers'], 1), batch_size,
+                options['min_age'],
+            ):
+                checked += len(batch)
+                live = area.is_live([name for name, _ in batch])
+                dead = [(name, bytes_) for name, bytes_ in batch
+                        if name not in live]
+                if not dead:
+                    continue
+                orphans += len(dead)
+                size += sum(bytes_ for _, bytes_ in dead)
+                if options['verbosity'] > 1:
+                    for name, _ in dead:
+                        self.stdout.write(f'  {name}')
+                if not dry_run:
+                    media_gc.remove([name for name, _ in dead])
+                    limit.wait(len(dead))
+            self.stdout.write(
+                f'{area.directory}: проверено {checked}, сирот {orphans} '
+                f'({size / 2 ** 20:.1f} МБ)'
+            )
+        if dry_run:
+            self.stdout.write(self.style.WARNING(
+                'Пробный запуск: ничего не удалено'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Готово'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from sorl.thumbnail.images import ImageFile
+
+from core import thumbnails
+from posts import shards
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит недостающие миниатюры изображений постов.'
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = shards.column(Post.objects.exclude(image=''), 'image')
+        count = 0
+        for name in sorted(set(names)):
+            thumbnails.generate(ImageFile(name, storage))
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры проверены, изображений: {count}'
+        ))
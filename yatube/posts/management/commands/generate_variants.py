@@ -0,0 +1,51 @@
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from posts import imaging, shards, variants
+from posts.models import ImageVariant, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит варианты изображений постов для srcset в пуле процессов. '
+        'Готовые изображения пропускаются, поэтому прерванный запуск '
+        'можно просто повторить.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=variants.workers() or 1,
+            help='Число процессов кодирования.',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перекодировать и уже готовые изображения.',
+        )
+
+    def handle(self, *args, **options):
+        sources = set(shards.column(Post.objects.exclude(image=''), 'image'))
+        if not options['force']:
+            sources -= set(ImageVariant.objects.values_list(
+                'source', flat=True
+            ))
+        total = len(sources)
+        self.stdout.write(f'Изображений к обработке: {total}')
+        failed = 0
+        with variants.new_pool(max(options['workers'], 1)) as pool:
+            futures = {
+                pool.submit(imaging.encode, *variants.encode_job(source)):
+                source for source in sorted(sources)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                source = futures[future]
+                try:
+                    variants.record(source, future.result())
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'[{done}/{total}] {source}: {error}')
+                    continue
+                self.stdout.write(f'[{done}/{total}] {source}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {total - failed}, с ошибками: {failed}'
+        ))
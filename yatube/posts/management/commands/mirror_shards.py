@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import shards
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует пользователей, группы и подписки из default во все '
+        'шарды постов. Нужна после подключения нового шарда: дальше '
+        'копии обновляются при каждой записи.'
+    )
+
+    def handle(self, *args, **options):
+        if not shards.sharded():
+            raise CommandError('В POST_SHARDS одна база, копировать некуда.')
+        copied = shards.mirror_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк скопировано: {copied}, шардов: {len(shards.copies())}'
+        ))
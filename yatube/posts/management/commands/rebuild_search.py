@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import search, shards
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов.'
+
+    def handle(self, *args, **options):
+        if not search.supported():
+            self.stderr.write('Полнотекстовый индекс есть только на SQLite.')
+            return
+        for alias in shards.distinct():
+            search.rebuild(connections[alias])
+        self.stdout.write(self.style.SUCCESS('Индекс поиска перестроен.'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from posts import shards, timeline
+from posts.models import TimelineEntry, User
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок из таблицы Follow.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Чьи ленты пересобрать (по умолчанию все).',
+        )
+        parser.add_argument(
+            '--trim', action='store_true',
+            help='Только обрезать ленты до TIMELINE_LENGTH.',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        user_ids = users.values_list('pk', flat=True).iterator()
+        if options['trim']:
+            for user_id in user_ids:
+                timeline.trim(user_id)
+            self.stdout.write(
+                f'Ленты обрезаны, записей: {self.count()}'
+            )
+            return
+        created = timeline.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны, записей: {created}'
+        ))
+
+    def count(self) -> int:
+        return sum(
+            entries.count()
+            for entries in shards.each(TimelineEntry.objects.all())
+        )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики постов, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Чьи счетчики пересчитать (по умолчанию все).',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = User.objects.filter(
+                username__in=options['usernames']
+            ).values_list('pk', flat=True)
+        updated = recount(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики пересчитаны, пользователей: {updated}'
+        ))
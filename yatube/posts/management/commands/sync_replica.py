@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в локальную реплику через online '
+        'backup API. С --interval повторяет копирование, пока не прервут.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='replica')
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Секунд между копированиями (по умолчанию один раз).',
+        )
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in connections.databases:
+            raise CommandError(f'База {alias} не описана в DATABASES.')
+        if connections[alias].vendor != 'sqlite':
+            raise CommandError(f'База {alias} не SQLite.')
+        while True:
+            started = time.monotonic()
+            replicas.sync(alias)
+            self.stdout.write(
+                f'Реплика {alias} синхронизирована за '
+                f'{time.monotonic() - started:.2f} с'
+            )
+            if options['interval'] <= 0:
+                return
+            time.sleep(options['interval'])
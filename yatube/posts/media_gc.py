@@ -0,0 +1,283 @@
+"""
+Сборщик мусора медиафайлов.
+
+После удаления поста (в том числе каскадом вместе с автором) или смены
+картинки на диске остаются оригинал, его миниатюры sorl-thumbnail и
+варианты srcset. Сборщик сначала убирает записи об изображениях без
+постов: хранилище ключей sorl, ImageVariant, ImageBlob. Затем обходит
+каталоги в несколько потоков и пачками сверяет файлы с базой: файл без
+записи - сирота. Список файлов целиком в памяти не бывает: обходчики
+отдают пачки через ограниченную очередь.
+
+Свежие файлы (моложе min_age) не трогаются: их запись в базу может
+быть еще в незакоммиченной транзакции или в пуле кодирования.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, NamedTuple, Set, Tuple
+
+from django.conf import settings
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import blobs, shards, variants
+from .models import ImageBlob, ImageVariant, Post
+
+# (имя относительно MEDIA_ROOT, размер в байтах)
+Batch = List[Tuple[str, int]]
+
+_DONE = object()
+
+
+class Area(NamedTuple):
+    """Каталог медиа и проверка, какие файлы из пачки еще нужны."""
+    directory: str
+    is_live: Callable[[List[str]], Set[str]]
+
+
+class RateLimit:
+    """Не больше rate удалений в секунду; 0 - без ограничения."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.started = time.monotonic()
+        self.done = 0
+
+    def wait(self, count: int) -> None:
+        self.done += count
+        if self.rate <= 0:
+            return
+        delay = self.done / self.rate - (time.monotonic() - self.started)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def image_storage():
+    return Post._meta.get_field('image').storage
+
+
+def live_originals(names: List[str]) -> Set[str]:
+    return {
+        name
+        for posts in shards.each(Post.objects.filter(image__in=names))
+        for name in posts.values_list('image', flat=True)
+    }
+
+
+def live_thumbnails(names: List[str]) -> Set[str]:
+    """Миниатюры, о которых знает хранилище ключей sorl-thumbnail."""
+    keys = {
+        add_prefix(ImageFile(name, default.storage).key): name
+        for name in names
+    }
+    return {
+        keys[key] for key in KVStoreModel.objects.filter(
+            key__in=list(keys)
+        ).values_list('key', flat=True)
+    }
+
+
+def live_variants(names: List[str]) -> Set[str]:
+    return set(ImageVariant.objects.filter(file__in=names).values_list(
+        'file', flat=True
+    ))
+
+
+def areas() -> List[Area]:
+    """
+    Проверяемые каталоги.
+
+    Миниатюры сверяются с таблицей хранилища ключей, поэтому без
+    cached_db-хранилища sorl-thumbnail их каталог пропускается.
+    """
+    found = [
+        Area(
+            Post._meta.get_field('image').upload_to.rstrip('/'),
+            live_originals,
+        ),
+        Area(variants.DIRECTORY, live_variants),
+    ]
+    if isinstance(default.kvstore, cached_db_kvstore.KVStore):
+        found.insert(1, Area(
+            thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/'), live_thumbnails
+        ))
+    return found
+
+
+def prune_thumbnail_keys(dry_run: bool, batch_size: int) -> int:
+    """
+    Убирает из хранилища ключей исходники без постов и их миниатюры.
+
+    Исходник мертв, если поста с таким изображением нет или ключ
+    посчитан для другого хранилища (до переезда на core.storage).
+    Строки читаются пачками по ключу, без длинного курсора. Возвращает
+    число исходников.
+    """
+    if not isinstance(default.kvstore, cached_db_kvstore.KVStore):
+        return 0
+    storage = image_storage()
+    prefix = add_prefix('', 'thumbnails')
+    last, pruned = prefix, 0
+    while True:
+        rows = list(KVStoreModel.objects.filter(
+            key__startswith=prefix, key__gt=last
+        ).order_by('key').values_list('key', 'value')[:batch_size])
+        if not rows:
+            return pruned
+        last = rows[-1][0]
+        thumbnails = {
+            key[len(prefix):]: json.loads(value) for key, value in rows
+        }
+        sources = dict(KVStoreModel.objects.filter(
+            key__in=[add_prefix(key) for key in thumbnails]
+        ).values_list('key', 'value'))
+        names = {
+            key: deserialize_image_file(sources[add_prefix(key)]).name
+            for key in thumbnails if add_prefix(key) in sources
+        }
+        live = live_originals(list(set(names.values())))
+        dead = [
+            key for key in thumbnails
+            if names.get(key) not in live
+            or ImageFile(names[key], storage).key != key
+        ]
+        pruned += len(dead)
+        if dead and not dry_run:
+            keys = []
+            for key in dead:
+                keys += [add_prefix(key, 'thumbnails'), add_prefix(key)]
+                keys += map(add_prefix, thumbnails[key])
+            default.kvstore._delete_raw(*keys)
+
+
+def prune_records(dry_run: bool, batch_size: int) -> Dict[str, int]:
+    """
+    Удаляет записи об изображениях, которых нет ни у одного поста.
+
+    Исходники вариантов и файлы без ссылок читаются пачками по ключу
+    и сверяются с постами всех шардов пачка за пачкой.
+    """
+    counts = {
+        'thumbnails': prune_thumbnail_keys(dry_run, batch_size),
+        'variants': 0,
+        'blobs': 0,
+    }
+    stale = (
+        ('variants', ImageVariant.objects.all(), 'source'),
+        ('blobs', ImageBlob.objects.filter(refs=0), 'name'),
+    )
+    for label, records, field in stale:
+        for names in blobs.batches(records, field, batch_size):
+            dead = records.filter(**{
+                f'{field}__in': set(names) - live_originals(names)
+            })
+            counts[label] += dead.count()
+            if not dry_run:
+                dead.delete()
+    return counts
+
+
+def _walk(root: str, relative: str, recursive: bool,
+          cutoff: float) -> Iterator[Tuple[str, int]]:
+    with os.scandir(os.path.join(root, relative)) as entries:
+        for entry in entries:
+            name = f'{relative}/{entry.name}'
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    yield from _walk(root, name, True, cutoff)
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime < cutoff:
+                    yield name, stat.st_size
+
+
+class _Batches:
+    """Ограниченная очередь пачек от потоков обхода к проверке."""
+
+    def __init__(self, size: int):
+        self.queue = queue.Queue(maxsize=size)
+        self.stop = threading.Event()
+
+    def put(self, item) -> None:
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def produce(self, root: str, relative: str, recursive: bool,
+                cutoff: float, batch_size: int) -> None:
+        batch = []
+        try:
+            for item in _walk(root, relative, recursive, cutoff):
+                if self.stop.is_set():
+                    return
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    self.put(batch)
+                    batch = []
+            if batch:
+                self.put(batch)
+        finally:
+            self.put(_DONE)
+
+
+def scan(directory: str, workers: int, batch_size: int,
+         min_age: float) -> Iterator[Batch]:
+    """
+    Файлы каталога старше min_age секунд, пачками по batch_size.
+
+    Каждый подкаталог первого уровня (ab/ у миниатюр и оригиналов)
+    обходит свой поток; очередь на workers * 2 пачки не дает обходу
+    убежать вперед проверки.
+    """
+    root = settings.MEDIA_ROOT
+    if not os.path.isdir(os.path.join(root, directory)):
+        return
+    with os.scandir(os.path.join(root, directory)) as entries:
+        units = [(directory, False)] + [
+            (f'{directory}/{entry.name}', True)
+            for entry in entries if entry.is_dir(follow_symlinks=False)
+        ]
+    cutoff = time.time() - min_age
+    batches = _Batches(workers * 2)
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix='gc-media'
+    ) as pool:
+        futures = [
+            pool.submit(
+                batches.produce, root, relative, recursive, cutoff,
+                batch_size,
+            )
+            for relative, recursive in units
+        ]
+        try:
+            remaining = len(units)
+            while remaining:
+                item = batches.queue.get()
+                if item is _DONE:
+                    remaining -= 1
+                else:
+                    yield item
+        finally:
+            batches.stop.set()
+    for future in futures:
+        future.result()
+
+
+def remove(names: List[str]) -> None:
+    root = settings.MEDIA_ROOT
+    for name in names:
+        try:
+            os.remove(os.path.join(root, name))
+        except FileNotFoundError:
+            pass
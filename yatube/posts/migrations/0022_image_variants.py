@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVariant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Имя исходного изображения в хранилище', max_length=255, verbose_name='Исходник')),
+                ('format', models.CharField(help_text='Формат варианта: jpeg или webp', max_length=8, verbose_name='Формат')),
+                ('width', models.PositiveIntegerField(help_text='Ширина варианта в пикселях', verbose_name='Ширина')),
+                ('height', models.PositiveIntegerField(help_text='Высота варианта в пикселях', verbose_name='Высота')),
+                ('file', models.CharField(help_text='Имя файла варианта в хранилище', max_length=255, verbose_name='Файл')),
+            ],
+            options={
+                'verbose_name': 'Вариант изображения',
+                'verbose_name_plural': 'Варианты изображений',
+                'ordering': ['source', 'format', 'width'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='imagevariant',
+            constraint=models.UniqueConstraint(fields=('source', 'format', 'width'), name='unique_image_variant'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:19
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+import django.db.models.deletion
+
+
+def fill_horizons(apps, schema_editor):
+    """
+    Граница по самой старой записи: лента могла быть обрезана раньше,
+    и все, что ниже, теперь читается через подписки.
+    """
+    alias = schema_editor.connection.alias
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    TimelineHorizon = apps.get_model('posts', 'TimelineHorizon')
+    entries = TimelineEntry.objects.using(alias)
+    oldest = entries.order_by().values('user').annotate(
+        oldest=Min('pub_date')
+    )
+    for row in oldest.iterator():
+        edge = entries.filter(
+            user_id=row['user'], pub_date=row['oldest']
+        ).order_by('post_id').values_list('pub_date', 'post_id')[0]
+        TimelineHorizon.objects.using(alias).create(
+            user_id=row['user'], pub_date=edge[0], post_id=edge[1]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0023_image_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineHorizon',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(help_text='Дата поста на границе обрезанной ленты', verbose_name='Дата публикации')),
+                ('post_id', models.BigIntegerField(help_text='Id поста на границе; не внешний ключ: пост удаляют', verbose_name='Id поста')),
+                ('user', models.OneToOneField(help_text='Пользователь, чья лента обрезана', on_delete=django.db.models.deletion.CASCADE, related_name='timeline_horizon', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+            options={
+                'verbose_name': 'Граница ленты',
+                'verbose_name_plural': 'Границы лент',
+            },
+        ),
+        migrations.RunPython(fill_horizons, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -53,13 +55,35 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Комментариев',
+        help_text='Число комментариев к посту',
+    )
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx'
+            ),
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
@@ -91,9 +115,15 @@ class Comment(models.Model):
     )
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-pub_date', '-id'],
+                name='comment_post_date_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
@@ -128,3 +158,171 @@ class Follow(models.Model):
 
     def __str__(self) -> str:
         return self.user.username
+
+
+class Counters(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='counters',
+        verbose_name='Пользователь',
+        help_text='Пользователь, к которому относятся счетчики',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов',
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Комментариев',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок',
+    )
+
+    class Meta:
+        verbose_name = 'Счетчики'
+        verbose_name_plural = 'Счетчики'
+
+    def __str__(self) -> str:
+        return f'Счетчики {self.user_id}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+        help_text='Пользователь, в ленту которого попал пост',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+        help_text='Пост из ленты подписок',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+        help_text='Автор поста, копия post.author',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+        help_text='Дата публикации поста, копия post.pub_date',
+    )
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx'
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user_id}: {self.post_id}'
+
+
+class TimelineHorizon(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline_horizon',
+        verbose_name='Читатель',
+        help_text='Пользователь, чья лента обрезана',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+        help_text='Дата поста на границе обрезанной ленты',
+    )
+    post_id = models.BigIntegerField(
+        verbose_name='Id поста',
+        help_text='Id поста на границе; не внешний ключ: пост удаляют',
+    )
+
+    class Meta:
+        verbose_name = 'Граница ленты'
+        verbose_name_plural = 'Границы лент'
+
+    def __str__(self) -> str:
+        return f'{self.user_id}: {self.pub_date}, {self.post_id}'
+
+
+class ImageVariant(models.Model):
+    source = models.CharField(
+        max_length=255,
+        verbose_name='Исходник',
+        help_text='Имя исходного изображения в хранилище',
+    )
+    format = models.CharField(
+        max_length=8,
+        verbose_name='Формат',
+        help_text='Формат варианта: jpeg или webp',
+    )
+    width = models.PositiveIntegerField(
+        verbose_name='Ширина',
+        help_text='Ширина варианта в пикселях',
+    )
+    height = models.PositiveIntegerField(
+        verbose_name='Высота',
+        help_text='Высота варианта в пикселях',
+    )
+    file = models.CharField(
+        max_length=255,
+        verbose_name='Файл',
+        help_text='Имя файла варианта в хранилище',
+    )
+
+    class Meta:
+        ordering = ['source', 'format', 'width']
+        verbose_name = 'Вариант изображения'
+        verbose_name_plural = 'Варианты изображений'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'format', 'width'],
+                name='unique_image_variant'
+            )
+        ]
+
+    def __str__(self) -> str:
+        return self.file
+
+
+class ImageBlob(models.Model):
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Файл',
+        help_text='Имя изображения в хранилище',
+    )
+    refs = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Ссылок',
+        help_text='Число постов с этим изображением',
+    )
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+    def __str__(self) -> str:
+        return self.name
@@ -0,0 +1,145 @@
+from datetime import datetime
+from typing import Optional, Tuple, Union
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.http import HttpRequest
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+Cursor = Tuple[datetime, int]
+
+
+def encode_cursor(pub_date: datetime, pk: int) -> str:
+    """Упаковывает ключ (pub_date, id) в непрозрачную строку."""
+    return urlsafe_base64_encode(force_bytes(f'{pub_date.isoformat()}|{pk}'))
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Cursor]:
+    """Распаковывает курсор, для битого значения возвращает None."""
+    if not token:
+        return None
+    try:
+        raw_date, raw_pk = urlsafe_base64_decode(token).decode().split('|')
+        pub_date = parse_datetime(raw_date)
+        pk = int(raw_pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+def keyset(posts: QuerySet, date: str, pk: str, cursor: Optional[Cursor],
+           newer: bool) -> QuerySet:
+    """Упорядочивает записи по (date, pk) и отбрасывает все до курсора."""
+    sign = '' if newer else '-'
+    posts = posts.order_by(f'{sign}{date}', f'{sign}{pk}')
+    if cursor is None:
+        return posts
+    pub_date, post_id = cursor
+    op = 'gt' if newer else 'lt'
+    # Диапазон по первой колонке индекса + уточнение по id,
+    # чтобы SQLite читал индекс по порядку, без сортировки.
+    return posts.filter(
+        Q(**{f'{date}__{op}e': pub_date}),
+        Q(**{f'{date}__{op}': pub_date}) | Q(**{f'{pk}__{op}': post_id}),
+    )
+
+
+class CursorPaginator(Paginator):
+    """
+    Пагинатор по ключу (pub_date, id).
+
+    Вместо OFFSET и COUNT(*) страница выбирается условием
+    (pub_date, id) < курсор, поэтому глубокие страницы стоят столько же,
+    сколько первая.
+    """
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 pk_field='pk'):
+        super().__init__(object_list, per_page)
+        self.date_field = date_field
+        self.pk_field = pk_field
+
+    def __getstate__(self) -> dict:
+        # Страница по курсору уже выбрана и от выборки больше не зависит,
+        # а pickle выполнил бы QuerySet целиком. Так страница дешево
+        # ложится в кеш.
+        state = self.__dict__.copy()
+        state['object_list'] = []
+        return state
+
+    def encode(self, row) -> str:
+        """Курсор, указывающий на запись row."""
+        return encode_cursor(row.pub_date, row.pk)
+
+    def decode(self, token: Optional[str]) -> Optional[Cursor]:
+        return decode_cursor(token)
+
+    def seek(self, cursor: Optional[Cursor], newer: bool) -> QuerySet:
+        """Отбирает записи старше (или новее) курсора в нужном порядке."""
+        if hasattr(self.object_list, 'seek'):
+            return self.object_list.seek(cursor, newer)
+        return keyset(
+            self.object_list, self.date_field, self.pk_field, cursor, newer
+        )
+
+    def get_cursor_page(self, before: Optional[str] = None,
+                        after: Optional[str] = None) -> Page:
+        """
+        Возвращает страницу старше before или новее after.
+
+        Номер страницы и число страниц здесь условные: по ним Page
+        отвечает на has_next/has_previous без COUNT(*). Курсоры соседних
+        страниц лежат в next_cursor и previous_cursor.
+        """
+        newer_cursor = self.decode(after)
+        older_cursor = None if newer_cursor else self.decode(before)
+        newer = newer_cursor is not None
+        rows = list(
+            self.seek(newer_cursor or older_cursor, newer)[:self.per_page + 1]
+        )
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if newer:
+            rows.reverse()
+        has_older = bool(rows) and (has_more or newer)
+        has_newer = bool(rows) and (has_more if newer else bool(older_cursor))
+        number = 2 if has_newer else 1
+        self.num_pages = number + 1 if has_older else number
+        page: Page = self._get_page(rows, number, self)
+        page.is_cursor = True
+        if newer:
+            page.cursor = f'after:{after}'
+        else:
+            page.cursor = f'before:{before}' if older_cursor else ''
+        page.next_cursor = page.previous_cursor = None
+        if has_older:
+            page.next_cursor = self.encode(rows[-1])
+        if has_newer:
+            page.previous_cursor = self.encode(rows[0])
+        return page
+
+
+def paginate(request: HttpRequest, posts: QuerySet, per_page: int,
+             date_field: str = 'pub_date', pk_field: str = 'pk') -> Page:
+    """
+    Возвращает страницу ленты.
+
+    Старые ссылки вида ?page=N обслуживает обычный Paginator,
+    все остальные запросы идут по курсорам ?before= и ?after=.
+    """
+    page_number: Union[str, None] = request.GET.get('page')
+    if page_number is not None:
+        if isinstance(posts, QuerySet):
+            posts = posts.order_by(f'-{date_field}', f'-{pk_field}')
+        paginator: Paginator = Paginator(posts, per_page)
+        return paginator.get_page(page_number)
+    paginator = CursorPaginator(posts, per_page, date_field, pk_field)
+    return paginator.get_cursor_page(
+        before=request.GET.get('before'),
+        after=request.GET.get('after'),
+    )
@@ -0,0 +1,227 @@
+"""
+Полнотекстовый поиск по постам на SQLite FTS5.
+
+Индекс posts_post_fts хранит только токены (content='posts_post'),
+текст берется из самой таблицы постов. Триггеры держат индекс в
+согласии с Post.text при любой записи, включая bulk_create и update().
+Django пересоздает таблицу при части миграций и теряет ее триггеры,
+поэтому install() повторяется после каждого migrate.
+
+У каждого шарда (shards.py) свой индекс. Выдача сливается из шардов по
+(rank, id); bm25 считается по словарю шарда, так что ранги разных
+шардов сравнимы лишь приблизительно.
+"""
+import hashlib
+import heapq
+from typing import List, Optional, Tuple, Union
+
+from django.core.paginator import Page
+from django.db import connection
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models.expressions import RawSQL
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_bytes
+from django.utils.html import escape
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.safestring import SafeString, mark_safe
+
+from . import shards
+from .models import Post
+from .paginators import CursorPaginator
+
+TABLE = 'posts_post_fts'
+# Маркеры совпадений в сниппете: их не бывает в тексте постов,
+# поэтому текст можно экранировать целиком и только потом
+# превратить маркеры в <mark>.
+MARK_START, MARK_END = '\x02', '\x03'
+SNIPPET_TOKENS = 16
+
+RankCursor = Tuple[float, int]
+
+INSTALL_SQL = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_ai AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_ad AFTER DELETE ON posts_post
+    BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_au AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+)
+
+UNINSTALL_SQL = (
+    f'DROP TRIGGER IF EXISTS {TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {TABLE}_au',
+    f'DROP TABLE IF EXISTS {TABLE}',
+)
+
+
+def supported(conn: BaseDatabaseWrapper = connection) -> bool:
+    return conn.vendor == 'sqlite'
+
+
+def install(conn: BaseDatabaseWrapper = connection) -> None:
+    """Создает индекс и триггеры, если их еще нет."""
+    if not supported(conn):
+        return
+    with conn.cursor() as cursor:
+        for sql in INSTALL_SQL:
+            cursor.execute(sql)
+
+
+def uninstall(conn: BaseDatabaseWrapper = connection) -> None:
+    if not supported(conn):
+        return
+    with conn.cursor() as cursor:
+        for sql in UNINSTALL_SQL:
+            cursor.execute(sql)
+
+
+def rebuild(conn: BaseDatabaseWrapper = connection) -> None:
+    """Перестраивает индекс по текущему содержимому posts_post."""
+    install(conn)
+    if not supported(conn):
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+
+
+def fts_query(text: str) -> str:
+    """
+    Превращает ввод пользователя в запрос FTS5.
+
+    Каждое слово берется в кавычки, поэтому операторы и спецсимволы
+    FTS5 из ввода ищутся как обычный текст; слова соединяются через И.
+    """
+    words = [word.replace('"', '""') for word in text.split()]
+    return ' '.join(f'"{word}"' for word in words if word.strip('"'))
+
+
+def matching_ids(text: str) -> RawSQL:
+    """Подзапрос id постов, подходящих под запрос."""
+    return RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s',
+        (fts_query(text),),
+    )
+
+
+def search_posts(text: str) -> QuerySet:
+    """
+    Посты, подходящие под запрос, с рангом bm25 и сниппетом.
+
+    Чем меньше rank, тем выше пост в выдаче.
+    """
+    return Post.objects.extra(
+        tables=[TABLE],
+        where=[f'{TABLE}.rowid = posts_post.id', f'{TABLE} MATCH %s'],
+        params=[fts_query(text)],
+        select={
+            'rank': f'{TABLE}.rank',
+            'snippet': (
+                f"snippet({TABLE}, 0, '{MARK_START}', '{MARK_END}', "
+                f"'…', {SNIPPET_TOKENS})"
+            ),
+        },
+    ).select_related('author', 'group')
+
+
+def highlight(snippet: str) -> SafeString:
+    """Экранированный сниппет с подсвеченными совпадениями."""
+    return mark_safe(
+        escape(snippet).replace(MARK_START, '<mark>').replace(
+            MARK_END, '</mark>'
+        )
+    )
+
+
+def _rank_key(post: Post) -> RankCursor:
+    return post.rank, post.pk
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсорный пагинатор по ключу (rank, id) вместо (pub_date, id)."""
+
+    def encode(self, row: Post) -> str:
+        return urlsafe_base64_encode(force_bytes(f'{row.rank!r}|{row.pk}'))
+
+    def decode(self, token: Optional[str]) -> Optional[RankCursor]:
+        if not token:
+            return None
+        try:
+            raw_rank, raw_pk = urlsafe_base64_decode(token).decode().split(
+                '|'
+            )
+            return float(raw_rank), int(raw_pk)
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    def seek(self, cursor: Optional[RankCursor],
+             newer: bool) -> Union[QuerySet, List[Post]]:
+        streams = [
+            self._seek(posts, cursor, newer)
+            for posts in shards.each(self.object_list)
+        ]
+        if len(streams) == 1:
+            return streams[0]
+        return list(heapq.merge(
+            *(posts[:self.per_page + 1] for posts in streams),
+            key=_rank_key, reverse=newer,
+        ))
+
+    def _seek(self, posts: QuerySet, cursor: Optional[RankCursor],
+              newer: bool) -> QuerySet:
+        # Лучшие результаты идут первыми, «старее» значит «хуже».
+        if newer:
+            posts = posts.order_by('-rank', '-pk')
+            op = '<'
+        else:
+            posts = posts.order_by('rank', 'pk')
+            op = '>'
+        if cursor is None:
+            return posts
+        rank, pk = cursor
+        return posts.extra(
+            where=[
+                f'({TABLE}.rank {op} %s OR '
+                f'({TABLE}.rank = %s AND posts_post.id {op} %s))'
+            ],
+            params=[rank, rank, pk],
+        )
+
+
+def search_key(text: str, before: Optional[str],
+               after: Optional[str]) -> str:
+    """Ключ кеша страницы выдачи."""
+    raw = '\n'.join((text, before or '', after or '')).encode()
+    return f'search:{hashlib.md5(raw).hexdigest()}'
+
+
+def search_page(text: str, per_page: int, before: Optional[str] = None,
+                after: Optional[str] = None) -> Page:
+    """Страница выдачи с подсвеченными сниппетами."""
+    page = SearchPaginator(search_posts(text), per_page).get_cursor_page(
+        before=before, after=after
+    )
+    for post in page:
+        post.highlight = highlight(post.snippet)
+    return page
@@ -0,0 +1,260 @@
+"""
+Шардирование постов по автору.
+
+Посты, их комментарии, счетчики и записи лент подписок лежат в
+базе-шарде автора: POST_SHARDS[author_id % len(POST_SHARDS)]; граница
+ленты (TimelineHorizon) своя в каждом шарде, как и сама лента.
+Пользователи, группы и подписки пишутся в default и копируются во все
+шарды (mirror), чтобы JOIN и внешние ключи работали внутри шарда.
+
+Id постов глобальные: шард номер i после migrate выдает id из
+диапазона [i * ID_RANGE, (i + 1) * ID_RANGE) (prepare), поэтому по id
+видно, где лежит пост, а ключ (pub_date, id) однозначен во всех шардах.
+Ленты по всем авторам читаются из каждого шарда и сливаются по
+(pub_date, id) (feeds.scatter).
+
+ShardRouter находит шард по объекту-подсказке (post.comments,
+author.posts, comment.save()); запросы без подсказки должны выбрать
+шард сами через on() или each(). Manager.create() роутеру объект не
+передает: строки моделей шарда создаются через save().
+
+С одним шардом (по умолчанию) и роутер, и помощники ни во что не
+вмешиваются. Шарды с одинаковым NAME считаются одной базой: так в
+тестах, где шард - TEST MIRROR default.
+"""
+from typing import Iterable, List, Sequence, Union
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Model
+from django.db.models.functions import Mod
+from django.db.models.query import QuerySet
+
+from .models import (
+    Comment, Counters, Follow, Group, Post, TimelineEntry, TimelineHorizon,
+    User,
+)
+
+ID_RANGE = 2 ** 40
+BATCH_SIZE = 500
+SHARDED = (Post, Comment, Counters, TimelineEntry, TimelineHorizon)
+# Порядок важен: подписки ссылаются на пользователей.
+MIRRORED = (User, Group, Follow)
+
+
+def aliases() -> List[str]:
+    """Шарды в порядке POST_SHARDS: номер шарда - его позиция."""
+    return list(getattr(settings, 'POST_SHARDS', [DEFAULT_DB_ALIAS]))
+
+
+def _resolve(alias: str) -> str:
+    """Первый псевдоним той же базы."""
+    name = connections[alias].settings_dict['NAME']
+    for other in [DEFAULT_DB_ALIAS, *aliases()]:
+        if connections[other].settings_dict['NAME'] == name:
+            return other
+    return alias
+
+
+def distinct() -> List[str]:
+    """Разные базы-шарды."""
+    found = []
+    for alias in map(_resolve, aliases()):
+        if alias not in found:
+            found.append(alias)
+    return found
+
+
+def sharded() -> bool:
+    return len(distinct()) > 1
+
+
+def shard_for(author_id: int) -> str:
+    """Шард постов и счетчиков пользователя."""
+    shards = aliases()
+    return _resolve(shards[author_id % len(shards)])
+
+
+def shard_of_post(post_id: int) -> str:
+    """Шард поста по диапазону его id."""
+    shards = aliases()
+    number = post_id // ID_RANGE
+    if 0 <= number < len(shards):
+        return _resolve(shards[number])
+    return DEFAULT_DB_ALIAS
+
+
+def on(queryset: QuerySet, alias: str) -> QuerySet:
+    """Выборка из шарда alias; с одним шардом - без изменений."""
+    if not sharded():
+        return queryset
+    return queryset.using(alias)
+
+
+def each(queryset: QuerySet) -> List[QuerySet]:
+    """Та же выборка из каждого шарда."""
+    if not sharded():
+        return [queryset]
+    return [queryset.using(alias) for alias in distinct()]
+
+
+def column(queryset: QuerySet, field: str) -> Union[QuerySet, List]:
+    """
+    Значения поля со всех шардов для фильтра field__in.
+
+    С одним шардом это подзапрос, с несколькими - список: подзапрос в
+    чужую базу не отправить.
+    """
+    querysets = each(queryset.order_by().values_list(field, flat=True))
+    if len(querysets) == 1:
+        return querysets[0]
+    return sorted({value for values in querysets for value in values})
+
+
+def owned(users: QuerySet, alias: str) -> QuerySet:
+    """Пользователи, чьи посты и счетчики лежат в шарде alias."""
+    if not sharded():
+        return users
+    shards = aliases()
+    numbers = [
+        number for number, shard in enumerate(shards)
+        if _resolve(shard) == alias
+    ]
+    return users.annotate(shard=Mod('pk', len(shards))).filter(
+        shard__in=numbers
+    )
+
+
+def prepare(alias: str) -> None:
+    """Сдвигает счетчик id постов шарда к началу его диапазона."""
+    if alias not in aliases() or _resolve(alias) != alias:
+        return
+    connection = connections[alias]
+    floor = aliases().index(alias) * ID_RANGE
+    if not floor or connection.vendor != 'sqlite':
+        return
+    table = Post._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s',
+            [floor, table],
+        )
+        if not cursor.rowcount:
+            cursor.execute(
+                'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                [table, floor],
+            )
+
+
+def copies() -> List[str]:
+    """Шарды, куда копируются строки из default."""
+    primary = _resolve(DEFAULT_DB_ALIAS)
+    return [alias for alias in distinct() if alias != primary]
+
+
+def is_mirror(using: str) -> bool:
+    """Сигнал пришел от копии строки в шарде, а не из default."""
+    return _resolve(using) in copies()
+
+
+def copy_rows(model, rows: Sequence[Model], alias: str) -> None:
+    """Записывает копии строк в шард, без сигналов."""
+    fields = model._meta.concrete_fields
+    manager = model._base_manager.using(alias)
+    rows = [
+        model(**{field.attname: getattr(row, field.attname)
+                 for field in fields})
+        for row in rows
+    ]
+    existing = set(manager.filter(
+        pk__in=[row.pk for row in rows]
+    ).values_list('pk', flat=True))
+    manager.bulk_update(
+        [row for row in rows if row.pk in existing],
+        [field.name for field in fields if not field.primary_key],
+        batch_size=BATCH_SIZE,
+    )
+    manager.bulk_create(
+        [row for row in rows if row.pk not in existing],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def mirror(instance: Model, using: str) -> None:
+    """Копирует сохраненную в default строку во все шарды."""
+    if _resolve(using) != _resolve(DEFAULT_DB_ALIAS):
+        return
+    for alias in copies():
+        copy_rows(type(instance), [instance], alias)
+
+
+def unmirror(instance: Model, using: str) -> None:
+    """
+    Удаляет копии строки из шардов.
+
+    Удаление каскадное: с пользователем из его шарда уходят посты,
+    которых в default нет.
+    """
+    if _resolve(using) != _resolve(DEFAULT_DB_ALIAS):
+        return
+    for alias in copies():
+        type(instance)._base_manager.using(alias).filter(
+            pk=instance.pk
+        ).delete()
+
+
+def mirror_all(models: Iterable = MIRRORED) -> int:
+    """Копирует в шарды все строки моделей, возвращает их число."""
+    copied = 0
+    for model in models:
+        rows = model._base_manager.using(DEFAULT_DB_ALIAS).order_by('pk')
+        batch = []
+        for row in rows.iterator():
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                copied += _copy_batch(model, batch)
+                batch = []
+        copied += _copy_batch(model, batch)
+    return copied
+
+
+def _copy_batch(model, batch: List[Model]) -> int:
+    if batch:
+        for alias in copies():
+            copy_rows(model, batch, alias)
+    return len(batch)
+
+
+class ShardRouter:
+    """
+    Направляет модели шарда в базу автора.
+
+    Стоит перед ReplicaRouter: реплика - копия одной default, а модели
+    шарда при нескольких шардах читаются только из шардов.
+    """
+
+    def _shard(self, model, hints):
+        if model not in SHARDED or not sharded():
+            return None
+        instance = hints.get('instance')
+        if isinstance(instance, Post):
+            if instance.pk is not None:
+                return shard_of_post(instance.pk)
+            return shard_for(instance.author_id)
+        if isinstance(instance, Comment):
+            return shard_of_post(instance.post_id)
+        if isinstance(instance, Counters):
+            return shard_for(instance.user_id)
+        if isinstance(instance, TimelineEntry):
+            return shard_for(instance.author_id)
+        if isinstance(instance, User) and model in (Post, Counters):
+            return shard_for(instance.pk)
+        # Без подсказки шард не угадать: такие запросы выбирают его
+        # сами (on, each), остальные идут в default, но не в реплику.
+        return DEFAULT_DB_ALIAS
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints)
@@ -0,0 +1,185 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.caching.tags import invalidate, invalidate_on_commit
+from core.thumbnails import thumbnails_ready
+
+from . import blobs, counters, shards, timeline
+from .caching import (
+    ANY_AUTHOR, ANY_GROUP, FEED_INDEX, author_tag, follow_tag, group_tag,
+    image_tags, post_tag,
+)
+from .models import Comment, Counters, Follow, Group, Post, User
+
+# Копии в шарды делаются первыми: счетчики и ленты в шарде ссылаются
+# на пользователя и подписку. Счетчики обновляются раньше лент: по
+# followers_count лента решает, раскладывать ли посты автора при записи.
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=Follow)
+def mirror_to_shards(sender, instance, using, **kwargs):
+    shards.mirror(instance, using)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Follow)
+def unmirror_from_shards(sender, instance, using, **kwargs):
+    shards.unmirror(instance, using)
+
+
+@receiver(post_save, sender=User)
+def create_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        shards.on(
+            Counters.objects.all(), shards.shard_for(instance.pk)
+        ).get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.bump(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_comments(instance.post_id, 1)
+        counters.bump(instance.author_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+    counters.bump(instance.author_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(instance.author_id, 'followers_count', 1)
+        counters.bump(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, using, **kwargs):
+    if shards.is_mirror(using):
+        return
+    counters.bump(instance.author_id, 'followers_count', -1)
+    counters.bump(instance.user_id, 'following_count', -1)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, raw=False, **kwargs):
+    """Картинка и группа поста до правки: для ссылок на файл и кеша."""
+    instance._previous = {}
+    if not raw and instance.pk is not None:
+        instance._previous = shards.on(
+            Post.objects.filter(pk=instance.pk),
+            shards.shard_of_post(instance.pk),
+        ).values('image', 'group_id').first() or {}
+
+
+@receiver(post_save, sender=Post)
+def count_image(sender, instance, raw=False, **kwargs):
+    """Переносит ссылку поста со старого файла на новый."""
+    previous = getattr(instance, '_previous', {}).get('image', '')
+    if raw or previous == instance.image.name:
+        return
+    if instance.image:
+        blobs.retain(instance.image.name)
+    if previous:
+        blobs.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_image(sender, instance, **kwargs):
+    if instance.image:
+        blobs.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    """Раскладывает новый пост по лентам подписчиков."""
+    if created and not raw:
+        timeline.push_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    """Дополняет ленту постами автора, на которого подписались."""
+    if created and not raw and not timeline.is_pull_author(
+        instance.author_id
+    ):
+        timeline.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, using, **kwargs):
+    """Убирает из ленты посты автора, от которого отписались."""
+    if shards.is_mirror(using):
+        return
+    timeline.prune(instance.user, instance.author)
+    # Дешево и при колебаниях у порога: поднимаются границы лент
+    # подписчиков, посты заново не раскладываются.
+    if timeline.followers_count(
+        instance.author_id
+    ) == timeline.pull_threshold():
+        timeline.restore_author(instance.author)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, using, **kwargs):
+    """Сбрасывает кеш страниц, на которых виден пост."""
+    tags = [FEED_INDEX, post_tag(instance.pk), author_tag(instance.author_id)]
+    if instance.group_id:
+        tags.append(group_tag(instance.group_id))
+    # Пост, перенесенный в другую группу, пропадает и со страницы старой.
+    previous_group = getattr(instance, '_previous', {}).get('group_id')
+    if previous_group and previous_group != instance.group_id:
+        tags.append(group_tag(previous_group))
+    invalidate_on_commit(*tags, using=using)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, using, **kwargs):
+    invalidate_on_commit(post_tag(instance.post_id), using=using)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, using, **kwargs):
+    """Кнопка подписки в профиле зависит от подписок зрителя."""
+    invalidate_on_commit(follow_tag(instance.user_id), using=using)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, using, **kwargs):
+    invalidate_on_commit(group_tag(instance.pk), ANY_GROUP, using=using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_author(sender, instance, using, update_fields=None,
+                      **kwargs):
+    """Имя автора есть в карточках постов; вход на сайт кеш не трогает."""
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    invalidate_on_commit(author_tag(instance.pk), ANY_AUTHOR, using=using)
+
+
+@receiver(thumbnails_ready)
+def invalidate_thumbnails(sender, name, **kwargs):
+    """Страницы показывали оригинал, пока миниатюры не было."""
+    invalidate(*image_tags(name))
@@ -0,0 +1,94 @@
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, Client, TransactionTestCase
+from django.urls import reverse
+
+from core.caching.tags import tag_versions
+from posts.caching import post_tag
+from posts.models import Post, Group
+
+User = get_user_model()
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовый текст',
+            slug='test-slug'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Тестовый пост',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+
+    def assertAllPages(self, text, present=True):
+        for url in self.urls:
+            with self.subTest(url=url):
+                content = self.guest_client.get(url).content.decode()
+                if present:
+                    self.assertIn(text, content)
+                else:
+                    self.assertNotIn(text, content)
+
+    def test_fragment_is_cached(self):
+        """Проверяем что фрагмент берется из кеша, пока теги не менялись."""
+        self.assertAllPages('Тестовый пост')
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        self.assertAllPages('Тестовый пост')
+
+    def test_edit_invalidates_fragment(self):
+        """Проверяем что правка поста сразу видна на всех лентах."""
+        self.assertAllPages('Тестовый пост')
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        self.assertAllPages('Исправленный пост')
+
+    def test_new_and_deleted_posts_invalidate_fragment(self):
+        """Проверяем что новый и удаленный пост сразу видны на лентах."""
+        self.assertAllPages('Тестовый пост')
+        new_post = Post.objects.create(
+            author=self.user, group=self.group, text='Новый пост'
+        )
+        self.assertAllPages('Новый пост')
+        new_post.delete()
+        self.assertAllPages('Новый пост', present=False)
+
+    def test_author_rename_invalidates_fragment(self):
+        """Проверяем что смена имени автора видна в карточках."""
+        self.assertAllPages('Тестовый пост')
+        self.user.first_name = 'Лев'
+        self.user.save()
+        content = self.guest_client.get(self.urls[0]).content.decode()
+        self.assertIn('Лев', content)
+
+
+class CommitInvalidationTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.post = Post.objects.create(author=self.user, text='Старый текст')
+
+    def test_versions_bumped_again_after_commit(self):
+        """Закешированное по строкам до коммита устаревает после него."""
+        tags = [post_tag(self.post.pk)]
+        with transaction.atomic():
+            self.post.text = 'Новый текст'
+            self.post.save()
+            # Соседний запрос видит старую строку, но уже новые версии.
+            during = tag_versions(tags)
+        self.assertNotEqual(tag_versions(tags), during)
@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts.models import Post, Comment
+from posts.views import COMMENT_COUNT
+
+User = get_user_model()
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Ответ {i}')
+            for i in range(COMMENT_COUNT + 5)
+        )
+        cls.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk}
+        )
+        cls.fragment_url = reverse(
+            'posts:comments', kwargs={'post_id': cls.post.pk}
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_first_render_is_windowed(self):
+        """Страница поста показывает только первое окно комментариев."""
+        response = self.guest_client.get(self.detail_url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENT_COUNT)
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, comments.next_cursor)
+
+    def test_fragment_returns_next_batch(self):
+        """Фрагмент отдает следующую порцию без повторов."""
+        first = self.guest_client.get(self.detail_url).context['comments']
+        response = self.guest_client.get(
+            self.fragment_url, {'before': first.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        rest = response.context['comments']
+        self.assertEqual(len(rest), 5)
+        self.assertFalse(rest.has_next())
+        seen = {comment.pk for comment in first} | {
+            comment.pk for comment in rest
+        }
+        self.assertEqual(
+            seen, set(self.post.comments.values_list('pk', flat=True))
+        )
+
+    def test_fragment_unknown_post(self):
+        """Фрагмент несуществующего поста отвечает 404."""
+        response = self.guest_client.get(
+            reverse('posts:comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост'
+        )
+        cls.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            'profile': reverse('posts:profile', kwargs={'username': 'auth'}),
+            'post': reverse(
+                'posts:post_detail', kwargs={'post_id': cls.post.pk}
+            ),
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def revalidate(self, client, url):
+        """Повторный запрос с ETag первого ответа."""
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_answer_304(self):
+        """Неизменная страница отвечает 304 без рендера шаблона."""
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                response = self.revalidate(self.guest_client, url)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+
+    def test_index_revalidates_without_database(self):
+        """Главная гостю отвечает 304 только по версиям тегов."""
+        etag = self.guest_client.get(self.urls['index'])['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(
+                self.urls['index'], HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_user(self):
+        """Гость и пользователь не получают чужую шапку из 304."""
+        guest = self.guest_client.get(self.urls['index'])['ETag']
+        response = self.reader_client.get(
+            self.urls['index'], HTTP_IF_NONE_MATCH=guest
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], guest)
+
+    def test_changes_invalidate_etag(self):
+        """Пост, комментарий, подписка и перенос поста меняют ETag."""
+        changes = (
+            ('index', lambda: Post.objects.create(
+                author=self.reader, text='Новый пост'
+            )),
+            ('post', lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'
+            )),
+            ('profile', lambda: Follow.objects.create(
+                user=self.reader, author=self.user
+            )),
+        )
+        for name, change in changes:
+            with self.subTest(page=name):
+                url = self.urls[name]
+                etag = self.reader_client.get(url)['ETag']
+                change()
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+        # Пост ушел в другую группу: страница старой тоже меняется.
+        post = Post.objects.get(pk=self.post.pk)
+        etag = self.reader_client.get(self.urls['group'])['ETag']
+        post.group = Group.objects.create(title='Другая', slug='other')
+        post.save()
+        response = self.reader_client.get(
+            self.urls['group'], HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_object_is_404(self):
+        """Валидатор не прячет 404 за ETag."""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 0}),
+            HTTP_IF_NONE_MATCH='"x"',
+        )
+        self.assertEqual(response.status_code, 404)
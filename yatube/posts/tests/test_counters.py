@@ -0,0 +1,92 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post, Comment, Counters, Follow
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.post = Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def counters(self, user):
+        return Counters.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счетчики меняются вместе с постами, комментариями и подписками."""
+        comment = Comment.objects.create(
+            post=self.post, author=self.follower, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.follower, author=self.author)
+        author, follower = self.counters(self.author), self.counters(
+            self.follower
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(author.posts_count, 1)
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(follower.comments_count, 1)
+        self.assertEqual(follower.following_count, 1)
+        self.assertEqual(self.post.comments_count, 1)
+        comment.delete()
+        follow.delete()
+        author, follower = self.counters(self.author), self.counters(
+            self.follower
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(author.followers_count, 0)
+        self.assertEqual(follower.comments_count, 0)
+        self.assertEqual(follower.following_count, 0)
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount чинит разъехавшиеся и пропавшие счетчики."""
+        Counters.objects.filter(user=self.author).update(posts_count=42)
+        Counters.objects.filter(user=self.follower).delete()
+        Follow.objects.create(user=self.follower, author=self.author)
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.follower).following_count, 1)
+
+    def test_author_deletion_cascades(self):
+        """Удаление автора не спотыкается о его счетчики."""
+        author = User.objects.create_user(username='leaving')
+        post = Post.objects.create(author=author, text='Прощальный пост')
+        Comment.objects.create(
+            post=post, author=self.follower, text='Комментарий'
+        )
+        Follow.objects.create(user=self.follower, author=author)
+        author_id = author.pk
+        author.delete()
+        self.assertFalse(Counters.objects.filter(user_id=author_id))
+        self.assertEqual(self.counters(self.follower).following_count, 0)
+
+    def test_pages_do_not_count(self):
+        """Профиль и страница поста показывают счетчики без COUNT(*)."""
+        urls = (
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                for query in queries:
+                    self.assertNotIn('COUNT(', query['sql'].upper())
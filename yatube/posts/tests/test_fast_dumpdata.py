@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group as UserGroup
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import fixtures
+from posts.management.commands.fast_dumpdata import MODELS
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FastDumpdataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.reader.groups.set([
+            UserGroup.objects.create(name='Модераторы'),
+            UserGroup.objects.create(name='Читатели'),
+        ])
+        group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        for number in range(5):
+            post = Post.objects.create(
+                author=self.author, text=f'Пост «{number}»', group=group,
+            )
+        Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def dump(self, **options):
+        # Один процесс: у тестовой базы в памяти нет файла для воркеров.
+        call_command(
+            'fast_dumpdata', self.directory, workers=1, chunk_size=2,
+            stdout=StringIO(), **options,
+        )
+
+    def read(self, path):
+        with fixtures.open_fixture(path) as file:
+            return file.read()
+
+    def test_same_bytes_as_dumpdata(self):
+        """Файл каждой модели совпадает с выводом dumpdata."""
+        for indent in (None, 2):
+            self.dump(indent=indent)
+            for label in MODELS:
+                expected = os.path.join(self.directory, 'expected.json')
+                call_command(
+                    'dumpdata', label, indent=indent, output=expected
+                )
+                self.assertEqual(
+                    self.read(os.path.join(self.directory, f'{label}.json')),
+                    self.read(expected),
+                    label,
+                )
+
+    def test_compressed_round_trip(self):
+        """Сжатые файлы загружаются обратно через fast_loaddata."""
+        self.dump(compress=True)
+        paths = [
+            os.path.join(self.directory, f'{label}.json.gz')
+            for label in MODELS
+        ]
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        call_command('fast_loaddata', *paths, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(
+            User.objects.get(username='reader').groups.count(), 2
+        )
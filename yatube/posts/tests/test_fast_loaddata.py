@@ -0,0 +1,124 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from core import fixtures
+from posts import counters, search
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+
+def index_names():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' "
+            'ORDER BY name'
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class FixtureParserTests(TestCase):
+    def test_iter_objects_small_chunks(self):
+        """Массив разбирается по кускам, даже если куски режут строки."""
+        items = [
+            {'model': 'posts.post', 'pk': 1, 'fields': {'text': '], {"x": ,'}},
+            {'model': 'posts.post', 'pk': 2, 'fields': {'text': 'Ёж\n'}},
+        ]
+        text = json.dumps(items, indent=2, ensure_ascii=False)
+        for chunk_size in (1, 3, 1024):
+            self.assertEqual(
+                list(fixtures.iter_objects(StringIO(text), chunk_size)),
+                items,
+            )
+        self.assertEqual(list(fixtures.iter_objects(StringIO(' [ ] '))), [])
+        with self.assertRaises(ValueError):
+            list(fixtures.iter_objects(StringIO(text[:-20]), 8))
+
+    def test_dependency_order(self):
+        """Модели идут после тех, на кого ссылаются."""
+        order = fixtures.dependency_order([Comment, Follow, Post, Group, User])
+        self.assertLess(order.index(User), order.index(Post))
+        self.assertLess(order.index(Group), order.index(Post))
+        self.assertLess(order.index(Post), order.index(Comment))
+        self.assertLess(order.index(User), order.index(Follow))
+
+
+class FastLoaddataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        # JSON dumpdata хранит время с точностью до миллисекунд.
+        self.old = timezone.now().replace(microsecond=0) - timedelta(
+            days=365
+        )
+        for number in range(5):
+            post = Post.objects.create(
+                author=self.author, text=f'Кактус номер {number}',
+                group=self.group,
+            )
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=self.old - timedelta(days=number)
+            )
+        Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        descriptor, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(descriptor)
+        self.addCleanup(os.remove, self.path)
+        call_command(
+            'dumpdata', 'auth.user', 'posts.group', 'posts.post',
+            'posts.comment', 'posts.follow', output=self.path,
+        )
+        self.dates = dict(Post.objects.values_list('pk', 'pub_date'))
+
+    def load(self):
+        call_command(
+            'fast_loaddata', self.path, batch_size=2, transaction_size=3,
+            stdout=StringIO(),
+        )
+
+    def test_load_into_empty_tables(self):
+        """Даты, счетчики, ленты, поиск и индексы - как до выгрузки."""
+        indexes = index_names()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.assertFalse(Post.objects.exists())
+        self.load()
+        self.assertEqual(
+            dict(Post.objects.values_list('pk', 'pub_date')), self.dates
+        )
+        self.assertEqual(Comment.objects.count(), 1)
+        author = User.objects.get(username='author')
+        reader = User.objects.get(username='reader')
+        self.assertEqual(counters.get_counters(author).posts_count, 5)
+        self.assertEqual(counters.get_counters(author).followers_count, 1)
+        self.assertEqual(counters.get_counters(reader).comments_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(), 5
+        )
+        self.assertEqual(search.search_posts('кактус').count(), 5)
+        self.assertEqual(index_names(), indexes)
+
+    def test_existing_rows_updated(self):
+        """Строки с теми же id перезаписываются, а не дублируются."""
+        Post.objects.update(text='Изменено')
+        self.load()
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertFalse(Post.objects.filter(text='Изменено').exists())
+        self.assertEqual(search.search_posts('кактус').count(), 5)
+        self.assertFalse(search.search_posts('изменено').exists())
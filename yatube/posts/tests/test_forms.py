@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -7,6 +8,7 @@ from django.contrib.auth import get_user_model
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 
+from core.storage import blob_name
 from posts.models import Post, Group
 
 User = get_user_model()
@@ -135,6 +137,8 @@ class PostFormsTests(TestCase):
                 author=self.user,
                 group=self.group.pk,
                 text='Тест',
-                image='posts/small.gif'
+                image=blob_name(
+                    'posts', hashlib.sha256(small_gif).hexdigest(), '.gif'
+                )
             ).exists()
         )
@@ -0,0 +1,145 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import thumbnails
+from posts import blobs, media_gc, variants
+from posts.models import ImageBlob, ImageVariant, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class MediaGarbageCollectorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, name, content):
+        post = Post.objects.create(
+            author=self.user,
+            text=name,
+            image=SimpleUploadedFile(name, content, content_type='image/gif'),
+        )
+        thumbnails.generate(post.image)
+        variants.submit(post.image.name)
+        return post
+
+    def files(self, post):
+        """Оригинал, миниатюры и варианты изображения поста."""
+        geometry, options = thumbnails.geometries()[0]
+        names = [
+            post.image.name,
+            thumbnails.thumbnail_file(post.image, geometry, **options).name,
+        ]
+        names += ImageVariant.objects.filter(
+            source=post.image.name
+        ).values_list('file', flat=True)
+        return [os.path.join(TEMP_MEDIA_ROOT, name) for name in names]
+
+    def gc(self, *args):
+        output = StringIO()
+        call_command('gc_media', '--rate=0', *args, stdout=output)
+        return output.getvalue()
+
+    def test_orphans_are_removed_with_their_records(self):
+        """Файлы удаленного поста уходят, файлы живого остаются."""
+        kept = self.create_post('kept.gif', SMALL_GIF)
+        deleted = self.create_post('deleted.gif', OTHER_GIF)
+        deleted_name = deleted.image.name
+        orphaned = self.files(deleted)
+        self.assertGreater(len(orphaned), 2)
+        deleted.delete()
+        output = self.gc('--min-age=0', '--dry-run')
+        self.assertIn('Пробный запуск', output)
+        self.assertTrue(all(map(os.path.exists, orphaned)))
+        output = self.gc('--min-age=0')
+        self.assertIn('исходников миниатюр 1, вариантов', output)
+        self.assertFalse(any(map(os.path.exists, orphaned)), output)
+        self.assertTrue(all(map(os.path.exists, self.files(kept))))
+        self.assertFalse(ImageVariant.objects.filter(source=deleted_name))
+        self.assertFalse(ImageBlob.objects.filter(name=deleted_name))
+        self.assertFalse(KVStoreModel.objects.filter(
+            value__contains=deleted_name
+        ))
+
+    def test_fresh_files_are_kept(self):
+        """Файлы моложе --min-age не трогаются: пост мог не закоммититься."""
+        post = self.create_post('fresh.gif', OTHER_GIF)
+        orphaned = self.files(post)
+        post.delete()
+        self.gc()
+        self.assertTrue(all(map(os.path.exists, orphaned)))
+
+    def test_scan_streams_batches(self):
+        """Обход отдает пачки не больше batch_size, обходя подкаталоги."""
+        for name in ('top.txt', 'ab/1.txt', 'ab/cd/2.txt', 'ef/3.txt'):
+            path = os.path.join(TEMP_MEDIA_ROOT, 'scan', name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as file:
+                file.write('x')
+        batches = list(media_gc.scan('scan', 2, 1, min_age=0))
+        self.assertTrue(all(len(batch) == 1 for batch in batches))
+        self.assertEqual(
+            sorted(name for batch in batches for name, _ in batch),
+            ['scan/ab/1.txt', 'scan/ab/cd/2.txt', 'scan/ef/3.txt',
+             'scan/top.txt'],
+        )
+
+    def test_records_are_checked_in_batches(self):
+        """Записи сверяются пачками по одной: живые остаются, счет верен."""
+        kept = [
+            self.create_post(
+                f'kept{i}.gif', SMALL_GIF.replace(b'\xFF\xFF', bytes([i, i]))
+            )
+            for i in range(3)
+        ]
+        deleted = self.create_post('gone.gif', OTHER_GIF)
+        deleted_name = deleted.image.name
+        deleted.delete()
+        ImageBlob.objects.update(refs=7)
+        ImageBlob.objects.create(name='lost.gif', refs=3)
+        self.assertEqual(blobs.recount(batch_size=1), 3)
+        self.assertEqual(
+            dict(ImageBlob.objects.values_list('name', 'refs')),
+            {**{post.image.name: 1 for post in kept},
+             deleted_name: 0, 'lost.gif': 0},
+        )
+        counts = media_gc.prune_records(dry_run=False, batch_size=1)
+        self.assertEqual(counts['blobs'], 2)
+        self.assertGreater(counts['variants'], 0)
+        self.assertEqual(
+            set(ImageVariant.objects.values_list('source', flat=True)),
+            {post.image.name for post in kept},
+        )
+        self.assertEqual(ImageBlob.objects.count(), 3)
@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        cls.index_url = reverse('posts:index')
+        cls.post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk}
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+
+    def test_anonymous_hit_skips_view_and_database(self):
+        """Повторный запрос гостя отдается из кеша без запросов к базе."""
+        first = self.guest_client.get(self.index_url)
+        self.assertNotIn('X-Page-Cache', first)
+        with self.assertNumQueries(0):
+            second = self.guest_client.get(self.index_url)
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        self.assertEqual(second.content, first.content)
+
+    def test_holes_are_rendered_per_user(self):
+        """Тело общее, а шапка и переключатель лент у каждого свои."""
+        self.guest_client.get(self.index_url)
+        response = self.reader_client.get(self.index_url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertContains(response, 'Избранные авторы')
+        self.assertNotContains(response, '<!--hole:')
+        response = self.guest_client.get(self.index_url)
+        self.assertContains(response, 'Войти')
+        self.assertNotContains(response, 'Избранные авторы')
+
+    def test_personal_post_actions_on_hit(self):
+        """Автор получает из кеша свою кнопку правки и форму с CSRF."""
+        self.guest_client.get(self.post_url)
+        response = self.author_client.get(self.post_url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'редактировать запись')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        response = self.reader_client.get(self.post_url)
+        self.assertNotContains(response, 'редактировать запись')
+
+    def test_signals_invalidate_pages(self):
+        """Новый пост и комментарий сбрасывают закешированные страницы."""
+        self.guest_client.get(self.index_url)
+        self.guest_client.get(self.post_url)
+        Post.objects.create(author=self.reader, text='Свежий пост')
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Свежий комментарий'
+        )
+        response = self.guest_client.get(self.index_url)
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'Свежий пост')
+        response = self.guest_client.get(self.post_url)
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'Свежий комментарий')
+
+    def test_unknown_params_share_page(self):
+        """Посторонние параметры не заводят новых страниц в кеше."""
+        self.guest_client.get(self.index_url, {'utm_source': 'a', 'page': 1})
+        response = self.guest_client.get(
+            self.index_url, {'page': 1, 'utm_source': 'b', 'x': 1}
+        )
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        response = self.guest_client.get(self.index_url, {'page': 2})
+        self.assertNotIn('X-Page-Cache', response)
+
+    def test_hit_answers_304(self):
+        """Попадание в кеш тоже отвечает 304 на совпавший ETag."""
+        etag = self.guest_client.get(self.index_url)['ETag']
+        response = self.guest_client.get(
+            self.index_url, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_disabled_cache_renders_inline(self):
+        """С PAGE_CACHE_TIMEOUT = 0 фрагменты рисуются сразу."""
+        self.guest_client.get(self.index_url)
+        response = self.reader_client.get(self.index_url)
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'Пользователь: reader')
@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts.models import Post
+from posts.paginators import decode_cursor, encode_cursor
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый пост {i}')
+            for i in range(25)
+        )
+        cls.expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True
+            )
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.post_index = reverse('posts:index')
+
+    def walk(self, param, cursor):
+        response = self.guest_client.get(self.post_index, {param: cursor})
+        return response.context['page_obj']
+
+    def test_cursor_walk_matches_plain_order(self):
+        """Проверяем что обход по курсорам повторяет порядок ленты."""
+        page_obj = self.guest_client.get(self.post_index).context['page_obj']
+        pages = [[post.pk for post in page_obj]]
+        while page_obj.has_next():
+            page_obj = self.walk('before', page_obj.next_cursor)
+            pages.append([post.pk for post in page_obj])
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), self.expected)
+        page_obj = self.walk('after', page_obj.previous_cursor)
+        self.assertEqual([post.pk for post in page_obj], pages[1])
+
+    def test_classic_page_links_still_work(self):
+        """Проверяем что старые ссылки ?page=N открывают ту же страницу."""
+        response = self.guest_client.get(self.post_index, {'page': 3})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 3)
+        self.assertEqual([post.pk for post in page_obj], self.expected[20:])
+
+    def test_broken_cursor_opens_first_page(self):
+        """Проверяем что битый курсор открывает первую страницу."""
+        page_obj = self.walk('before', 'не-курсор')
+        self.assertEqual([post.pk for post in page_obj], self.expected[:10])
+        self.assertFalse(page_obj.has_previous())
+
+    def test_cursor_round_trip(self):
+        """Проверяем упаковку и распаковку курсора."""
+        post = Post.objects.get(pk=self.expected[0])
+        cursor = encode_cursor(post.pub_date, post.pk)
+        self.assertEqual(decode_cursor(cursor), (post.pub_date, post.pk))
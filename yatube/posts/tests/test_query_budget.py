@@ -0,0 +1,108 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from core.query_budget import budget_for
+from posts.models import Post, Group, Comment, Follow
+
+User = get_user_model()
+
+
+class QueryBudgetMixin:
+    """
+    Страницы лент укладываются в бюджет запросов при любом объеме
+    данных: число запросов не должно расти вместе с числом постов.
+    """
+    size = 0
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовый текст',
+            slug='test-slug'
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, group=cls.group, text=f'Пост {i}')
+            for i in range(cls.size)
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост'
+        )
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.follower, text=f'Ответ {i}')
+            for i in range(cls.size)
+        )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.follower)
+
+    def assertWithinBudget(self, url, data=None):
+        match = resolve(url)
+        budget = budget_for(match.func, match.view_name)
+        self.assertIsNotNone(budget, f'{url}: бюджет не объявлен')
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), budget,
+            '\n'.join(query['sql'] for query in queries),
+        )
+        return response
+
+    def test_views_within_budget(self):
+        """Страницы лент не выходят за свой бюджет запросов."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:comments', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            for data in ({}, {'page': 2}):
+                with self.subTest(url=url, data=data):
+                    self.assertWithinBudget(url, data)
+
+
+class SmallQueryBudgetTests(QueryBudgetMixin, TestCase):
+    size = 10
+
+
+class LargeQueryBudgetTests(QueryBudgetMixin, TestCase):
+    size = 1000
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(QUERY_BUDGETS={'posts:index': 0})
+    def test_violation_is_logged(self):
+        """Превышение бюджета попадает в лог."""
+        with self.assertLogs('yatube.query_budget', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+
+    def test_no_log_within_budget(self):
+        """Страница в пределах бюджета в лог не пишет."""
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('yatube.query_budget', 'WARNING'):
+                self.client.get(reverse('posts:index'))
@@ -0,0 +1,135 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from posts.models import Post, Group, Comment, Follow, TimelineHorizon
+from posts.timeline import is_pull_author
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\S+$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+class PlanTestCase(TestCase):
+    """
+    Каждый SELECT, который выполняют страницы ленты, должен идти по
+    индексу: без полного просмотра таблицы и без сортировки во
+    временном B-дереве.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.follower)
+        self.statements = []
+
+    def capture(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            self.statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    def plans(self, url, data=None):
+        self.statements = []
+        with connection.execute_wrapper(self.capture):
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        with connection.cursor() as cursor:
+            for sql, params in self.statements:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                yield sql, [row[-1] for row in cursor.fetchall()]
+        return response
+
+    def assertIndexedPlans(self, url, data=None):
+        for sql, plan in self.plans(url, data):
+            with self.subTest(url=url, sql=sql):
+                for step in plan:
+                    self.assertIsNone(FULL_SCAN.match(step), plan)
+                    self.assertNotIn(TEMP_SORT, step, plan)
+
+
+class QueryPlanTests(PlanTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовый текст',
+            slug='test-slug'
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, group=cls.group, text=f'Пост {i}')
+            for i in range(25)
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост'
+        )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        Comment.objects.create(
+            post=cls.post, author=cls.follower, text='Комментарий'
+        )
+
+    def test_feed_views_use_indexes(self):
+        """Проверяем планы запросов всех лент на первой странице."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            self.assertIndexedPlans(url)
+
+    def test_deep_cursor_pages_use_indexes(self):
+        """Проверяем планы запросов лент на глубоких страницах."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            page_obj = self.client.get(url).context['page_obj']
+            self.assertIndexedPlans(url, {'before': page_obj.next_cursor})
+
+
+@override_settings(TIMELINE_LENGTH=5, FEED_PULL_THRESHOLD=1)
+class FollowFeedPlanTests(PlanTestCase):
+    """
+    Лента подписок, которая читается не только из разложенной ленты:
+    у читателя обрезанная лента с границей и «тянущий» автор.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(25)
+        )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        cls.star = User.objects.create_user(username='star')
+        Post.objects.bulk_create(
+            Post(author=cls.star, text=f'Пост звезды {i}') for i in range(5)
+        )
+        Follow.objects.create(user=cls.follower, author=cls.star)
+        Follow.objects.create(user=cls.user, author=cls.star)
+
+    def test_feed_views_use_indexes(self):
+        """Ниже границы и у «тянущего» автора посты читаются по индексу."""
+        self.assertTrue(
+            TimelineHorizon.objects.filter(user=self.follower).exists()
+        )
+        self.assertTrue(is_pull_author(self.star.pk))
+        url = reverse('posts:follow_index')
+        self.assertIndexedPlans(url)
+        page_obj = self.client.get(url).context['page_obj']
+        self.assertIndexedPlans(url, {'before': page_obj.next_cursor})
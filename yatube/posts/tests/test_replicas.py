@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import replicas
+from posts.models import Post
+
+User = get_user_model()
+
+REPLICA = 'lagging'
+
+
+@override_settings(DATABASE_REPLICA=REPLICA, PAGE_CACHE_TIMEOUT=0)
+class ReplicaTests(TransactionTestCase):
+    """
+    Реплика - отдельный файл SQLite, который догоняет только sync.
+
+    TransactionTestCase: backup из открытой транзакции ждал бы ее конца.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(self.directory, 'replica.sqlite3'),
+        }
+        self.user = User.objects.create_user(username='auth')
+        self.post = Post.objects.create(text='Старый текст', author=self.user)
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tearDown(self):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def replica_queries(self, client, url):
+        with CaptureQueriesContext(connections[REPLICA]) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_pages_read_lagging_replica(self):
+        """Страницы читают реплику, даже когда она отстала."""
+        replicas.sync(REPLICA)
+        # update() без сигналов: кеш не инвалидируется, реплика отстает.
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertContains(response, 'Старый текст')
+        self.assertNotIn(replicas.STICKY_KEY, self.guest_client.session)
+
+    def test_replica_serves_reads_after_unrelated_write(self):
+        """Чужая запись после sync не уводит чтение с реплики."""
+        replicas.sync(REPLICA)
+        other = User.objects.create_user(username='other')
+        Post.objects.create(text='Чужой пост', author=other)
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        self.assertGreater(self.replica_queries(self.guest_client, url), 0)
+        self.assertGreater(
+            self.replica_queries(self.guest_client, reverse('posts:index')), 0
+        )
+
+    def test_lagging_too_far_reads_primary(self):
+        """Реплика, отставшая больше REPLICA_MAX_LAG, не читается."""
+        replicas.sync(REPLICA)
+        url = reverse('posts:index')
+        later = time.time() + settings.REPLICA_MAX_LAG + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual(self.replica_queries(self.guest_client, url), 0)
+        self.assertGreater(self.replica_queries(self.guest_client, url), 0)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=60)
+    def test_cached_page_is_versioned_by_snapshot(self):
+        """Страница с реплики не отдается автору и после следующего sync."""
+        url = reverse('posts:index')
+        replicas.sync(REPLICA)
+        self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Пост автора'}
+        )
+        # Гость читает реплику, где поста еще нет, и кладет страницу
+        # в кеш под уже новыми версиями тегов.
+        self.assertGreater(self.replica_queries(self.guest_client, url), 0)
+        self.assertNotContains(self.guest_client.get(url), 'Пост автора')
+        self.assertContains(self.authorized_client.get(url), 'Пост автора')
+        replicas.sync(REPLICA)
+        self.assertContains(self.guest_client.get(url), 'Пост автора')
+
+    def test_writer_reads_primary_for_sticky_window(self):
+        """Автор после записи читает основную базу REPLICA_STICKY_SECONDS."""
+        self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Пост автора'}
+        )
+        replicas.sync(REPLICA)
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        self.assertEqual(self.replica_queries(self.authorized_client, url), 0)
+        self.assertGreater(self.replica_queries(self.guest_client, url), 0)
+        later = time.time() + settings.REPLICA_STICKY_SECONDS + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertGreater(
+                self.replica_queries(self.authorized_client, url), 0
+            )
+
+    def test_writes_go_to_primary(self):
+        """Запись не попадает в реплику до следующего sync."""
+        replicas.sync(REPLICA)
+        self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Пост автора'}
+        )
+        self.assertTrue(Post.objects.filter(text='Пост автора').exists())
+        self.assertFalse(
+            Post.objects.using(REPLICA).filter(text='Пост автора').exists()
+        )
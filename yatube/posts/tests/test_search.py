@@ -0,0 +1,114 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Ёжик в тумане искал лошадку'
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Туман над рекой {i}')
+            for i in range(15)
+        )
+        Post.objects.create(
+            author=cls.user, text='Туман, туман, кругом туман'
+        )
+        Post.objects.create(author=cls.user, text='Совсем про другое')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.url = reverse('posts:search')
+
+    def found(self, text):
+        return set(search.search_posts(text).values_list('pk', flat=True))
+
+    def test_index_follows_writes(self):
+        """Индекс обновляется при создании, правке и удалении поста."""
+        post = Post.objects.create(author=self.user, text='Новый кактус')
+        self.assertEqual(self.found('кактус'), {post.pk})
+        Post.objects.filter(pk=post.pk).update(text='Новый фикус')
+        self.assertFalse(self.found('кактус'))
+        self.assertEqual(self.found('фикус'), {post.pk})
+        post.delete()
+        self.assertFalse(self.found('фикус'))
+
+    def test_case_insensitive(self):
+        """Поиск не различает регистр."""
+        self.assertEqual(self.found('ЛОШАДКУ'), {self.post.pk})
+
+    def test_ranked_cursor_pages(self):
+        """Выдача упорядочена по рангу и листается курсором без повторов."""
+        response = self.guest_client.get(self.url, {'q': 'туман'})
+        first = response.context['page_obj']
+        self.assertEqual(first[0].text, 'Туман, туман, кругом туман')
+        ranks = [post.rank for post in first]
+        self.assertEqual(ranks, sorted(ranks))
+        query = '?q=%D1%82%D1%83%D0%BC%D0%B0%D0%BD'
+        self.assertContains(
+            response, f'{query}&amp;before={first.next_cursor}'
+        )
+        second = self.guest_client.get(
+            self.url, {'q': 'туман', 'before': first.next_cursor}
+        ).context['page_obj']
+        pages = [post.pk for post in first] + [post.pk for post in second]
+        self.assertEqual(len(pages), len(set(pages)))
+        self.assertEqual(set(pages), self.found('туман'))
+        self.assertFalse(second.has_next())
+
+    def test_snippet_is_escaped(self):
+        """Сниппет подсвечивает совпадение и экранирует текст поста."""
+        Post.objects.create(author=self.user, text='<script>жираф</script>')
+        response = self.guest_client.get(self.url, {'q': 'жираф'})
+        self.assertContains(response, '&lt;script&gt;<mark>жираф</mark>')
+        self.assertNotContains(response, '<script>жираф')
+
+    def test_query_syntax_is_literal(self):
+        """Операторы FTS5 во вводе не ломают поиск."""
+        for query in ('OR', '"', 'туман AND (', 'NEAR(туман', '*'):
+            with self.subTest(query=query):
+                response = self.guest_client.get(self.url, {'q': query})
+                self.assertEqual(response.status_code, 200)
+
+    def test_empty_query_skips_search(self):
+        """Пустой запрос показывает только форму."""
+        response = self.guest_client.get(self.url, {'q': '  '})
+        self.assertIsNone(response.context['page_obj'])
+
+    def test_rebuild_command(self):
+        """Команда rebuild_search восстанавливает пропавший индекс."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {search.TABLE}({search.TABLE}) "
+                f"VALUES ('delete-all')"
+            )
+        self.assertFalse(self.found('лошадку'))
+        call_command('rebuild_search', stdout=StringIO())
+        self.assertEqual(self.found('лошадку'), {self.post.pk})
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идет по тому же индексу."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        self.guest_client.force_login(admin)
+        response = self.guest_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'лошадку'}
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['cl'].result_list],
+            [self.post.pk],
+        )
@@ -0,0 +1,240 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import counters, shards
+from posts.models import Comment, Counters, Follow, Group, Post
+
+User = get_user_model()
+
+SHARDS = ['default', 'shard1', 'shard2']
+POST_COUNT = 10
+
+
+@override_settings(POST_SHARDS=SHARDS, PAGE_CACHE_TIMEOUT=0)
+class ShardTests(TransactionTestCase):
+    """
+    Три шарда: default и два файла SQLite.
+
+    Файлы мигрируются один раз, каждый тест начинает с их копии.
+    TransactionTestCase: у шардов свои соединения и свои транзакции.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        for alias in SHARDS[1:]:
+            connections.databases[alias] = {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': cls.path(alias),
+            }
+            call_command(
+                'migrate', database=alias, interactive=False, verbosity=0
+            )
+            connections[alias].close()
+            shutil.copy(cls.path(alias), cls.path(alias) + '.clean')
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in SHARDS[1:]:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def path(cls, alias):
+        return os.path.join(cls.directory, f'{alias}.sqlite3')
+
+    def setUp(self):
+        cache.clear()
+        for alias in SHARDS[1:]:
+            connections[alias].close()
+            shutil.copy(self.path(alias) + '.clean', self.path(alias))
+        # Подряд идущие id попадают в три разных шарда.
+        self.authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(3)
+        ]
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        base = timezone.now()
+        for number in range(25):
+            author = self.authors[number % 3]
+            # save(), а не create(): роутеру нужен сам пост.
+            post = Post(
+                author=author, text=f'Пост {number}',
+                group=self.group if number % 2 else None,
+            )
+            post.save()
+            # Пары постов с одной датой: порядок решает id.
+            shards.on(
+                Post.objects.filter(pk=post.pk), shards.shard_of_post(post.pk)
+            ).update(pub_date=base - timedelta(minutes=number // 2))
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def all_posts(self, **lookup):
+        """Ожидаемый порядок: как у одной таблицы без шардов."""
+        posts = [
+            post
+            for queryset in shards.each(Post.objects.filter(**lookup))
+            for post in queryset
+        ]
+        posts.sort(key=lambda post: (post.pub_date, post.pk), reverse=True)
+        return [post.pk for post in posts]
+
+    def walk(self, client, url):
+        """Id постов со всех страниц по курсорам ?before=."""
+        found, params = [], {}
+        while True:
+            page = client.get(url, params).context['page_obj']
+            found += [post.pk for post in page]
+            if not page.next_cursor:
+                return found
+            params = {'before': page.next_cursor}
+
+    def test_rows_live_on_author_shard(self):
+        """Посты, комментарии и счетчики лежат в шарде автора поста."""
+        self.assertEqual(len(shards.distinct()), 3)
+        for author in self.authors:
+            alias = shards.shard_for(author.pk)
+            posts = Post.objects.using(alias).filter(author=author)
+            self.assertEqual(posts.count(), len(self.all_posts(author=author)))
+            for post in posts:
+                self.assertEqual(shards.shard_of_post(post.pk), alias)
+            self.assertEqual(
+                Counters.objects.using(alias).get(user=author).posts_count,
+                posts.count(),
+            )
+        self.assertEqual(
+            {User.objects.using(alias).count() for alias in SHARDS}, {4}
+        )
+        post = Post.objects.using(
+            shards.shard_for(self.authors[2].pk)
+        ).filter(author=self.authors[2]).first()
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'Комментарий'},
+        )
+        alias = shards.shard_for(self.authors[2].pk)
+        self.assertTrue(
+            Comment.objects.using(alias).filter(post=post).exists()
+        )
+        self.assertEqual(
+            Post.objects.using(alias).get(pk=post.pk).comments_count, 1
+        )
+        reader = User.objects.get(pk=self.reader.pk)
+        reader_counters = counters.get_counters(reader)
+        self.assertEqual(reader_counters.comments_count, 1)
+        counters.recount()
+        reader_counters.refresh_from_db()
+        self.assertEqual(reader_counters.comments_count, 1)
+
+    def test_feeds_match_unsharded_order(self):
+        """Главная и группа по курсорам и ?page=N идут как без шардов."""
+        expected = self.all_posts()
+        self.assertEqual(
+            self.walk(self.guest_client, reverse('posts:index')), expected
+        )
+        response = self.guest_client.get(reverse('posts:index'), {'page': 2})
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            expected[POST_COUNT:POST_COUNT * 2],
+        )
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        self.assertEqual(
+            self.walk(self.guest_client, url),
+            self.all_posts(group=self.group),
+        )
+
+    def test_search_gathers_shards(self):
+        """Поиск сливает выдачу индексов всех шардов."""
+        found = []
+        params = {'q': 'Пост'}
+        while True:
+            page = self.guest_client.get(
+                reverse('posts:search'), params
+            ).context['page_obj']
+            found += [post.pk for post in page]
+            if not page.next_cursor:
+                break
+            params['before'] = page.next_cursor
+        self.assertCountEqual(found, self.all_posts())
+
+    def test_follow_feed_gathers_shards(self):
+        """Лента подписок собирает авторов из разных шардов."""
+        for author in self.authors[:2]:
+            self.reader_client.get(
+                reverse('posts:profile_follow',
+                        kwargs={'username': author.username})
+            )
+        self.assertEqual(
+            self.walk(self.reader_client, reverse('posts:follow_index')),
+            self.all_posts(author__in=self.authors[:2]),
+        )
+
+    def test_point_pages_read_author_shard(self):
+        """Пост, профиль и правка находят шард по id и автору."""
+        author = self.authors[1]
+        post_id = self.all_posts(author=author)[0]
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post_id})
+        )
+        self.assertEqual(response.context['post'].pk, post_id)
+        response = self.guest_client.get(
+            reverse('posts:profile', kwargs={'username': author.username})
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            self.all_posts(author=author)[:POST_COUNT],
+        )
+        self.assertEqual(
+            response.context['counters'].posts_count,
+            len(self.all_posts(author=author)),
+        )
+        author_client = Client()
+        author_client.force_login(author)
+        author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post_id}),
+            {'text': 'Исправленный пост'},
+        )
+        self.assertEqual(
+            Post.objects.using(shards.shard_of_post(post_id)).get(
+                pk=post_id
+            ).text,
+            'Исправленный пост',
+        )
+
+    def test_deleted_user_leaves_every_shard(self):
+        """Удаление пользователя уносит его копии и посты из шардов."""
+        author = self.authors[1]
+        Follow.objects.create(user=self.reader, author=author)
+        author_id, alias = author.pk, shards.shard_for(author.pk)
+        self.assertTrue(
+            Post.objects.using(alias).filter(author_id=author_id).exists()
+        )
+        author.delete()
+        for shard in SHARDS:
+            self.assertFalse(
+                User.objects.using(shard).filter(pk=author_id).exists()
+            )
+        self.assertFalse(
+            Post.objects.using(alias).filter(author_id=author_id).exists()
+        )
+        reader = User.objects.get(pk=self.reader.pk)
+        self.assertEqual(counters.get_counters(reader).following_count, 0)
@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.caching import shm
+from core.caching.shm import SharedMemoryCache
+
+SIZE = 64 * 1024
+OPTIONS = {'SIZE': SIZE, 'SLOTS': 512}
+
+
+def increment(path, times):
+    cache = SharedMemoryCache(path, {'OPTIONS': OPTIONS})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SharedMemoryCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache')
+        self.cache = self.open()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def open(self, **options):
+        return SharedMemoryCache(
+            self.path, {'OPTIONS': {**OPTIONS, **options}}
+        )
+
+    def test_basic_api(self):
+        """get/set/add/delete/touch/incr ведут себя как у LocMemCache."""
+        cache = self.cache
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual(cache.get('missing', 'default'), 'default')
+        cache.set('key', {'value': [1, 2]})
+        self.assertEqual(cache.get('key'), {'value': [1, 2]})
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 'value'))
+        self.assertTrue(cache.has_key('new'))
+        cache.set('counter', 1)
+        self.assertEqual(cache.incr('counter'), 2)
+        self.assertEqual(cache.decr('counter', 5), -3)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        cache.delete('a')
+        self.assertFalse(cache.has_key('a'))
+        self.assertTrue(cache.touch('b', 10))
+        self.assertFalse(cache.touch('a', 10))
+        cache.clear()
+        self.assertIsNone(cache.get('b'))
+
+    def test_timeouts(self):
+        """Записи истекают в срок, touch и incr его сохраняют и меняют."""
+        cache = self.cache
+        cache.set('short', 1, 10)
+        cache.set('forever', 1, None)
+        cache.set('touched', 1, 10)
+        cache.touch('touched', 100)
+        cache.incr('short')
+        later = time.time() + 50
+        with mock.patch('time.time', return_value=later):
+            self.assertIsNone(cache.get('short'))
+            self.assertEqual(cache.get('forever'), 1)
+            self.assertEqual(cache.get('touched'), 1)
+            self.assertTrue(cache.add('short', 'again'))
+
+    def test_shared_between_instances(self):
+        """Запись одного процесса видна другому, как и инвалидация."""
+        other = self.open()
+        self.cache.set('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_incr_is_atomic_across_processes(self):
+        """incr из нескольких процессов не теряет приращений."""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.path, 200))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 800)
+
+    def test_lru_eviction_respects_budget(self):
+        """Куча не выходит за бюджет, читаемые записи переживают вытеснение."""
+        cache = self.cache
+        cache.set('hot', 'hot')
+        for number in range(500):
+            cache.set(f'cold{number}', 'x' * 1000)
+            cache.get('hot')
+        self.assertEqual(cache.get('hot'), 'hot')
+        self.assertIsNone(cache.get('cold0'))
+        self.assertEqual(cache.get('cold499'), 'x' * 1000)
+        header = shm.HEADER.unpack_from(cache._map)
+        self.assertLessEqual(header[4], SIZE)
+
+    def test_oversized_value_is_not_stored(self):
+        """Значение крупнее доли кучи не кешируется и не держит старое."""
+        self.cache.set('big', 'small')
+        self.cache.set('big', 'x' * SIZE)
+        self.assertIsNone(self.cache.get('big'))
+        self.assertFalse(self.cache.add('big', 'x' * SIZE))
+
+    def test_geometry_change_reformats(self):
+        """Файл с другими размерами размечается заново."""
+        self.cache.set('key', 'value')
+        other = self.open(SLOTS=1024)
+        self.assertIsNone(other.get('key'))
+        other.set('key', 'new')
+        self.assertEqual(other.get('key'), 'new')
+
+    def test_reader_falls_back_to_lock(self):
+        """Пока seq нечетный, читатель дочитывает под замком писателя."""
+        self.cache.set('key', 'value')
+        shm.SEQ.pack_into(self.cache._map, shm.SEQ_OFFSET, 1)
+        with mock.patch('time.sleep'):
+            self.assertEqual(self.cache.get('key'), 'value')
+        self.cache.set('key', 'other')
+        seq = shm.SEQ.unpack_from(self.cache._map, shm.SEQ_OFFSET)[0]
+        self.assertEqual(seq % 2, 0)
+        self.assertEqual(self.cache.get('key'), 'other')
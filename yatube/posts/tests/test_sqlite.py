@@ -0,0 +1,31 @@
+from unittest import mock
+
+from django.core.signals import request_finished
+from django.db import connection
+from django.test import TestCase
+
+from core import sqlite
+
+
+class SQLiteTuningTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        """Новое соединение получает PRAGMA из SQLITE_PRAGMAS."""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma('temp_store'), 2)
+
+    def test_optimize_runs_once_per_interval(self):
+        """PRAGMA optimize после запроса не чаще раза в интервал."""
+        connection.ensure_connection()
+        with mock.patch.object(sqlite, 'OPTIMIZE_INTERVAL', 0), \
+                mock.patch.object(connection, 'in_atomic_block', False):
+            request_finished.send(sender=self.__class__)
+        first = connection.optimized_at
+        request_finished.send(sender=self.__class__)
+        self.assertEqual(connection.optimized_at, first)
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from core import storage, thumbnails
+from posts.models import ImageBlob, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.storage = Post._meta.get_field('image').storage
+
+    def create_post(self, name, content=SMALL_GIF):
+        return Post.objects.create(
+            author=self.user,
+            text=name,
+            image=SimpleUploadedFile(name, content, content_type='image/gif'),
+        )
+
+    def refs(self, name):
+        return ImageBlob.objects.get(name=name).refs
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковые загрузки ложатся в один файл под хешем."""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.GIF')
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            first.image.name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
+        )
+        self.assertEqual(self.refs(first.image.name), 2)
+        incoming = os.path.join(TEMP_MEDIA_ROOT, 'posts', '.incoming')
+        self.assertEqual(os.listdir(incoming), [])
+
+    def test_refs_follow_edit_and_delete(self):
+        """Ссылки переходят на новый файл при правке и уходят с постом."""
+        kept = self.create_post('kept.gif')
+        post = self.create_post('edited.gif')
+        old_name = post.image.name
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={
+                'text': 'Новая картинка',
+                'image': SimpleUploadedFile(
+                    'new.gif', OTHER_GIF, content_type='image/gif'
+                ),
+            },
+        )
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertEqual(self.refs(old_name), 1)
+        self.assertEqual(self.refs(post.image.name), 1)
+        post.delete()
+        kept.delete()
+        self.assertEqual(self.refs(old_name), 0)
+        self.assertEqual(self.refs(post.image.name), 0)
+
+    def test_dedupe_command_migrates_legacy_files(self):
+        """Команда сливает старые одинаковые файлы в один."""
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        for name in ('posts/a.gif', 'posts/b.gif'):
+            with open(os.path.join(TEMP_MEDIA_ROOT, name), 'wb') as file:
+                file.write(SMALL_GIF)
+        Post.objects.bulk_create(
+            Post(author=self.user, text=name, image=f'posts/{name}')
+            for name in ('a.gif', 'b.gif')
+        )
+        output = StringIO()
+        call_command('dedupe_media', stdout=output)
+        self.assertIn('2 изображений в 1 файлах', output.getvalue())
+        names = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(storage.is_blob_name(name))
+        self.assertEqual(self.refs(name), 2)
+        self.assertFalse(self.storage.exists('posts/a.gif'))
+        geometry, options = thumbnails.geometries()[0]
+        self.assertIsNotNone(thumbnails.cached_thumbnail(
+            Post.objects.first().image, geometry, **options
+        ))
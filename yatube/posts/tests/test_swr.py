@@ -0,0 +1,141 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from core.caching import swr
+from core.caching.tags import invalidate, tag_versions
+from posts.models import Post
+
+User = get_user_model()
+
+
+class StaleWhileRevalidateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def produce(self):
+        self.calls += 1
+        return self.calls
+
+    def get(self, **kwargs):
+        return swr.get_or_set('key', self.produce, 60, tags=['t'], **kwargs)
+
+    def test_fresh_value_is_reused(self):
+        """Свежее значение не пересчитывается."""
+        self.assertEqual(self.get(), 1)
+        self.assertEqual(self.get(), 1)
+
+    def test_invalidated_value_is_recomputed(self):
+        """Смена версии тега делает значение устаревшим."""
+        self.get()
+        invalidate('t')
+        self.assertEqual(self.get(), 2)
+
+    def test_expired_value_is_recomputed(self):
+        """После мягкого срока значение пересчитывается."""
+        self.get()
+        with mock.patch('time.time', return_value=time.time() + 61):
+            self.assertEqual(self.get(), 2)
+
+    def test_stale_value_served_while_locked(self):
+        """Пока другой запрос пересчитывает, отдается старое значение."""
+        self.get()
+        invalidate('t')
+        cache.add(f'{swr.LOCK_PREFIX}key', 1)
+        request = mock.Mock(spec=[])
+        self.assertEqual(self.get(request=request), 1)
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(request.page_cache_stale)
+
+    def test_missing_value_waits_for_lock_holder(self):
+        """Без значения запрос ждет чужой пересчет, а не считает сам."""
+        cache.add(f'{swr.LOCK_PREFIX}key', 1)
+
+        def finish(seconds):
+            swr._store('key', 'чужое', tag_versions(['t']), 60, 0)
+
+        with mock.patch('time.sleep', side_effect=finish):
+            self.assertEqual(self.get(), 'чужое')
+        self.assertEqual(self.calls, 0)
+
+    def test_gives_up_waiting(self):
+        """Не дождавшись пересчета, запрос считает сам."""
+        cache.add(f'{swr.LOCK_PREFIX}key', 1)
+        with mock.patch.object(swr, 'WAIT_TIMEOUT', 0):
+            self.assertEqual(self.get(), 1)
+
+    def test_foreign_lock_is_kept(self):
+        """Истекший замок, взятый другим запросом, не снимается."""
+        lock = f'{swr.LOCK_PREFIX}key'
+
+        def produce():
+            cache.delete(lock)
+            cache.add(lock, 'чужой')
+            return 'значение'
+
+        swr.get_or_set('key', produce, 60)
+        self.assertEqual(cache.get(lock), 'чужой')
+        self.assertEqual(swr.get_or_set('other', self.produce, 60), 1)
+        self.assertIsNone(cache.get(f'{swr.LOCK_PREFIX}other'))
+
+    def test_jitter_shortens_timeouts(self):
+        """Сроки размываются вниз, но не больше CACHE_JITTER."""
+        timeouts = {swr.jitter(100) for _ in range(20)}
+        self.assertGreater(len(timeouts), 1)
+        self.assertTrue(all(90 <= timeout <= 100 for timeout in timeouts))
+
+    def test_cache_template_tag(self):
+        """{% cache %} отдает закешированный фрагмент до истечения срока."""
+        template = Template(
+            '{% load cache_tags %}{% cache 20 frag key %}{{ value }}'
+            '{% endcache %}'
+        )
+        self.assertEqual(
+            template.render(Context({'key': 1, 'value': 'old'})), 'old'
+        )
+        self.assertEqual(
+            template.render(Context({'key': 1, 'value': 'new'})), 'old'
+        )
+        self.assertEqual(
+            template.render(Context({'key': 2, 'value': 'new'})), 'new'
+        )
+
+
+class StaleFragmentPageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Первый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_stale_page_is_not_cached(self):
+        """Страницу с устаревшим фрагментом не кешируют и не помечают."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Post.objects.create(author=self.user, text='Второй пост')
+        with mock.patch.object(swr, '_lock', return_value=None):
+            response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Второй пост')
+        self.assertNotIn('ETag', response)
+        response = self.guest_client.get(url)
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'Второй пост')
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_search_results_are_cached(self):
+        """Повторный поиск берет выдачу из кеша, а не из базы."""
+        url = reverse('posts:search')
+        self.guest_client.get(url, {'q': 'пост'})
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, {'q': 'пост'})
+        self.assertContains(response, 'Первый')
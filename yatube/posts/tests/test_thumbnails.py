@@ -0,0 +1,135 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import thumbnails
+from core.caching.tags import invalidate
+from posts.caching import FEED_INDEX
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def ready(self, post):
+        geometry, options = thumbnails.geometries()[0]
+        return thumbnails.cached_thumbnail(post.image, geometry, **options)
+
+    def run_on_commit(self):
+        callbacks, connection.run_on_commit = connection.run_on_commit, []
+        for _, callback in callbacks:
+            callback()
+
+    def test_upload_schedules_thumbnails(self):
+        """Миниатюры строятся после коммита, а не во время рендера."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile(
+                    'upload.gif', SMALL_GIF, content_type='image/gif'
+                ),
+            },
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertIsNone(self.ready(post))
+        self.run_on_commit()
+        self.assertIsNotNone(self.ready(post))
+
+    def test_edit_without_new_image_schedules_nothing(self):
+        """Правка текста не ставит миниатюры в очередь."""
+        post = Post.objects.create(author=self.user, text='Без картинки')
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Новый текст'},
+        )
+        with mock.patch('core.thumbnails.submit') as submit:
+            self.run_on_commit()
+        submit.assert_not_called()
+
+    def test_template_falls_back_to_original(self):
+        """Пока миниатюры нет, страница показывает оригинал."""
+        post = Post.objects.create(
+            author=self.user,
+            text='Старый пост',
+            image=SimpleUploadedFile(
+                'old.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        response = self.authorized_client.get(url)
+        self.assertContains(response, f'src="{post.image.url}"')
+        self.assertIsNone(self.ready(post))
+        call_command('generate_thumbnails', stdout=StringIO())
+        thumbnail = self.ready(post)
+        self.assertIsNotNone(thumbnail)
+        response = self.authorized_client.get(url)
+        self.assertContains(response, f'src="{thumbnail.url}"')
+        self.assertContains(response, f'width="{thumbnail.width}"')
+
+    def test_page_resolves_thumbnails_in_one_batch(self):
+        """Миниатюры страницы ищутся одним запросом, сколько бы их ни было."""
+        uploaded = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'batch.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        )
+        thumbnails.generate(uploaded.image)
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}', image=f'posts/{i}.gif')
+            for i in range(9)
+        )
+        url = reverse('posts:index')
+        cache.clear()
+        # Второй проход: хранилище ключей уже в кеше, а фрагмент ленты
+        # сброшен, чтобы страница отрисовалась заново.
+        for expected in (1, 0):
+            invalidate(FEED_INDEX)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.authorized_client.get(url, {'page': 1})
+            lookups = [
+                query for query in queries
+                if 'thumbnail_kvstore' in query['sql']
+            ]
+            self.assertEqual(len(lookups), expected, lookups)
+            self.assertContains(response, 'card-img', count=10)
@@ -0,0 +1,174 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.caching import tiered
+from core.caching.tiered import TieredCache
+from posts.models import Group
+
+User = get_user_model()
+
+
+class TieredCacheTests(SimpleTestCase):
+    """Два экземпляра над общим L2 изображают два воркера."""
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.worker = self.open()
+        self.other = self.open()
+
+    def open(self):
+        return TieredCache('shared', {'OPTIONS': {'MAX_DELAY': 1}})
+
+    def later(self, seconds=2):
+        return mock.patch(
+            'time.monotonic', return_value=time.monotonic() + seconds
+        )
+
+    def test_l1_serves_repeated_reads(self):
+        """Повторное чтение не идет в L2."""
+        caches['shared'].set('key', 'value')
+        self.assertEqual(self.worker.get('key'), 'value')
+        with mock.patch.object(caches['shared'], 'get') as l2_get:
+            self.assertEqual(self.worker.get('key'), 'value')
+        l2_get.assert_not_called()
+
+    def test_l1_keeps_a_copy_of_written_value(self):
+        """Изменение записанного объекта не портит L1."""
+        value = {'items': [1]}
+        self.worker.set('key', value)
+        value['items'].append(2)
+        self.assertEqual(self.worker.get('key'), {'items': [1]})
+
+    def test_l1_hit_does_not_unpickle(self):
+        """L1 отдает сам объект, без распаковки."""
+        self.worker.set('key', {'items': [1]})
+        self.assertIs(self.worker.get('key'), self.worker.get('key'))
+
+    def test_deletes_and_incr_reach_other_workers_within_delay(self):
+        """Удаление и incr соседа видны не позже MAX_DELAY."""
+        self.worker.set('key', 'old')
+        self.worker.set('tag', 1)
+        self.assertEqual(self.other.get('key'), 'old')
+        self.assertEqual(self.other.get('tag'), 1)
+        self.worker.delete('key')
+        self.worker.incr('tag')
+        self.assertEqual(self.other.get('key'), 'old')
+        with self.later():
+            self.assertIsNone(self.other.get('key'))
+            self.assertEqual(self.other.get('tag'), 2)
+
+    def test_set_is_not_published(self):
+        """set и add не пишут в журнал; чужой set виден через reread."""
+        self.worker.set('key', 'old')
+        self.assertEqual(self.other.get('key'), 'old')
+        generation = caches['shared'].get(tiered.GEN_KEY)
+        for number in range(tiered.LOG_SCAN + 1):
+            self.worker.set('key', f'new{number}')
+            self.worker.add(f'lock{number}', 1)
+        self.assertEqual(caches['shared'].get(tiered.GEN_KEY), generation)
+        self.assertEqual(self.other.get('key'), 'old')
+        self.assertEqual(
+            tiered.reread(self.other, 'key'), f'new{tiered.LOG_SCAN}'
+        )
+        self.assertEqual(self.other.get('key'), f'new{tiered.LOG_SCAN}')
+
+    def test_own_writes_are_immediate(self):
+        """Свои записи видны сразу, без ожидания сверки."""
+        self.worker.set('key', 'old')
+        self.worker.set('key', 'new')
+        self.assertEqual(self.worker.get('key'), 'new')
+        self.worker.delete('key')
+        self.assertIsNone(self.worker.get('key'))
+
+    def test_lost_log_flushes_l1(self):
+        """Если журнал не дочитать, L1 очищается целиком."""
+        self.worker.set('key', 'old')
+        self.other.get('key')
+        caches['shared'].set('key', 'new')
+        for number in range(tiered.LOG_SCAN + 1):
+            self.worker.delete(f'other{number}')
+        with self.later():
+            self.assertEqual(self.other.get('key'), 'new')
+
+    def test_clear_reaches_other_workers(self):
+        """Очистка L2 сбрасывает и чужие L1."""
+        self.worker.set('key', 'value')
+        self.other.get('key')
+        self.worker.clear()
+        with self.later():
+            self.assertIsNone(self.other.get('key'))
+
+    def test_add_is_decided_by_l2(self):
+        """Замок, взятый соседом, не берется и по устаревшему L1."""
+        self.assertTrue(self.worker.add('lock', 1))
+        self.assertFalse(self.other.add('lock', 1))
+        self.worker.delete('lock')
+        self.assertTrue(self.other.add('lock', 1))
+
+    def test_stats_are_shared(self):
+        """Счетчики уровней складываются со всех воркеров."""
+        self.worker.set('key', 'value')
+        self.worker.get('key')
+        self.other.get('key')
+        self.other.get('key')
+        self.other.get('missing')
+        self.worker.stats()
+        self.assertEqual(self.other.stats(), {
+            'l1_hits': 2, 'l2_hits': 1, 'misses': 1, 'l1_flushes': 0,
+        })
+        self.other.reset_stats()
+        self.assertEqual(self.worker.stats()['l1_hits'], 0)
+
+
+class CachedLookupTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        cls.url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_group_is_cached_and_session_user_is_not(self):
+        """Группа страницы берется из кеша, пользователь сессии - из базы."""
+        self.authorized_client.get(self.url)
+        # Другой адрес: страница не из полностраничного кеша.
+        with CaptureQueriesContext(connection) as context:
+            self.authorized_client.get(self.url, {'page': 1})
+        sql = ' '.join(query['sql'] for query in context.captured_queries)
+        self.assertNotIn('"posts_group"."slug" =', sql)
+        self.assertIn('"auth_user"."id" =', sql)
+
+    def test_deactivated_user_is_logged_out(self):
+        """update() в обход сигналов тоже сразу закрывает сессию."""
+        self.authorized_client.get(self.url)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertContains(
+            self.authorized_client.get(self.url, {'page': 1}), 'Войти'
+        )
+
+    def test_changes_reach_cached_objects(self):
+        """Правка группы и пользователя не оставляет старых копий."""
+        self.authorized_client.get(self.url)
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertContains(
+            self.authorized_client.get(self.url), 'Новое название'
+        )
+        self.user.is_active = False
+        self.user.save()
+        response = self.authorized_client.get(self.url)
+        self.assertContains(response, 'Войти')
@@ -0,0 +1,184 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Post, Follow, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.other_author = User.objects.create_user(username='other')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def feed(self):
+        return list(
+            TimelineEntry.objects.filter(user=self.follower).values_list(
+                'post_id', flat=True
+            )
+        )
+
+    def plain_feed(self):
+        return list(
+            Post.objects.filter(
+                author__following__user=self.follower
+            ).order_by('-pub_date', '-pk').values_list('pk', flat=True)
+        )
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Проверяем что подписка дополняет ленту, а отписка чистит."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertEqual(self.feed(), [self.old_post.pk])
+        Follow.objects.filter(user=self.follower, author=self.author).delete()
+        self.assertEqual(self.feed(), [])
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Проверяем что новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=self.follower, author=self.other_author)
+        Post.objects.create(author=self.other_author, text='Новый')
+        Post.objects.create(author=self.author, text='Еще новее')
+        self.assertEqual(self.feed(), self.plain_feed())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            self.plain_feed(),
+        )
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_timeline_is_capped(self):
+        """Проверяем что лента обрезается до TIMELINE_LENGTH."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}') for i in range(5)
+        )
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertEqual(self.feed(), self.plain_feed()[:3])
+        Post.objects.create(author=self.author, text='Свежий')
+        timeline.trim(self.follower.pk)
+        self.assertEqual(self.feed(), self.plain_feed()[:3])
+
+    def feed_page(self):
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        return [post.pk for post in response.context['page_obj']]
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_unfollow_after_trim(self):
+        """Проверяем что после отписки лента дочитывает старые посты."""
+        for author in (self.author, self.other_author):
+            Post.objects.bulk_create(
+                Post(author=author, text=f'Пост {i}') for i in range(5)
+            )
+            Follow.objects.create(user=self.follower, author=author)
+        Follow.objects.filter(
+            user=self.follower, author=self.other_author
+        ).delete()
+        self.assertEqual(self.feed_page(), self.plain_feed())
+        self.assertEqual(len(self.plain_feed()), 6)
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_delete_after_trim(self):
+        """Проверяем что после удаления поста лента не теряет старые."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}') for i in range(5)
+        )
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.get(pk=self.plain_feed()[0]).delete()
+        self.assertEqual(self.feed_page(), self.plain_feed())
+        self.assertEqual(len(self.plain_feed()), 5)
+
+    def test_rebuild_command(self):
+        """Проверяем что команда пересобирает ленты из подписок."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed(), self.plain_feed())
+
+
+@override_settings(FEED_PULL_THRESHOLD=1, TIMELINE_LENGTH=4)
+class HybridFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.fan = User.objects.create_user(username='fan')
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+        self.follow_index = reverse('posts:follow_index')
+        for user in (self.follower, self.fan):
+            Follow.objects.create(user=user, author=self.star)
+        Follow.objects.create(user=self.follower, author=self.author)
+        for i in range(12):
+            Post.objects.create(
+                author=self.star if i % 2 else self.author,
+                text=f'Пост {i}',
+            )
+
+    def plain_feed(self):
+        return list(
+            Post.objects.filter(
+                author__following__user=self.follower
+            ).order_by('-pub_date', '-pk').values_list('pk', flat=True)
+        )
+
+    def test_pull_author_is_not_pushed(self):
+        """Проверяем что посты «тянущего» автора не раскладываются."""
+        self.assertFalse(
+            TimelineEntry.objects.filter(author=self.star).exists()
+        )
+
+    def test_cursor_feed_matches_join(self):
+        """Проверяем что гибридная лента совпадает с JOIN по курсорам."""
+        page_obj = self.follower_client.get(
+            self.follow_index
+        ).context['page_obj']
+        posts = [post.pk for post in page_obj]
+        while page_obj.has_next():
+            page_obj = self.follower_client.get(
+                self.follow_index, {'before': page_obj.next_cursor}
+            ).context['page_obj']
+            posts += [post.pk for post in page_obj]
+        self.assertEqual(posts, self.plain_feed())
+
+    def test_page_feed_matches_join(self):
+        """Проверяем что гибридная лента совпадает с JOIN по ?page=N."""
+        expected = self.plain_feed()
+        response = self.follower_client.get(self.follow_index, {'page': 2})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, len(expected))
+        self.assertEqual([post.pk for post in page_obj], expected[10:])
+
+    def test_author_returns_to_push(self):
+        """Проверяем что автор без подписчиков снова раскладывается."""
+        for _ in range(2):
+            # Колебание у порога не раскладывает старые посты заново.
+            Follow.objects.filter(user=self.fan, author=self.star).delete()
+            self.assertFalse(
+                TimelineEntry.objects.filter(author=self.star).exists()
+            )
+            self.test_cursor_feed_matches_join()
+            Follow.objects.create(user=self.fan, author=self.star)
+        Follow.objects.filter(user=self.fan, author=self.star).delete()
+        post = Post.objects.create(author=self.star, text='Новый')
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.follower, post=post
+            ).exists()
+        )
+        self.test_cursor_feed_matches_join()
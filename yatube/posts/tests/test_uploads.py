@@ -0,0 +1,180 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from io import BytesIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+# Пик памяти процесса (МБ) при обработке изображения. VmHWM, в
+# отличие от ru_maxrss, не наследуется от тестового процесса через exec.
+MEASURE_SCRIPT = '''
+import sys
+from PIL import Image
+from posts import imaging
+
+def peak():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+
+with open(sys.argv[1], 'rb') as file:
+    before = peak()
+    if sys.argv[2] == 'full':
+        Image.open(file).load()
+    else:
+        imaging.prepare_upload(file, 1920, 100_000_000, 100_000_000)
+    print(peak() - before)
+'''
+
+
+def make_gif(frames, size=(10, 10)):
+    images = [
+        Image.new('P', size, color) for color in range(frames)
+    ]
+    buffer = BytesIO()
+    images[0].save(
+        buffer, 'GIF', save_all=True, append_images=images[1:], duration=50
+    )
+    return buffer.getvalue()
+
+
+def make_png(width, height):
+    buffer = BytesIO()
+    Image.new('RGBA', (width, height), (10, 120, 200, 100)).save(
+        buffer, 'PNG'
+    )
+    return buffer.getvalue()
+
+
+def make_jpeg(width, height, orientation=None):
+    image = Image.new('RGB', (width, height), (10, 120, 200))
+    options = {}
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        options['exif'] = exif.tobytes()
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', **options)
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0, UPLOAD_IMAGE_MAX_SIDE=400
+)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def upload(self, name, content, content_type='image/jpeg'):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': name,
+                'image': SimpleUploadedFile(name, content, content_type),
+            },
+        )
+
+    def test_large_upload_is_downscaled_and_rotated(self):
+        """Крупный снимок уменьшается, поворачивается и теряет EXIF."""
+        # Ориентация 6: снимок повернут, на экране он портретный.
+        self.upload('photo.jpg', make_jpeg(1200, 800, orientation=6))
+        post = Post.objects.get(text='photo.jpg')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (267, 400))
+            self.assertNotIn('exif', image.info)
+
+    def test_small_upload_is_kept_as_is(self):
+        """Небольшое изображение без EXIF сохраняется байт в байт."""
+        content = make_jpeg(300, 200)
+        self.upload('small.jpg', content)
+        post = Post.objects.get(text='small.jpg')
+        with open(post.image.path, 'rb') as file:
+            self.assertEqual(file.read(), content)
+
+    @override_settings(UPLOAD_IMAGE_MAX_PIXELS=100)
+    def test_decompression_bomb_is_rejected(self):
+        """Изображение больше UPLOAD_IMAGE_MAX_PIXELS не принимается."""
+        response = self.upload('bomb.jpg', make_jpeg(300, 200))
+        self.assertFalse(Post.objects.filter(text='bomb.jpg').exists())
+        self.assertTrue(response.context['form'].has_error('image'))
+
+    @override_settings(UPLOAD_IMAGE_MAX_DECODED_PIXELS=100)
+    def test_png_has_lower_pixel_limit(self):
+        """PNG декодируется целиком, и предел для него ниже, чем у JPEG."""
+        response = self.upload('big.png', make_png(300, 200), 'image/png')
+        self.assertFalse(Post.objects.filter(text='big.png').exists())
+        self.assertTrue(response.context['form'].has_error('image'))
+        self.upload('big.jpg', make_jpeg(300, 200))
+        self.assertTrue(Post.objects.filter(text='big.jpg').exists())
+
+    def test_small_animation_is_kept(self):
+        """Анимированный GIF не больше предела сохраняется со всеми кадрами."""
+        self.upload('small.gif', make_gif(3), 'image/gif')
+        post = Post.objects.get(text='small.gif')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.n_frames, 3)
+
+    def test_large_animation_is_rejected(self):
+        """Анимацию крупнее предела не уменьшаем до одного кадра."""
+        response = self.upload(
+            'large.gif', make_gif(3, (500, 10)), 'image/gif'
+        )
+        self.assertFalse(Post.objects.filter(text='large.gif').exists())
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'animation_too_large'
+        ))
+
+    def measure(self, path, mode):
+        output = subprocess.run(
+            [sys.executable, '-c', MEASURE_SCRIPT, path, mode],
+            cwd=settings.BASE_DIR, capture_output=True, check=True,
+            text=True,
+        ).stdout
+        return float(output)
+
+    @skipUnless(os.path.exists('/proc/self/status'), 'нужен procfs')
+    def test_downscaling_bounds_peak_memory(self):
+        """Уменьшение не декодирует оригинал целиком."""
+        path = os.path.join(TEMP_MEDIA_ROOT, 'huge.jpg')
+        Image.new('RGB', (8000, 8000), (10, 120, 200)).save(path, 'JPEG')
+        full = self.measure(path, 'full')
+        prepared = self.measure(path, 'prepare')
+        self.assertLess(prepared, full / 2)
+
+    @skipUnless(os.path.exists('/proc/self/status'), 'нужен procfs')
+    def test_png_peak_memory_within_limit(self):
+        """PNG на пределе пикселей обходится не больше 10 байт на пиксель."""
+        pixels = settings.UPLOAD_IMAGE_MAX_DECODED_PIXELS
+        width = int((pixels * 4 / 3) ** 0.5)
+        height = pixels // width
+        path = os.path.join(TEMP_MEDIA_ROOT, 'huge.png')
+        with open(path, 'wb') as file:
+            file.write(make_png(width, height))
+        prepared = self.measure(path, 'prepare')
+        self.assertLess(prepared, pixels * 10 / 2 ** 20)
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import imaging, variants
+from posts.models import ImageVariant, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_png(width=1200, height=400, color=(200, 50, 50, 128)):
+    buffer = BytesIO()
+    Image.new('RGBA', (width, height), color).save(
+        buffer, 'PNG'
+    )
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    IMAGE_VARIANT_WIDTHS=(320, 640, 1600),
+)
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self, name='photo.png', color=(200, 50, 50, 128)):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name, make_png(color=color), content_type='image/png'
+            ),
+        )
+
+    def test_encode_never_upscales(self):
+        """Варианты не шире оригинала и сохраняют пропорции."""
+        post = self.create_post()
+        renditions = imaging.encode(*variants.encode_job(post.image.name))
+        self.assertEqual(
+            sorted({width for _, width, _, _ in renditions}),
+            [320, 640, 1200],
+        )
+        for fmt, width, height, name in renditions:
+            with self.subTest(name=name):
+                self.assertIn(fmt, variants.formats())
+                self.assertEqual(height, round(width / 3))
+                with Image.open(os.path.join(TEMP_MEDIA_ROOT, name)) as im:
+                    self.assertEqual(im.size, (width, height))
+
+    def test_upload_schedules_variants(self):
+        """После загрузки варианты строятся и попадают в <picture>."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Новый пост',
+                'image': SimpleUploadedFile(
+                    'upload.png', make_png(), content_type='image/png'
+                ),
+            },
+        )
+        post = Post.objects.get(text='Новый пост')
+        self.assertFalse(ImageVariant.objects.filter(source=post.image.name))
+        callbacks, connection.run_on_commit = connection.run_on_commit, []
+        for _, callback in callbacks:
+            callback()
+        self.assertEqual(
+            ImageVariant.objects.filter(source=post.image.name).count(),
+            3 * len(variants.formats()),
+        )
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, '<source type="image/jpeg" srcset="')
+        self.assertContains(response, '/640.jpg 640w')
+
+    def test_backfill_command_resumes(self):
+        """Команда строит недостающие варианты и пропускает готовые."""
+        done = self.create_post('done.png')
+        variants.submit(done.image.name)
+        self.create_post('pending.png', color=(50, 200, 50, 128))
+        output = StringIO()
+        call_command('generate_variants', '--workers=1', stdout=output)
+        self.assertIn('Изображений к обработке: 1', output.getvalue())
+        self.assertEqual(
+            ImageVariant.objects.values('source').distinct().count(), 2
+        )
+        output = StringIO()
+        call_command('generate_variants', stdout=output)
+        self.assertIn('Изображений к обработке: 0', output.getvalue())
@@ -38,6 +38,7 @@ class PostViewsTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -210,6 +211,7 @@ class PostViewsFollowTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -303,6 +305,7 @@ class PostViewsFollowIndexTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.follower_client = Client()
         self.follower_client.force_login(self.follower)
         self.post_follow = reverse(
@@ -385,6 +388,7 @@ class PaginatorViewsTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
         self.other_client = Client()
@@ -0,0 +1,219 @@
+"""
+Ленты подписок, собранные при записи (fan-out-on-write).
+
+Когда автор публикует пост, его id раскладывается по лентам всех
+подписчиков. Страница «Избранные авторы» после этого читается одним
+проходом по индексу (user, -pub_date, -post) без JOIN через Follow.
+
+Посты авторов, у которых подписчиков больше FEED_PULL_THRESHOLD, не
+раскладываются: лента подмешивает их при чтении (см. feeds.py).
+
+Записи ленты лежат в шарде автора поста, рядом с постом (shards.py):
+у читателя своя лента в каждом шарде.
+
+Лента полна только выше своей границы (TimelineHorizon): все посты
+подписок с ключом (pub_date, id) больше границы в ней есть, а то, что
+на границе и ниже, лента подписок читает через Follow. Граница только
+поднимается: при обрезке (trim), при подписке на автора, у которого
+постов больше TIMELINE_LENGTH (backfill), и при возврате «тянущего»
+автора (restore_author). Отписка и удаление поста записи лишь убирают,
+полноты выше границы это не нарушает.
+"""
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F, Q
+from django.db.models.query import QuerySet
+
+from . import shards
+from .models import (
+    Counters, Follow, Post, TimelineEntry, TimelineHorizon, User,
+)
+
+Key = Tuple[datetime, int]
+
+BATCH_SIZE = 500
+
+
+def timeline_length() -> int:
+    return getattr(settings, 'TIMELINE_LENGTH', 1000)
+
+
+def pull_threshold() -> int:
+    return getattr(settings, 'FEED_PULL_THRESHOLD', 1000)
+
+
+def followers_count(author_id: int) -> int:
+    """Число подписчиков из денормализованного счетчика."""
+    count = shards.on(
+        Counters.objects.filter(user_id=author_id),
+        shards.shard_for(author_id),
+    ).values_list('followers_count', flat=True).first()
+    return count or 0
+
+
+def is_pull_author(author_id: int) -> bool:
+    """Слишком много подписчиков, чтобы раскладывать посты при записи."""
+    return followers_count(author_id) > pull_threshold()
+
+
+def _entries(author_id: int) -> QuerySet:
+    """Записи лент в шарде автора."""
+    return shards.on(
+        TimelineEntry.objects.all(), shards.shard_for(author_id)
+    )
+
+
+def _entry(user_id: int, post: Post) -> TimelineEntry:
+    return TimelineEntry(
+        user_id=user_id,
+        post_id=post.pk,
+        author_id=post.author_id,
+        pub_date=post.pub_date,
+    )
+
+
+def horizon(user_id: int, alias: str = DEFAULT_DB_ALIAS) -> Optional[Key]:
+    """Граница ленты в шарде alias; None - лента полна."""
+    return shards.on(
+        TimelineHorizon.objects.filter(user_id=user_id), alias
+    ).values_list('pub_date', 'post_id').first()
+
+
+def raise_horizon(user_ids: Iterable[int], key: Key, alias: str) -> None:
+    """Поднимает границу лент пользователей user_ids до key."""
+    pub_date, post_id = key
+    horizons = shards.on(TimelineHorizon.objects.all(), alias)
+    horizons.filter(user_id__in=user_ids).filter(
+        Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, post_id__lt=post_id)
+    ).update(pub_date=pub_date, post_id=post_id)
+    missing = shards.on(User.objects.filter(pk__in=user_ids), alias).filter(
+        timeline_horizon__isnull=True
+    ).values_list('pk', flat=True)
+    horizons.bulk_create(
+        (TimelineHorizon(user_id=user_id, pub_date=pub_date, post_id=post_id)
+         for user_id in missing.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def push_post(post: Post) -> None:
+    """Кладет новый пост в ленты всех подписчиков автора."""
+    if is_pull_author(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _entries(post.author_id).bulk_create(
+        (_entry(user_id, post) for user_id in followers.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user: User, author: User) -> None:
+    """Добавляет в ленту подписчика последние посты нового автора."""
+    posts = list(author.posts.order_by('-pub_date', '-pk').only(
+        'pk', 'pub_date', 'author_id'
+    )[:timeline_length() + 1])
+    if len(posts) > timeline_length():
+        # Более старые посты автора в ленту не лягут.
+        edge = posts.pop()
+        raise_horizon(
+            [user.pk], (edge.pub_date, edge.pk), shards.shard_for(author.pk)
+        )
+    _entries(author.pk).bulk_create(
+        (_entry(user.pk, post) for post in posts),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim(user.pk)
+
+
+def restore_author(author: User) -> None:
+    """
+    Возвращает в ленты автора, который перестал быть «тянущим».
+
+    Пока у автора было много подписчиков, его посты в ленты не
+    попадали. Вместо раскладки по всем подписчикам их граница
+    поднимается до его последнего поста: более старые посты лента
+    читает через Follow. Новые посты автора снова раскладываются.
+    Это несколько запросов, сколько бы ни было подписчиков.
+    """
+    alias = shards.shard_for(author.pk)
+    latest = shards.on(
+        Post.objects.filter(author_id=author.pk), alias
+    ).order_by('-pub_date', '-pk').values_list('pub_date', 'pk').first()
+    if latest is None:
+        return
+    followers = shards.on(
+        Follow.objects.filter(author_id=author.pk), alias
+    ).values_list('user_id', flat=True)
+    raise_horizon(followers, latest, alias)
+
+
+def prune(user: User, author: User) -> None:
+    """Убирает из ленты посты автора, от которого отписались."""
+    _entries(author.pk).filter(user=user, author=author).delete()
+
+
+def trim(user_id: int) -> None:
+    """Обрезает ленту до TIMELINE_LENGTH самых свежих записей."""
+    # В каждом шарде: лента из них сливается и так длиннее.
+    for alias in shards.distinct():
+        entries = shards.on(
+            TimelineEntry.objects.filter(user_id=user_id), alias
+        )
+        boundary = entries.order_by(
+            '-pub_date', '-post_id'
+        ).values_list('pub_date', 'post_id')[timeline_length():][:1]
+        for pub_date, post_id in boundary:
+            entries.filter(
+                pub_date__lte=pub_date,
+            ).exclude(
+                pub_date=pub_date,
+                post_id__gt=post_id,
+            ).delete()
+            raise_horizon([user_id], (pub_date, post_id), alias)
+
+
+def rebuild(user_ids: Iterable[int]) -> int:
+    """Пересобирает ленты заново из подписок, возвращает число записей."""
+    created = 0
+    for user_id in user_ids:
+        for alias in shards.distinct():
+            entries = shards.on(TimelineEntry.objects.all(), alias)
+            entries.filter(user_id=user_id).delete()
+            shards.on(TimelineHorizon.objects.filter(
+                user_id=user_id
+            ), alias).delete()
+            posts = list(shards.on(Post.objects.filter(
+                author__following__user_id=user_id
+            ), alias).order_by('-pub_date', '-pk').only(
+                'pk', 'pub_date', 'author_id'
+            )[:timeline_length() + 1])
+            if len(posts) > timeline_length():
+                edge = posts.pop()
+                raise_horizon([user_id], (edge.pub_date, edge.pk), alias)
+            created += len(entries.bulk_create(
+                (_entry(user_id, post) for post in posts),
+                batch_size=BATCH_SIZE,
+            ))
+    return created
+
+
+def timeline_posts(user: User, alias: str = DEFAULT_DB_ALIAS) -> QuerySet:
+    """
+    Посты ленты подписок пользователя.
+
+    Ключ сортировки берется из самой ленты (feed_date, feed_id), чтобы
+    SQLite шел по ее индексу и не сортировал результат.
+    """
+    posts = shards.on(Post.objects.all(), alias)
+    return posts.filter(timeline_entries__user=user).annotate(
+        feed_date=F('timeline_entries__pub_date'),
+        feed_id=F('timeline_entries__post'),
+    ).select_related('author', 'group')
@@ -0,0 +1,168 @@
+"""
+Адаптивные варианты изображений постов (srcset и WebP).
+
+Каждое изображение кодируется в несколько ширин IMAGE_VARIANT_WIDTHS и
+во все форматы IMAGE_VARIANT_FORMATS, которые умеет Pillow. Кодирование
+идет в пуле процессов, а веб-процесс только ставит задачу и записывает
+готовые варианты в ImageVariant. Шаблоны получают <source> для
+<picture> одним запросом на страницу (attach_variants).
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from collections import defaultdict, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils.functional import SimpleLazyObject
+
+from core.caching.tags import invalidate_on_commit
+from core.thumbnails import in_memory_db
+
+from . import imaging
+from .caching import image_tags
+from .models import ImageVariant
+
+logger = logging.getLogger('yatube.variants')
+
+DIRECTORY = 'variants'
+MIME_TYPES = {'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+
+Source = namedtuple('Source', 'type srcset')
+
+_executor: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def widths() -> tuple:
+    return tuple(getattr(settings, 'IMAGE_VARIANT_WIDTHS', (320, 640, 960)))
+
+
+def formats() -> tuple:
+    return imaging.available_formats(
+        getattr(settings, 'IMAGE_VARIANT_FORMATS', ('webp', 'jpeg'))
+    )
+
+
+def workers() -> int:
+    return getattr(settings, 'IMAGE_VARIANT_WORKERS', 2)
+
+
+def new_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Пул процессов для кодирования.
+
+    Процессы запускаются через spawn: форк многопоточного веб-сервера
+    унаследовал бы чужие блокировки и соединения с базой.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+    )
+
+
+def pool() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = new_pool(workers())
+        return _executor
+
+
+def target_dir(source: str) -> str:
+    return os.path.join(DIRECTORY, os.path.splitext(source)[0])
+
+
+def record(source: str, renditions: List[imaging.Rendition]) -> None:
+    """Сохраняет готовые варианты изображения."""
+    ImageVariant.objects.bulk_create(
+        (
+            ImageVariant(
+                source=source, format=fmt, width=width, height=height,
+                file=name,
+            )
+            for fmt, width, height, name in renditions
+        ),
+        ignore_conflicts=True,
+    )
+    invalidate_on_commit(*image_tags(source))
+
+
+def encode_job(source: str) -> tuple:
+    """Аргументы imaging.encode для изображения."""
+    return (
+        settings.MEDIA_ROOT, source, target_dir(source), widths(), formats()
+    )
+
+
+def _done(source: str, future: Future) -> None:
+    try:
+        record(source, future.result())
+    except Exception:
+        logger.exception('Не удалось построить варианты для %s', source)
+    finally:
+        connections.close_all()
+
+
+def submit(source: str) -> Optional[Future]:
+    """
+    Ставит изображение в пул; с in-memory базой кодирует сразу.
+
+    Повторная загрузка того же файла получает то же имя (core.storage),
+    и готовые варианты не перекодируются.
+    """
+    if ImageVariant.objects.filter(source=source).exists():
+        return None
+    if workers() <= 0 or in_memory_db():
+        record(source, imaging.encode(*encode_job(source)))
+        return None
+    future = pool().submit(imaging.encode, *encode_job(source))
+    future.add_done_callback(lambda done: _done(source, done))
+    return future
+
+
+def schedule(source: str) -> None:
+    """Строит варианты после коммита транзакции, сохранившей файл."""
+    transaction.on_commit(lambda: submit(source))
+
+
+def sources_for(names: Iterable[str]) -> Dict[str, List[Source]]:
+    """<source> для <picture> по именам изображений, одним запросом."""
+    names = set(names)
+    if not names:
+        return {}
+    grouped = defaultdict(lambda: defaultdict(list))
+    for variant in ImageVariant.objects.filter(source__in=names):
+        grouped[variant.source][variant.format].append(
+            f'{default_storage.url(variant.file)} {variant.width}w'
+        )
+    return {
+        source: [
+            Source(MIME_TYPES[fmt], ', '.join(by_format[fmt]))
+            for fmt in formats() if fmt in by_format
+        ]
+        for source, by_format in grouped.items()
+    }
+
+
+def attach_variants(objects: Iterable, field: str = 'image') -> None:
+    """
+    Проставляет объектам страницы атрибут image_sources.
+
+    Как и миниатюры, варианты всей страницы читаются одним запросом при
+    первом обращении к любому из них.
+    """
+    objects = list(objects)
+    names = [
+        getattr(obj, field).name for obj in objects if getattr(obj, field)
+    ]
+    resolved = SimpleLazyObject(lambda: sources_for(names))
+    for obj in objects:
+        file_ = getattr(obj, field)
+        obj.image_sources = SimpleLazyObject(
+            lambda name=file_.name: resolved.get(name, [])
+        ) if file_ else []
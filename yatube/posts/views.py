@@ -1,31 +1,66 @@
 from typing import Union
 
+from django.conf import settings
 from django.shortcuts import redirect, render, get_object_or_404
 from django.db.models.query import QuerySet
 from django.http import HttpRequest, Http404, HttpResponse
-from django.core.paginator import Paginator, Page
+from django.core.paginator import Page
 from django.contrib.auth.decorators import login_required
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
 
-from .models import Post, Group, User, Comment, Follow
+from core.caching import swr
+from core.caching.pages import set_page_tags
+from core.query_budget import query_budget
+from core.replicas import read_replica
+from core.thumbnails import attach_thumbnails
+
+from . import shards
+from .models import Post, Group, User, Counters, Follow
+from .caching import (
+    ANY_AUTHOR, ANY_GROUP, FEED_INDEX, author_tag, group_etag, group_tag,
+    index_etag, page_author, page_group, page_post, page_tags, post_etag,
+    post_tag, profile_etag,
+)
+from .counters import get_counters
+from .feeds import MergedFeed, follow_feed, scatter
 from .forms import PostForm, CommentForm
+from .paginators import CursorPaginator, paginate
+from .search import fts_query, search_key, search_page
+from .variants import attach_variants
 
 WORD_COUNT = 30
 POST_COUNT = 10
+COMMENT_COUNT = 20
+
+
+def comment_page(request: HttpRequest, post: Post) -> Page:
+    """Окно комментариев поста, всегда по курсору ?before=."""
+    paginator = CursorPaginator(
+        post.comments.select_related('author'), COMMENT_COUNT
+    )
+    return paginator.get_cursor_page(before=request.GET.get('before'))
 
 
+@read_replica
+@query_budget(4)
+@condition(etag_func=index_etag)
 def index(request: HttpRequest) -> HttpResponse:
     """Функция вызова главной страницы."""
     template: str = 'posts/index.html'
     title: str = 'Последние обновления на сайте'
     description: str = 'Главная страница проекта Yatube'
-    posts: QuerySet = Post.objects.select_related('author')
-    paginator: Paginator = Paginator(posts, POST_COUNT)
-    page_number: Union[str, None] = request.GET.get('page')
-    page_obj: Page = paginator.get_page(page_number)
-    context: dict[str, Union[str, Page, bool]] = {
+    posts: Union[QuerySet, MergedFeed] = scatter(
+        Post.objects.select_related('author', 'group')
+    )
+    page_obj: Page = paginate(request, posts, POST_COUNT)
+    attach_thumbnails(page_obj)
+    attach_variants(page_obj)
+    context: dict[str, Union[str, Page, list, bool]] = {
         'title': title,
         'description': description,
         'page_obj': page_obj,
+        'cache_tags': page_tags(page_obj, FEED_INDEX),
         'index': True
     }
     return render(
@@ -35,24 +70,27 @@ def index(request: HttpRequest) -> HttpResponse:
     )
 
 
+@read_replica
+@query_budget(5)
+@condition(etag_func=group_etag)
 def group_list(request: HttpRequest, slug: str) -> HttpResponse:
     """Функция вызова страницы группы."""
-    group_name: Union[Group, Http404] = get_object_or_404(
-        Group,
-        slug=slug
-    )
+    group_name: Group = page_group(request, slug)
     template: str = 'posts/group_list.html'
     title: Group = group_name
-    posts: QuerySet = group_name.posts.all()
+    posts: Union[QuerySet, MergedFeed] = scatter(
+        group_name.posts.select_related('author')
+    )
     description: str = group_name.description
-    paginator: Paginator = Paginator(posts, POST_COUNT)
-    page_number: Union[str, None] = request.GET.get('page')
-    page_obj: Page = paginator.get_page(page_number)
-    context: dict[str, Union[str, Page, Group]] = {
+    page_obj: Page = paginate(request, posts, POST_COUNT)
+    attach_thumbnails(page_obj)
+    attach_variants(page_obj)
+    context: dict[str, Union[str, Page, list, Group]] = {
         'title': title,
         'description': description,
         'group_name': group_name,
         'page_obj': page_obj,
+        'cache_tags': page_tags(page_obj, group_tag(group_name.pk)),
     }
     return render(
         request,
@@ -61,40 +99,69 @@ def group_list(request: HttpRequest, slug: str) -> HttpResponse:
     )
 
 
+@read_replica
+@query_budget(6)
+@condition(etag_func=profile_etag)
 def profile(request: HttpRequest, username: str) -> HttpResponse:
     """Функция вызова страницы пользователя."""
     template: str = 'posts/profile.html'
-    author: Union[User, Http404] = get_object_or_404(User, username=username)
-    posts: QuerySet = author.posts.all()
+    author: User = page_author(request, username)
+    posts: QuerySet = author.posts.select_related('group')
     title: str = f'Профайл пользователя {username}'
-    paginator: Paginator = Paginator(posts, POST_COUNT)
-    page_number: Union[str, None] = request.GET.get('page')
-    page_obj: Page = paginator.get_page(page_number)
-    following = None
-    is_auth = request.user.is_authenticated
-    is_exists = Follow.objects.filter(
-        user=request.user.id,
-        author=author).exists()
-    following = is_auth and is_exists
-    context: dict[str, Union[str, Page, User, bool, None]] = {
+    page_obj: Page = paginate(request, posts, POST_COUNT)
+    attach_thumbnails(page_obj)
+    attach_variants(page_obj)
+    context: dict[str, Union[str, Page, list, User, Counters]] = {
         'title': title,
         'page_obj': page_obj,
+        'cache_tags': page_tags(page_obj, author_tag(author.pk)),
         'author': author,
-        'following': following,
+        'counters': get_counters(author),
+    }
+    return render(request, template, context)
+
+
+@query_budget(3)
+def search(request: HttpRequest) -> HttpResponse:
+    """Функция вызова страницы поиска по постам."""
+    template: str = 'posts/search.html'
+    title: str = 'Поиск по постам'
+    query: str = request.GET.get('q', '').strip()
+    page_obj: Union[Page, None] = None
+    tags: list = [FEED_INDEX, ANY_AUTHOR, ANY_GROUP]
+    set_page_tags(request, tags)
+    if fts_query(query):
+        before, after = request.GET.get('before'), request.GET.get('after')
+        page_obj = swr.get_or_set(
+            search_key(query, before, after),
+            lambda: search_page(query, POST_COUNT, before, after),
+            settings.FRAGMENT_CACHE_TIMEOUT,
+            tags=tags,
+            request=request,
+        )
+    context: dict[str, Union[str, Page, None]] = {
+        'title': title,
+        'query': query,
+        'page_obj': page_obj,
+        'page_params': f"{urlencode({'q': query})}&",
     }
     return render(request, template, context)
 
 
+@read_replica
+@query_budget(4)
+@condition(etag_func=post_etag)
 def post_detail(request: HttpRequest, post_id: int) -> HttpResponse:
     """Функция вызова страницы поста."""
     template: str = 'posts/post_detail.html'
-    post: Union[Post, Http404] = get_object_or_404(Post, pk=post_id)
-    author: str = post.author
-    posts_count: int = author.posts.all().count()
+    post: Post = page_post(request, post_id)
+    posts_count: int = get_counters(post.author).posts_count
+    attach_thumbnails([post])
+    attach_variants([post])
     title: str = f'Пост {post.text[:WORD_COUNT]}'
     form: CommentForm = CommentForm(request.POST or None)
-    comments: Comment = post.comments.all()
-    context: dict[str, Union[str, Post, int, CommentForm, Comment]] = {
+    comments: Page = comment_page(request, post)
+    context: dict[str, Union[str, Post, int, CommentForm, Page]] = {
         'title': title,
         'post': post,
         'posts_count': posts_count,
@@ -104,6 +171,23 @@ def post_detail(request: HttpRequest, post_id: int) -> HttpResponse:
     return render(request, template, context)
 
 
+@query_budget(3)
+def post_comments(request: HttpRequest, post_id: int) -> HttpResponse:
+    """Функция вызова фрагмента со следующей порцией комментариев."""
+    template: str = 'includes/comments.html'
+    set_page_tags(request, [post_tag(post_id), ANY_AUTHOR])
+    post: Union[Post, Http404] = get_object_or_404(
+        shards.on(Post.objects.only('pk'), shards.shard_of_post(post_id)),
+        pk=post_id,
+    )
+    comments: Page = comment_page(request, post)
+    context: dict[str, Union[Post, Page]] = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request: HttpRequest) -> HttpResponse:
     """Функция вызова страницы создания поста."""
@@ -117,6 +201,7 @@ def post_create(request: HttpRequest) -> HttpResponse:
         added_post = form.save(commit=False)
         added_post.author = request.user
         added_post.save()
+        form.schedule_renditions()
         return redirect('posts:profile', added_post.author)
     context: dict[str, Union[str, PostForm]] = {
         'form': form,
@@ -130,7 +215,10 @@ def post_edit(request: HttpRequest, post_id: int) -> HttpResponse:
     """Функция вызова страницы редактирования поста."""
     template: str = 'posts/create_post.html'
     title: str = 'Редактировать запись'
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        shards.on(Post.objects.all(), shards.shard_of_post(post_id)),
+        pk=post_id,
+    )
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post_id)
     form: PostForm = PostForm(
@@ -139,6 +227,7 @@ def post_edit(request: HttpRequest, post_id: int) -> HttpResponse:
         instance=post,)
     if form.is_valid():
         form.save()
+        form.schedule_renditions()
         return redirect('posts:post_detail', post_id=post_id)
     context: dict[str, Union[str, bool, PostForm, int]] = {
         'form': form,
@@ -152,7 +241,9 @@ def post_edit(request: HttpRequest, post_id: int) -> HttpResponse:
 @login_required
 def add_comment(request: HttpRequest, post_id: int) -> HttpResponse:
     """Функция добавления комментария к посту."""
-    post: Post = Post.objects.get(pk=post_id)
+    post: Post = shards.on(
+        Post.objects.all(), shards.shard_of_post(post_id)
+    ).get(pk=post_id)
     form: CommentForm = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -162,15 +253,19 @@ def add_comment(request: HttpRequest, post_id: int) -> HttpResponse:
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@read_replica
+@query_budget(8)
 @login_required
 def follow_index(request: HttpRequest) -> HttpResponse:
     """Функция вызова страницы с подписками."""
     template: str = 'posts/follow.html'
     title: str = 'Подписки на авторов'
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator: Paginator = Paginator(posts, POST_COUNT)
-    page_number: Union[str, None] = request.GET.get('page')
-    page_obj: Page = paginator.get_page(page_number)
+    posts: MergedFeed = follow_feed(request.user)
+    page_obj: Page = paginate(
+        request, posts, POST_COUNT, 'feed_date', 'feed_id'
+    )
+    attach_thumbnails(page_obj)
+    attach_variants(page_obj)
     context: dict[str, Union[str, Page, bool]] = {
         'title': title,
         'page_obj': page_obj,
@@ -1,4 +1,8 @@
+import atexit
+import hashlib
 import os
+import sys
+import tempfile
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -34,13 +38,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.query_budget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.caching.middleware.PageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -70,7 +77,44 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 60,
+    },
+    # Локальная реплика: копия default, которую догоняет команда
+    # sync_replica. Страницы читают с нее, пока она отстает не больше
+    # REPLICA_MAX_LAG, а отметку sync видно лишь через общий кеш (shm):
+    # с кешем в памяти процесса все читается из default.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = [
+    'posts.shards.ShardRouter',
+    'core.replicas.ReplicaRouter',
+]
+DATABASE_REPLICA = 'replica'
+# Базы-шарды постов по автору (posts/shards.py). Второй шард - еще один
+# файл SQLite в DATABASES, например 'shard1' с NAME db.shard1.sqlite3 и
+# 'TEST': {'MIRROR': 'default'}; затем migrate --database=shard1 и
+# mirror_shards. Уже написанные посты между шардами не переносятся.
+POST_SHARDS = ['default']
+# Сколько секунд после записи сессия читает из основной базы
+REPLICA_STICKY_SECONDS = 15
+# Реплику, не синхронизированную дольше стольких секунд, не читают
+REPLICA_MAX_LAG = 60
+
+# PRAGMA для каждого нового соединения SQLite (core/sqlite.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - в килобайтах: 64 МБ на соединение
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
 }
 
 
@@ -116,12 +160,73 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Перед общим кешем стоит L1 процесса (core.caching.tiered), за ним
+# общий для воркеров хоста файл в памяти (core.caching.shm). Журнал
+# поколений L1 и версии тегов живут в L2: с LocMemCache в 'shared'
+# инвалидация не доходила бы до других воркеров, и они часами отдавали
+# бы устаревшие страницы и фрагменты. Файл свой у каждой копии проекта,
+# а у тестов (manage.py test, pytest) еще и у каждого процесса: их
+# cache.clear() не должен стирать кеш dev-сервера из той же копии.
+SHARED_CACHE_DIR = (
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+)
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+SHARED_CACHE_NAME = 'yatube-%s' % hashlib.md5(BASE_DIR.encode()).hexdigest()[:8]
+if TESTING:
+    SHARED_CACHE_NAME += '-test-%d' % os.getpid()
+SHARED_CACHE_PATH = os.path.join(SHARED_CACHE_DIR, SHARED_CACHE_NAME + '.cache')
+if TESTING:
+    atexit.register(
+        lambda: os.path.exists(SHARED_CACHE_PATH)
+        and os.remove(SHARED_CACHE_PATH)
+    )
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.caching.tiered.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'L1_MAX_ENTRIES': 1000, 'MAX_DELAY': 1},
+    },
+    'shared': {
+        'BACKEND': 'core.caching.shm.SharedMemoryCache',
+        'LOCATION': SHARED_CACHE_PATH,
+    },
 }
 
+# Сколько последних постов хранится в ленте подписок каждого пользователя
+TIMELINE_LENGTH = 1000
+# Посты авторов с большим числом подписчиков подмешиваются в ленту при чтении
+FEED_PULL_THRESHOLD = 1000
+
+# Фрагменты сбрасываются по тегам, поэтому могут жить долго
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 6
+# Сколько устаревший фрагмент еще отдается, пока его пересчитывают
+CACHE_STALE_GRACE = 60 * 10
+# Доля, на которую случайно укорачиваются сроки, чтобы записи не истекали разом
+CACHE_JITTER = 0.1
+
+# Полностраничный кеш приложений из PAGE_CACHE_NAMESPACES; 0 выключает
+PAGE_CACHE_TIMEOUT = 60 * 60
+PAGE_CACHE_NAMESPACES = ('posts',)
+
+# Загруженные изображения уменьшаются до этого размера по большей
+# стороне; JPEG больше UPLOAD_IMAGE_MAX_PIXELS пикселей не принимаются.
+# PNG, WebP и GIF декодируются целиком, с RGBA пик доходит до 9 байт на
+# пиксель, поэтому для них предел UPLOAD_IMAGE_MAX_DECODED_PIXELS
+UPLOAD_IMAGE_MAX_SIDE = 1920
+UPLOAD_IMAGE_MAX_PIXELS = 40_000_000
+UPLOAD_IMAGE_MAX_DECODED_PIXELS = 10_000_000
+
+# Миниатюры строятся в фоне сразу после загрузки изображения
+THUMBNAIL_GEOMETRIES = (
+    ('960x339', {'upscale': True}),
+)
+THUMBNAIL_WORKERS = 2
+
+# Варианты для srcset кодируются в отдельных процессах
+IMAGE_VARIANT_WIDTHS = (320, 640, 960)
+IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+IMAGE_VARIANT_WORKERS = 2
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]